@@ -7,6 +7,7 @@ import scrapy
 
 
 class AtbScraperItem(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    pass
+    # One page, exported to atb_items.jsonl and indexed by the chatbot (chatbot/sources.py)
+    title = scrapy.Field()
+    url = scrapy.Field()
+    content = scrapy.Field()
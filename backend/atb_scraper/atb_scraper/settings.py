@@ -85,3 +85,8 @@ DOWNLOAD_DELAY = 1
 
 # Set settings whose default value is deprecated to a future-proof value
 FEED_EXPORT_ENCODING = "utf-8"
+
+# Items read by the chatbot index builder (python manage.py build_index --sources scrapy)
+FEEDS = {
+    "atb_items.jsonl": {"format": "jsonlines", "overwrite": True},
+}
@@ -1,6 +1,8 @@
 import scrapy
 import os
 
+from ..items import AtbScraperItem
+
 class AtbSpider(scrapy.Spider):
     name = 'atb_spider'
     allowed_domains = ['atb.tn']
@@ -21,6 +23,8 @@ class AtbSpider(scrapy.Spider):
         content = response.xpath('//div[@id="container-main"]//p/text()').getall()
         content = "\n".join(content)
 
+        item = AtbScraperItem(title=title, url=response.url, content=content)
+
         # Clean title for valid filenames (avoid illegal characters like ':')
         title = "".join([c if c.isalnum() else "_" for c in title])
 
@@ -35,3 +39,6 @@ class AtbSpider(scrapy.Spider):
             f.write(f"=== {title} ===\n{content}\n")
         
         self.log(f'Saved file {filename}')
+
+        # Exported to the feed (see FEEDS in settings.py) with the title as displayed
+        yield item
@@ -7,6 +7,7 @@ urlpatterns = [
     path('register/', views.register_user),
     path('login/', views.login_user),
     path('messages/', views.message_list_create),
+    path('retriever/stats/', views.retriever_stats),
     path('form/start/', form_start, name='form_start'),
     path('form/peek/', form_peek),
     path('form/answer/', form_answer, name='form_answer'),
@@ -0,0 +1,86 @@
+"""
+Recall@k and search latency of the ANN index types against the flat baseline.
+
+    cd backend
+    python -m chatbot.benchmarks.ann_recall -k 5 --scale 20
+
+The chunk vectors are re-encoded from the current chunk store and the queries
+come from chatbot.csv. --scale N grows the corpus N times with jittered copies
+of the real vectors, to see how each index type behaves as documents are added.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ..retrieval_runtime import get_runtime
+from ..vector_index import build_index
+from .batch_throughput import load_questions
+
+CANDIDATES = [
+    ("ivf", {"nprobe": 1}),
+    ("ivf", {"nprobe": 4}),
+    ("ivf", {"nprobe": 8}),
+    ("ivf", {"nprobe": 16}),
+    ("hnsw", {"ef_search": 16}),
+    ("hnsw", {"ef_search": 32}),
+    ("hnsw", {"ef_search": 64}),
+    ("hnsw", {"ef_search": 128}),
+]
+
+
+def scaled_corpus(vectors, scale, seed=0):
+    if scale <= 1:
+        return vectors
+    rng = np.random.default_rng(seed)
+    noise = vectors.std() * 0.3
+    copies = [vectors] + [vectors + rng.normal(0, noise, vectors.shape).astype("float32")
+                          for _ in range(scale - 1)]
+    return np.vstack(copies)
+
+
+def timed_search(index, queries, k):
+    """Search one query at a time, as the chat endpoint does; return ids and per-query latencies (ms)."""
+    ids, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        _, I = index.search(q.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(I[0])
+    return np.array(ids), np.array(latencies)
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--scale", type=int, default=1, help="replicate the corpus N times")
+    args = parser.parse_args()
+
+    runtime = get_runtime()
+    model = runtime.embedding_model
+    chunks = [str(c) for c in runtime.document_chunks]
+    corpus = scaled_corpus(np.asarray(model.encode(chunks), dtype="float32"), args.scale)
+    queries = np.asarray(model.encode(load_questions()), dtype="float32")
+
+    flat, _ = build_index(corpus, "flat")
+    truth, flat_lat = timed_search(flat, queries, args.k)
+    print(f"{len(corpus)} vectors, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<8} {'params':<36} {'recall@k':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    print(f"{'flat':<8} {'-':<36} {1.0:>8.3f} {np.percentile(flat_lat, 50):>8.3f} "
+          f"{np.percentile(flat_lat, 95):>8.3f}")
+
+    for index_type, overrides in CANDIDATES:
+        index, meta = build_index(corpus, index_type, **overrides)
+        found, lat = timed_search(index, queries, args.k)
+        params = ",".join(f"{k}={v}" for k, v in meta["params"].items())
+        print(f"{index_type:<8} {params:<36} {recall_at_k(found, truth):>8.3f} "
+              f"{np.percentile(lat, 50):>8.3f} {np.percentile(lat, 95):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Retrieval throughput (queries/s) against batch size, on CPU.
+
+    cd backend
+    python -m chatbot.benchmarks.batch_throughput --batch-sizes 1,4,16,64
+
+Caches are bypassed so every query pays its encode and search.
+"""
+import argparse
+import csv
+import os
+import time
+
+from ..rag_config import BASE_DIR
+from ..retrieval_runtime import get_runtime
+from ..retriever import retrieve_chunks_batch
+
+QUESTIONS_CSV = os.path.join(BASE_DIR, "chatbot.csv")
+
+
+def load_questions(path=QUESTIONS_CSV):
+    with open(path, encoding="utf-8") as f:
+        return [row["Text"] for row in csv.DictReader(f) if row.get("Text")]
+
+
+def measure(queries, batch_size, k):
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        retrieve_chunks_batch(queries[i:i + batch_size], k=k, use_cache=False)
+    return len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16,32,64")
+    parser.add_argument("--queries", type=int, default=256, help="number of queries per measurement")
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    questions = load_questions()
+    queries = [questions[i % len(questions)] for i in range(args.queries)]
+    get_runtime()
+    retrieve_chunks_batch(queries[:8], k=args.k, use_cache=False)  # warm-up
+
+    baseline = None
+    print(f"{'batch':>6} {'qps':>10} {'speedup':>8}")
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        qps = measure(queries, batch_size, args.k)
+        baseline = baseline or qps
+        print(f"{batch_size:>6} {qps:>10.1f} {qps / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Prompt size and answer time with the condensed chunk text against the full text.
+
+    cd backend
+    python -m chatbot.retriever_setup --summaries extractive
+    python -m chatbot.benchmarks.context_compression [--ollama 20]
+
+Reports, for the index in CHATBOT_INDEX_DIR (built with --summaries):
+
+- the compression ratio of the store: summary tokens / chunk tokens over all chunks
+- per labelled question: context tokens and chunks packed with and without
+  summaries (with summaries more chunks fit in the same token budget)
+- with --ollama N: Ollama prompt tokens, prefill (prompt eval) time and total
+  answer time for the first N questions, both ways
+"""
+import argparse
+
+import numpy as np
+import requests
+
+from ..generator import build_prompt
+from ..rag_config import OLLAMA_MODEL, OLLAMA_URL
+from ..retrieval_runtime import get_runtime
+from ..retriever import retrieve_context
+from .retrieval_eval import LABELLED_QUERIES, load_labelled_queries
+
+
+def store_ratio(store):
+    live = [i for i in range(len(store)) if store.metadata[i]["source"] >= 0]
+    full = sum(store.token_count(i) for i in live)
+    condensed = sum(store.summary_token_count(i) for i in live)
+    return full, condensed
+
+
+def ollama_timings(question, context):
+    """(prompt tokens, prefill ms, total ms) of one non-streamed Ollama answer."""
+    response = requests.post(OLLAMA_URL, json={"model": OLLAMA_MODEL, "stream": False,
+                                               "prompt": build_prompt(question, context)}, timeout=600)
+    response.raise_for_status()
+    data = response.json()
+    return data.get("prompt_eval_count", 0), data.get("prompt_eval_duration", 0) / 1e6, \
+        data.get("total_duration", 0) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=LABELLED_QUERIES, help="labelled query set (JSON)")
+    parser.add_argument("--ollama", type=int, default=0, metavar="N", help="also time N answers with Ollama")
+    args = parser.parse_args()
+
+    store = get_runtime().document_chunks
+    if not getattr(store, "summary_mode", None):
+        parser.error("the index has no summaries: build it with retriever_setup --summaries extractive|ollama")
+    full, condensed = store_ratio(store)
+    print(f"Store ({store.summary_mode}): {full} -> {condensed} tokens, compression ratio {condensed / full:.2f}")
+
+    questions = [item["query"] for item in load_labelled_queries(args.queries) if item["sources"]]
+    contexts = {name: [retrieve_context(q, condensed=name == "condensed") for q in questions]
+                for name in ("full", "condensed")}
+    print(f"\n{len(questions)} questions")
+    print(f"{'context':<10} {'tokens':>7} {'chunks':>7}")
+    for name, results in contexts.items():
+        print(f"{name:<10} {np.mean([c.tokens for c in results]):>7.1f} {np.mean([c.n_chunks for c in results]):>7.2f}")
+
+    if args.ollama:
+        print(f"\nOllama ({OLLAMA_MODEL}), {args.ollama} answers")
+        print(f"{'context':<10} {'prompt tok':>10} {'prefill ms':>11} {'total ms':>9}")
+        means = {}
+        for name, results in contexts.items():
+            timings = np.array([ollama_timings(q, c.text) for q, c in zip(questions, results[:args.ollama])])
+            means[name] = timings.mean(axis=0)
+            print(f"{name:<10} {means[name][0]:>10.0f} {means[name][1]:>11.0f} {means[name][2]:>9.0f}")
+        saved = means["full"] - means["condensed"]
+        print(f"saved      {saved[0]:>10.0f} {saved[1]:>11.0f} {saved[2]:>9.0f}  "
+              f"({saved[2] / means['full'][2]:.0%} of the answer time)")
+
+
+if __name__ == "__main__":
+    main()
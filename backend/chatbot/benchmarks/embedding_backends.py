@@ -0,0 +1,65 @@
+"""
+Latency and throughput of the embedding backends (torch, onnx, onnx-int8) on CPU.
+
+    cd backend
+    python -m chatbot.embeddings export --quantize   # once
+    python -m chatbot.benchmarks.embedding_backends
+
+Reports model load time, single-query latency (the chat hot path), batch
+throughput (the index builder) and the cosine error against torch.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ..embeddings import (
+    EMBEDDING_BACKENDS,
+    EQUIVALENCE_TOLERANCE,
+    check_equivalence,
+    load_embedding_model,
+    sample_texts,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default=",".join(EMBEDDING_BACKENDS))
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    queries, texts = sample_texts()
+    reference = None
+    print(f"{'backend':<10} {'load s':>7} {'p50 ms':>8} {'p95 ms':>8} {'texts/s':>9} {'max dcos':>9}")
+    for backend in args.backends.split(","):
+        start = time.perf_counter()
+        try:
+            model = load_embedding_model(backend=backend)
+        except (OSError, ImportError) as e:
+            print(f"{backend:<10} unavailable ({e})")
+            continue
+        load_time = time.perf_counter() - start
+        model.encode(queries[:4])  # warm-up
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            model.encode([query])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        model.encode(texts, batch_size=args.batch_size)
+        throughput = len(texts) / (time.perf_counter() - start)
+
+        if backend == "torch":
+            reference, error = model, 0.0
+        elif reference is not None:
+            error = check_equivalence(reference, model, queries, texts, EQUIVALENCE_TOLERANCE[backend])["max_error"]
+        else:
+            error = float("nan")
+        print(f"{backend:<10} {load_time:>7.2f} {np.percentile(latencies, 50):>8.2f} "
+              f"{np.percentile(latencies, 95):>8.2f} {throughput:>9.1f} {error:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Startup time of the embedding model: resolved by name on the Hugging Face hub
+(SentenceTransformer(name), as before the model registry) against loaded from
+the registry by path with offline mode enforced.
+
+    cd backend
+    python -m chatbot.model_registry pin   # once, with network access
+    python -m chatbot.benchmarks.model_startup --runs 5
+
+Each run is a fresh Python process, like a gunicorn master or the index
+builder starting: the time to find the model (registry lookup and file
+checks), import sentence-transformers, load the model and encode a first
+query. Without network access the hub mode shows what production used to
+get: retries until the lookup times out, or an error.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from ..model_registry import resolve_model
+from ..rag_config import EMBEDDING_MODEL_NAME, MODEL_REGISTRY_DIR
+
+MODES = ("hub", "registry")
+_OFFLINE_VARIABLES = ("HF_HUB_OFFLINE", "TRANSFORMERS_OFFLINE")
+
+
+def child(mode, model):
+    """One start, in this process: print the timings as JSON."""
+    start = time.perf_counter()
+    # As embeddings.load_embedding_model: the registry is read before sentence-transformers is imported
+    path = resolve_model(model) if mode == "registry" else model
+    resolved = time.perf_counter()
+    from sentence_transformers import SentenceTransformer
+
+    imported = time.perf_counter()
+    encoder = SentenceTransformer(path, device="cpu")
+    loaded = time.perf_counter()
+    encoder.encode(["Comment ouvrir un compte ?"])
+    done = time.perf_counter()
+    print(json.dumps({"resolve_s": resolved - start, "import_s": imported - resolved, "load_s": loaded - imported,
+                      "first_query_s": done - loaded}))
+
+
+def run(mode, model, timeout):
+    """Timings of one fresh process (with its total wall time), or {"error": ...}."""
+    env = {name: value for name, value in os.environ.items() if name not in _OFFLINE_VARIABLES}
+    start = time.perf_counter()
+    try:
+        result = subprocess.run([sys.executable, "-m", __spec__.name, "--child", mode, "--model", model],
+                                capture_output=True, text=True, env=env, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"error": f"no model after {timeout:.0f}s", "total_s": time.perf_counter() - start}
+    total = time.perf_counter() - start
+    lines = result.stdout.strip().splitlines()
+    if result.returncode or not lines:
+        error = (result.stderr.strip().splitlines() or ["exit code " + str(result.returncode)])[-1]
+        return {"error": error[:120], "total_s": total}
+    return {**json.loads(lines[-1]), "total_s": total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds before a start is given up")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.model)
+        return
+    print(f"{args.model}, registry {MODEL_REGISTRY_DIR}, {args.runs} fresh processes per mode")
+    print(f"{'mode':<10} {'p50 s':>7} {'max s':>7} {'resolve s':>10} {'import s':>9} {'load s':>7} {'query s':>8}")
+    for mode in args.modes.split(","):
+        results = [run(mode, args.model, args.timeout) for _ in range(args.runs)]
+        ok = [r for r in results if "error" not in r]
+        if not ok:
+            print(f"{mode:<10} failed after {np.median([r['total_s'] for r in results]):.2f}s: {results[0]['error']}")
+            continue
+        median = {key: np.median([r[key] for r in ok]) for key in ok[0] if key != "total_s"}
+        failed = f"  ({len(results) - len(ok)} failed)" if len(ok) < len(results) else ""
+        print(f"{mode:<10} {np.median([r['total_s'] for r in ok]):>7.2f} {max(r['total_s'] for r in ok):>7.2f} "
+              f"{median['resolve_s']:>10.3f} {median['import_s']:>9.2f} {median['load_s']:>7.2f} "
+              f"{median['first_query_s']:>8.3f}{failed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Retrieval quality and speed on a labelled query set, per build configuration.
+
+    cd backend
+    python -m chatbot.benchmarks.retrieval_eval --index-types flat,hnsw --chunk-sizes 300,500
+    python -m chatbot.benchmarks.retrieval_eval --compressions none,sq8,pca-sq8
+    python -m chatbot.benchmarks.retrieval_eval --chunkers fixed,structure --chunk-tokens 96,128,192
+    python -m chatbot.benchmarks.retrieval_eval --compare chatbot/benchmarks/results/<previous>.json
+
+Each combination of index type, embedding backend, chunker and chunk size
+(--chunk-sizes characters for the fixed chunker, --chunk-tokens tokens for
+the structure chunker) and vector compression is built
+from atb_documents/ into a temporary directory and queried one question at a
+time through retriever.retrieve_ids (BM25 fusion, document routing, caches
+off), as the chat endpoint does. labelled_queries.json holds the questions of
+chatbot.csv plus French questions, each with the source documents that answer
+it; questions without sources are off-topic and count for the rejection rate.
+
+Reported per configuration:
+
+- recall@k: share of the expected sources found among the top-k chunks
+- mrr:      1 / rank of the first chunk from an expected source
+- needed:   top chunks it takes to cover every expected source, searching up
+            to --depth chunks (a question not covered counts as --depth), and
+            the tokens of those chunks: what the prompt has to carry
+- rejected: share of off-topic questions left without context (best cosine
+            below CHATBOT_RELEVANCE_MIN_SCORE)
+- p50/p95/p99 latency (ms), qps, build time, index size on disk and process memory
+
+Results are written as JSON (--output) so runs can be compared with --compare.
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from ..embeddings import load_embedding_model
+from ..index_versions import current_index_dir
+from ..rag_config import (
+    BASE_DIR,
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    CHUNK_TOKENS,
+    CHUNKER,
+    EMBEDDING_BACKEND,
+    FAISS_INDEX_FILE,
+    INDEX_TYPE,
+    PDF_FOLDER,
+    RELEVANCE_MIN_SCORE,
+    VECTOR_COMPRESSION,
+)
+from ..retrieval_runtime import load_runtime, memory_report
+from ..retriever import retrieve_ids
+
+LABELLED_QUERIES = os.path.join(os.path.dirname(__file__), "labelled_queries.json")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+COMPARED_METRICS = ("recall_at_k", "mrr", "chunks_needed", "tokens_needed", "p50_ms", "p95_ms", "qps")
+DEPTH = 20  # chunks searched for the "needed" metrics
+
+
+def load_labelled_queries(path=LABELLED_QUERIES):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def directory_size_mb(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2**20
+
+
+def chunk_sources(runtime, chunk_id):
+    """The sources a chunk belongs to (several when duplicates were merged at build time)."""
+    store = runtime.document_chunks
+    return set(store.chunk_sources(chunk_id)) if hasattr(store, "chunk_sources") else set()
+
+
+def chunks_needed(runtime, query, expected, depth):
+    """(chunks, tokens) of the shortest top-n that covers every expected source; (depth, None) if none does."""
+    retrieval = retrieve_ids(runtime, [query], depth, use_cache=False)[0]
+    covered, tokens = set(), 0
+    for n, chunk_id in enumerate(retrieval.ids[:depth], 1):
+        covered |= chunk_sources(runtime, chunk_id) & expected
+        tokens += runtime.document_chunks.token_count(chunk_id)
+        if covered == expected:
+            return n, tokens
+    return depth, None
+
+
+def evaluate(runtime, labelled, k, depth=DEPTH):
+    """Query the runtime with every labelled question; return the quality and latency metrics."""
+    retrieve_ids(runtime, [labelled[0]["query"]], k, use_cache=False)  # warm-up
+    recalls, reciprocal_ranks, rejected, latencies, needed, needed_tokens = [], [], [], [], [], []
+    for item in labelled:
+        start = time.perf_counter()
+        retrieval = retrieve_ids(runtime, [item["query"]], k, use_cache=False)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        if not item["sources"]:
+            score = retrieval.top_score
+            rejected.append(score is not None and score < RELEVANCE_MIN_SCORE)
+            continue
+        expected = set(item["sources"])
+        found = [chunk_sources(runtime, i) for i in retrieval.ids[:k]]
+        recalls.append(len(expected & set().union(*found)) / len(expected))
+        rank = next((r for r, sources in enumerate(found, 1) if sources & expected), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+        n, tokens = chunks_needed(runtime, item["query"], expected, depth)  # not timed: deeper search
+        needed.append(n)
+        if tokens is not None:
+            needed_tokens.append(tokens)
+
+    latencies = np.array(latencies)
+    return {
+        "queries": len(labelled),
+        "recall_at_k": float(np.mean(recalls)) if recalls else None,
+        "mrr": float(np.mean(reciprocal_ranks)) if reciprocal_ranks else None,
+        "rejected": float(np.mean(rejected)) if rejected else None,
+        "chunks_needed": float(np.mean(needed)) if needed else None,
+        "tokens_needed": float(np.mean(needed_tokens)) if needed_tokens else None,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "qps": float(len(latencies) / (latencies.sum() / 1000)),
+    }
+
+
+def run_config(labelled, k, index_type, backend, chunker, chunk_size, compression, pdf_folder, models,
+               overlap=CHUNK_OVERLAP, depth=DEPTH):
+    """Metrics of one configuration, or None when the build refused to write the index (recall floor)."""
+    from ..retriever_setup import build
+    from ..sources import PdfDirectory
+
+    with tempfile.TemporaryDirectory(prefix="chatbot-eval-") as index_dir:
+        start = time.perf_counter()
+        build(pdf_folder, index_dir, index_type, full=True, embedding_backend=backend, chunk_size=chunk_size,
+              compression=compression, chunker=chunker, chunk_tokens=chunk_size, chunk_overlap=overlap,
+              connectors=[PdfDirectory(pdf_folder)])  # the labelled answers are PDFs
+        build_s = time.perf_counter() - start
+        if not os.path.exists(os.path.join(current_index_dir(index_dir), FAISS_INDEX_FILE)):
+            return None
+        if backend not in models:
+            models[backend] = load_embedding_model(backend=backend)
+        rss_before = memory_report()["rss_mb"]
+        runtime = load_runtime(index_dir, embedding_model=models[backend])
+        result = evaluate(runtime, labelled, k, depth)
+        report = memory_report()
+        result.update({
+            "chunks": int(runtime.faiss_index.ntotal),
+            "compression_recall": runtime.index_meta.get("compression", {}).get("recall"),
+            "build_s": build_s,
+            "index_mb": directory_size_mb(runtime.index_dir),
+            "rss_mb": report["rss_mb"],
+            "runtime_rss_mb": report["rss_mb"] - rss_before,
+            "uss_mb": report.get("uss_mb"),
+        })
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def config_key(result):
+    return (result["index_type"], result["embedding_backend"], result.get("chunker", "fixed"), result["chunk_size"],
+            result.get("compression", "none"))
+
+
+def print_comparison(results, previous_path):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {config_key(r): r for r in json.load(f)["results"]}
+    print(f"\nChange against {previous_path}:")
+    for result in results:
+        before = previous.get(config_key(result))
+        if before is None:
+            continue
+        deltas = ", ".join(f"{m} {result[m] - before[m]:+.3f}" for m in COMPARED_METRICS
+                           if result.get(m) is not None and before.get(m) is not None)
+        print(f"  {'/'.join(map(str, config_key(result)))}: {deltas}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--index-types", default=INDEX_TYPE)
+    parser.add_argument("--embedding-backends", default=EMBEDDING_BACKEND)
+    parser.add_argument("--chunkers", default=CHUNKER, help="fixed,structure")
+    parser.add_argument("--chunk-sizes", default=str(CHUNK_SIZE), help="characters per chunk (fixed)")
+    parser.add_argument("--chunk-tokens", default=str(CHUNK_TOKENS), help="max tokens per chunk (structure)")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP, help="overlap in tokens (structure)")
+    parser.add_argument("--depth", type=int, default=DEPTH, help="chunks searched for the needed metrics")
+    parser.add_argument("--compressions", default=VECTOR_COMPRESSION, help="none,pca,sq8,pca-sq8")
+    parser.add_argument("--pdf-folder", default=PDF_FOLDER)
+    parser.add_argument("--queries", default=LABELLED_QUERIES, help="labelled query set (JSON)")
+    parser.add_argument("--output", help="result file (default: chatbot/benchmarks/results/retrieval-<time>.json)")
+    parser.add_argument("--compare", help="previous result file to compare with")
+    args = parser.parse_args()
+
+    labelled = load_labelled_queries(args.queries)
+    sizes = {"fixed": [int(size) for size in args.chunk_sizes.split(",")],
+             "structure": [int(size) for size in args.chunk_tokens.split(",")]}
+    chunkings = [(chunker, size) for chunker in args.chunkers.split(",") for size in sizes[chunker]]
+    configs = itertools.product(args.index_types.split(","), args.embedding_backends.split(","), chunkings,
+                                args.compressions.split(","))
+    models, results = {}, []
+    for index_type, backend, (chunker, chunk_size), compression in configs:
+        metrics = run_config(labelled, args.k, index_type, backend, chunker, chunk_size, compression,
+                             args.pdf_folder, models, args.chunk_overlap, args.depth)
+        if metrics is None:
+            print(f"⚠️ {index_type}/{backend}/{chunker}-{chunk_size}/{compression} skipped: "
+                  f"below the compression recall floor")
+            continue
+        result = {"index_type": index_type, "embedding_backend": backend, "chunker": chunker,
+                  "chunk_size": chunk_size, "chunk_overlap": args.chunk_overlap if chunker == "structure" else 0,
+                  "compression": compression}
+        result.update(metrics)
+        results.append(result)
+
+    print(f"\n{len(labelled)} queries, k={args.k}")
+    print(f"{'index':<6} {'backend':<10} {'chunking':<14} {'vectors':<8} {'chunks':>7} {'recall':>7} {'mrr':>6} "
+          f"{'needed':>7} {'tokens':>7} {'reject':>7} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'qps':>7} {'idx MB':>7} {'rss MB':>7}")
+    for r in results:
+        chunking = f"{r['chunker']}-{r['chunk_size']}"
+        print(f"{r['index_type']:<6} {r['embedding_backend']:<10} {chunking:<14} {r['compression']:<8} "
+              f"{r['chunks']:>7} "
+              f"{r['recall_at_k'] or 0:>7.3f} {r['mrr'] or 0:>6.3f} {r['chunks_needed'] or 0:>7.2f} "
+              f"{r['tokens_needed'] or 0:>7.0f} {r['rejected'] or 0:>7.2f} "
+              f"{r['p50_ms']:>7.2f} {r['p95_ms']:>7.2f} {r['p99_ms']:>7.2f} {r['qps']:>7.1f} "
+              f"{r['index_mb']:>7.2f} {r['rss_mb']:>7.0f}")
+
+    now = datetime.now(timezone.utc)
+    output = args.output or os.path.join(RESULTS_DIR, f"retrieval-{now:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": now.isoformat(), "git_revision": git_revision(), "k": args.k,
+                   "query_set": os.path.basename(args.queries), "results": results}, f, indent=2)
+    print(f"💾 Results written to {output}")
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
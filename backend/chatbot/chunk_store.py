@@ -0,0 +1,312 @@
+"""
+Pickle-free, memory-mapped chunk store.
+
+On disk (inside the index directory):
+
+- chunks.bin          UTF-8 text of every chunk, back to back (optionally zlib'd per chunk)
+- chunks_offsets.npy  int64[n + 1], chunk i is chunks.bin[offsets[i]:offsets[i + 1]]
+- chunks_meta.npy     one record per chunk: source id, page, char span, estimated token count
+- chunks_refs.npy     further (chunk, source, page) references of chunks shared by several sources
+- chunks.json         format header, the list of source files and their document families
+- summaries.bin, summaries_offsets.npy, summaries_tokens.npy
+                      optional condensed text of each chunk (see summaries.py), same layout
+
+Opening a store only maps the files, so startup does not depend on the corpus
+size, and a lookup only pages in the bytes of the chunks that are read.
+"""
+import json
+import os
+import zlib
+
+import numpy as np
+
+from .context import count_tokens
+
+CHUNKS_BLOB_FILE = "chunks.bin"
+CHUNKS_OFFSETS_FILE = "chunks_offsets.npy"
+CHUNKS_META_FILE = "chunks_meta.npy"
+CHUNKS_HEADER_FILE = "chunks.json"
+CHUNKS_REFS_FILE = "chunks_refs.npy"
+SUMMARIES_BLOB_FILE = "summaries.bin"
+SUMMARIES_OFFSETS_FILE = "summaries_offsets.npy"
+SUMMARIES_TOKENS_FILE = "summaries_tokens.npy"
+
+COMPRESSIONS = ("none", "zlib")
+
+META_DTYPE = np.dtype([
+    ("source", "<i4"),      # index into the header's "sources" list, -1 for removed chunks
+    ("page", "<i4"),        # 1-based page number, 0 when the source has no pages
+    ("char_start", "<i4"),  # span of the chunk in the extracted document text
+    ("char_end", "<i4"),
+    ("n_tokens", "<i4"),    # context.count_tokens(text), used to pack the prompt without re-tokenizing
+])
+
+# A duplicate chunk (see dedup.py) is stored once; every other source it appears in gets a reference
+REFS_DTYPE = np.dtype([("chunk", "<i4"), ("source", "<i4"), ("page", "<i4")])
+
+
+class ChunkStore:
+    """Read-only view over a chunk store directory; behaves like a sequence of strings."""
+
+    def __init__(self, index_dir):
+        with open(os.path.join(index_dir, CHUNKS_HEADER_FILE), encoding="utf-8") as f:
+            header = json.load(f)
+        self.compression = header["compression"]
+        self.sources = header["sources"]
+        self.source_families = header.get("source_families")  # None for stores written before families
+        self._source_ids = {source: i for i, source in enumerate(self.sources)}
+        self._family_ids = {}
+        self._by_source = None
+        self.offsets = np.load(os.path.join(index_dir, CHUNKS_OFFSETS_FILE), mmap_mode="r")
+        self.metadata = np.load(os.path.join(index_dir, CHUNKS_META_FILE), mmap_mode="r")
+        refs_path = os.path.join(index_dir, CHUNKS_REFS_FILE)
+        self.references = np.load(refs_path) if os.path.exists(refs_path) else np.zeros(0, dtype=REFS_DTYPE)
+        self.blob = _map_blob(os.path.join(index_dir, CHUNKS_BLOB_FILE))
+        self.summary_mode = header.get("summaries")  # how the summaries were made, None without them
+        if self.summary_mode:
+            self.summary_offsets = np.load(os.path.join(index_dir, SUMMARIES_OFFSETS_FILE), mmap_mode="r")
+            self.summary_tokens = np.load(os.path.join(index_dir, SUMMARIES_TOKENS_FILE), mmap_mode="r")
+            self.summary_blob = _map_blob(os.path.join(index_dir, SUMMARIES_BLOB_FILE))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._decode(self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes())
+
+    def _decode(self, raw):
+        if self.compression == "zlib":
+            raw = zlib.decompress(raw)
+        return raw.decode("utf-8")
+
+    def _summary_raw(self, i):
+        if not self.summary_mode:
+            return b""
+        return self.summary_blob[self.summary_offsets[i]:self.summary_offsets[i + 1]].tobytes()
+
+    def summary(self, i):
+        """Condensed text of chunk i, or the chunk itself when it has no summary."""
+        raw = self._summary_raw(i)
+        return self._decode(raw) if raw else self[i]
+
+    def summary_token_count(self, i):
+        if self.summary_mode and self.summary_offsets[i + 1] > self.summary_offsets[i]:
+            return int(self.summary_tokens[i])
+        return self.token_count(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def token_count(self, i):
+        if "n_tokens" in self.metadata.dtype.names:
+            return int(self.metadata[i]["n_tokens"])
+        return count_tokens(self[i])  # store written before token counts were recorded
+
+    def meta(self, i):
+        """Where chunk i comes from: {"source", "page", "char_start", "char_end"}."""
+        record = self.metadata[i]
+        return {
+            "source": self.sources[record["source"]] if record["source"] >= 0 else None,
+            "page": int(record["page"]),
+            "char_start": int(record["char_start"]),
+            "char_end": int(record["char_end"]),
+        }
+
+    def chunk_sources(self, i):
+        """Every source chunk i appears in: the one it was stored from, then its references."""
+        primary = self.metadata[i]["source"]
+        sources = [self.sources[primary]] if primary >= 0 else []
+        start, end = np.searchsorted(self.references["chunk"], [i, i + 1])
+        return sources + [self.sources[s] for s in self.references["source"][start:end]]
+
+    def chunk_ids_of_sources(self, sources):
+        """Ids of the live chunks of the given source files, including the chunks they share."""
+        if self._by_source is None:
+            # chunk ids grouped by source id: order[bounds[s]:bounds[s + 1]] are the chunks of source s
+            source_of_chunk = np.asarray(self.metadata["source"])
+            order = np.argsort(source_of_chunk, kind="stable")
+            bounds = np.searchsorted(source_of_chunk[order], np.arange(len(self.sources) + 1))
+            self._by_source = order.astype(np.int64), bounds
+        order, bounds = self._by_source
+        source_ids = [s for s in (self._source_ids.get(name) for name in sources) if s is not None]
+        parts = [order[bounds[s]:bounds[s + 1]] for s in source_ids]
+        if len(self.references):
+            shared = self.references["chunk"][np.isin(self.references["source"], source_ids)]
+            return np.unique(np.concatenate(parts + [shared.astype(np.int64)]))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    def family_ids(self, family):
+        """Ids of the live chunks of a document family, or None if the store has no family tags."""
+        if self.source_families is None:
+            return None
+        if family not in self._family_ids:
+            self._family_ids[family] = self.chunk_ids_of_sources(
+                [source for source, f in zip(self.sources, self.source_families) if f == family])
+        return self._family_ids[family]
+
+
+class ChunkStoreWriter:
+    """Accumulates chunks in memory and writes them in the ChunkStore layout."""
+
+    def __init__(self, compression="none"):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown chunk compression {compression!r}, expected one of {COMPRESSIONS}")
+        self.compression = compression
+        self.sources = []
+        self.source_families = []
+        self._source_ids = {}
+        self._blobs = []
+        self._meta = []
+        self._refs = {}  # chunk id -> [(source id, page)] besides the chunk's own source
+        self.summary_mode = None
+        self._summaries = {}  # chunk id -> (encoded condensed text, its token count)
+
+    @classmethod
+    def from_store(cls, store):
+        """Start from an existing store so chunk ids stay stable across incremental updates."""
+        writer = cls(store.compression)
+        writer.sources = list(store.sources)
+        writer.source_families = list(store.source_families or [None] * len(store.sources))
+        writer._source_ids = {source: i for i, source in enumerate(writer.sources)}
+        for i in range(len(store)):
+            writer._blobs.append(store.blob[store.offsets[i]:store.offsets[i + 1]].tobytes())
+            record = store.metadata[i]
+            writer._meta.append((int(record["source"]), int(record["page"]), int(record["char_start"]),
+                                 int(record["char_end"]), store.token_count(i)))
+        for chunk, source, page in store.references.tolist():
+            writer._refs.setdefault(chunk, []).append((source, page))
+        writer.summary_mode = store.summary_mode
+        for i in range(len(store)):
+            raw = store._summary_raw(i)
+            if raw:
+                writer._summaries[i] = (raw, int(store.summary_tokens[i]))
+        return writer
+
+    def __len__(self):
+        return len(self._blobs)
+
+    def remove(self, ids):
+        """
+        Blank out chunks whose vectors were deleted. Their ids are not reused,
+        so the ids of every other chunk stay valid; a full rebuild compacts the store.
+        """
+        for i in ids:
+            self._blobs[i] = zlib.compress(b"") if self.compression == "zlib" else b""
+            self._meta[i] = (-1, 0, 0, 0, 0)
+            self._refs.pop(i, None)
+            self._summaries.pop(i, None)
+
+    def release(self, source, ids):
+        """
+        Drop the references of `source` to chunks `ids` (the source changed or
+        disappeared). Chunks still referenced by another source are kept, the
+        others are removed; returns the removed ids, whose vectors must go too.
+        """
+        source_id = self._source_ids.get(source)
+        removed = []
+        for i in dict.fromkeys(ids):
+            refs = [ref for ref in self._refs.get(i, []) if ref[0] != source_id]
+            if self._meta[i][0] == source_id:
+                if not refs:
+                    removed.append(i)
+                    continue
+                # Another source becomes the chunk's own source
+                (new_source, new_page), refs = refs[0], refs[1:]
+                self._meta[i] = (new_source, new_page) + tuple(self._meta[i][2:])
+            self._refs[i] = refs
+        self.remove(removed)
+        return removed
+
+    def text(self, i):
+        raw = self._blobs[i]
+        return (zlib.decompress(raw) if self.compression == "zlib" else raw).decode("utf-8")
+
+    def live_chunks(self):
+        """(id, text) of every chunk that was not removed."""
+        return ((i, self.text(i)) for i, record in enumerate(self._meta) if record[0] >= 0)
+
+    def has_summary(self, i):
+        return i in self._summaries
+
+    def set_summary(self, i, text):
+        raw = text.encode("utf-8")
+        if self.compression == "zlib":
+            raw = zlib.compress(raw, 6)
+        self._summaries[i] = (raw, count_tokens(text))
+
+    def clear_summaries(self, mode=None):
+        """Forget every summary, e.g. before summarizing again with another `mode`."""
+        self._summaries = {}
+        self.summary_mode = mode
+
+    def _source_id(self, source, family):
+        if source not in self._source_ids:
+            self._source_ids[source] = len(self.sources)
+            self.sources.append(source)
+            self.source_families.append(family)
+        elif family is not None:
+            self.source_families[self._source_ids[source]] = family
+        return self._source_ids[source]
+
+    def add_reference(self, chunk_id, source, page=0, family=None):
+        """Record that chunk `chunk_id` also appears in `source`, instead of storing it again."""
+        ref = (self._source_id(source, family), page)
+        refs = self._refs.setdefault(chunk_id, [])
+        if ref[0] != self._meta[chunk_id][0] and ref not in refs:
+            refs.append(ref)
+
+    def add(self, text, source, page=0, char_start=0, char_end=None, family=None):
+        """Append a chunk and return its id (its position in the store)."""
+        source_id = self._source_id(source, family)
+        raw = text.encode("utf-8")
+        if self.compression == "zlib":
+            raw = zlib.compress(raw, 6)
+        self._blobs.append(raw)
+        if char_end is None:
+            char_end = char_start + len(text)
+        self._meta.append((source_id, page, char_start, char_end, count_tokens(text)))
+        return len(self._blobs) - 1
+
+    def save(self, index_dir):
+        offsets = np.zeros(len(self._blobs) + 1, dtype=np.int64)
+        np.cumsum(np.array([len(b) for b in self._blobs], dtype=np.int64), out=offsets[1:])
+        with open(os.path.join(index_dir, CHUNKS_BLOB_FILE), "wb") as f:
+            for raw in self._blobs:
+                f.write(raw)
+        np.save(os.path.join(index_dir, CHUNKS_OFFSETS_FILE), offsets)
+        np.save(os.path.join(index_dir, CHUNKS_META_FILE), np.array(self._meta, dtype=META_DTYPE))
+        refs = [(chunk, source, page) for chunk in sorted(self._refs) for source, page in self._refs[chunk]]
+        np.save(os.path.join(index_dir, CHUNKS_REFS_FILE), np.array(refs, dtype=REFS_DTYPE))
+        header = {"version": 2, "compression": self.compression, "count": len(self._blobs),
+                  "sources": self.sources, "source_families": self.source_families}
+        if self.summary_mode:
+            self._save_summaries(index_dir)
+            header["summaries"] = self.summary_mode
+        with open(os.path.join(index_dir, CHUNKS_HEADER_FILE), "w", encoding="utf-8") as f:
+            json.dump(header, f, ensure_ascii=False, indent=2)
+
+    def _save_summaries(self, index_dir):
+        """Summaries in the chunk layout; chunks without one get an empty entry."""
+        summaries = [self._summaries.get(i, (b"", 0)) for i in range(len(self._blobs))]
+        offsets = np.zeros(len(summaries) + 1, dtype=np.int64)
+        np.cumsum(np.array([len(raw) for raw, _ in summaries], dtype=np.int64), out=offsets[1:])
+        with open(os.path.join(index_dir, SUMMARIES_BLOB_FILE), "wb") as f:
+            for raw, _ in summaries:
+                f.write(raw)
+        np.save(os.path.join(index_dir, SUMMARIES_OFFSETS_FILE), offsets)
+        np.save(os.path.join(index_dir, SUMMARIES_TOKENS_FILE),
+                np.array([tokens for _, tokens in summaries], dtype=np.int32))
+
+
+def _map_blob(path):
+    # np.memmap refuses empty files
+    if os.path.getsize(path):
+        return np.memmap(path, dtype=np.uint8, mode="r")
+    return np.zeros(0, dtype=np.uint8)
+
+
+def has_chunk_store(index_dir):
+    return os.path.exists(os.path.join(index_dir, CHUNKS_HEADER_FILE))
@@ -0,0 +1,166 @@
+"""
+Structure-aware chunking of the PDF text.
+
+The fixed chunker (CHATBOT_CHUNKER=fixed) cuts every CHUNK_SIZE characters,
+through words, table rows, sentences and page breaks. The structure chunker
+works page by page, so a chunk never mixes two pages and keeps one page number:
+
+- every non-empty line starts a unit; the start of a unit is ranked by the
+  break it makes: heading > paragraph or list item > sentence > line break.
+  Headings are short lines in capitals, numbered sections ("2.1 Conditions")
+  or short lines after the end of a paragraph; the unit after a heading is
+  glued to it. Units longer than a chunk are split between words.
+- units are packed up to CHUNK_TOKENS tokens (context.count_tokens). When the
+  next unit does not fit, the chunk ends at the strongest break among those
+  that leave it at least MIN_FILL full, the latest one on ties.
+- a chunk that ends inside a paragraph (at a sentence, line or word) is
+  followed by one that repeats its last CHUNK_OVERLAP tokens, whole units if
+  they fit, otherwise whole words; sections and paragraphs start clean.
+
+Chunks are (start, end) offsets into the document text, as with the fixed chunker.
+"""
+import re
+
+from .context import count_tokens
+from .rag_config import CHUNK_OVERLAP, CHUNK_TOKENS
+
+CHUNKERS = ("structure", "fixed")
+MIN_FILL = 0.5  # a chunk is not cut at a better break if that leaves it less than half full
+
+# Break before a unit, weakest to strongest; GLUE: never cut between a heading and what follows
+GLUE, WORD, LINE, SENTENCE, BLOCK, HEADING = -1, 0, 1, 2, 3, 4
+
+_LIST_ITEM_RE = re.compile(r"(?:[-–•●▪◦*·]|\(?\d{1,2}[.)]|\(?[a-zA-Z][.)])\s+\S")
+_NUMBERED_RE = re.compile(r"\d+(?:\.\d+)*\.?\s+[A-ZÀ-Ý]")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+(?=\S)")
+_PARAGRAPH_END = tuple(".!?…:")
+_HEADING_MAX_CHARS = 80
+_HEADING_MAX_WORDS = 12
+_WORD_RE = re.compile(r"\S+\s*")
+
+
+def _is_heading(line, after_paragraph):
+    words = line.split()
+    if len(line) > _HEADING_MAX_CHARS or len(words) > _HEADING_MAX_WORDS or line.endswith(tuple(".,;!?…")):
+        return False
+    if line.endswith(":"):  # "Les plus :", not "Pièces à fournir par le client titulaire du compte :"
+        return len(words) <= 4 and after_paragraph
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) >= 4 and sum(c.isupper() for c in letters) >= 0.6 * len(letters):
+        return True
+    return bool(_NUMBERED_RE.match(line)) or (after_paragraph and len(line) < 60 and line[:1].isupper())
+
+
+def _line_breaks(page):
+    """{offset: break strength} at the start of each non-empty line of a page."""
+    breaks = {}
+    offset, previous, previous_heading, blank = 0, "", False, True
+    for raw in page.splitlines(keepends=True):
+        line = raw.strip()
+        if line:
+            start = offset + len(raw) - len(raw.lstrip())
+            after_paragraph = blank or previous.endswith(_PARAGRAPH_END)
+            heading = not previous_heading and _is_heading(line, after_paragraph)
+            if previous_heading:
+                breaks[start] = GLUE
+            elif heading:
+                breaks[start] = HEADING
+            elif blank or _LIST_ITEM_RE.match(line) or (after_paragraph and line[:1].isupper()):
+                breaks[start] = BLOCK
+            else:
+                breaks[start] = LINE
+            previous, previous_heading = line, heading
+        blank = not line
+        offset += len(raw)
+    return breaks
+
+
+def units(page, max_tokens):
+    """(start, end, break strength before it, tokens) of the units of a page, in order."""
+    breaks = _line_breaks(page)
+    for match in _SENTENCE_RE.finditer(page):
+        if breaks.get(match.end(), LINE) == LINE:
+            breaks[match.end()] = SENTENCE
+    starts = sorted(breaks)
+    result = []
+    for start, end in zip(starts, starts[1:] + [len(page)]):
+        tokens = count_tokens(page[start:end])
+        if tokens <= max_tokens:
+            result.append((start, end, breaks[start], tokens))
+            continue
+        # A unit longer than a chunk (a table flattened into one line, a run-on paragraph): word runs
+        piece_start, piece_tokens, strength = start, 0, breaks[start]
+        for word in _WORD_RE.finditer(page, start, end):
+            word_tokens = count_tokens(word.group())
+            if piece_tokens and piece_tokens + word_tokens > max_tokens // 2:
+                result.append((piece_start, word.start(), strength, piece_tokens))
+                piece_start, piece_tokens, strength = word.start(), 0, WORD
+            piece_tokens += word_tokens
+        result.append((piece_start, end, strength, piece_tokens))
+    return result
+
+
+def _overlap_start(page, page_units, first, cut, overlap):
+    """Start offset of the last `overlap` tokens of units[first:cut] (not the whole chunk), and their tokens."""
+    tokens, start = 0, None
+    for i in range(cut - 1, first, -1):
+        if tokens + page_units[i][3] > overlap:
+            break
+        tokens += page_units[i][3]
+        start = page_units[i][0]
+    if start is not None:
+        return start, tokens
+    # The last unit alone is longer than the overlap: its last words
+    unit_start, unit_end = page_units[cut - 1][:2]
+    for word in reversed(list(_WORD_RE.finditer(page, unit_start, unit_end))):
+        word_tokens = count_tokens(word.group())
+        if tokens + word_tokens > overlap:
+            break
+        tokens += word_tokens
+        start = word.start()
+    return (start, tokens) if start is not None and start > unit_start else (None, 0)
+
+
+def page_spans(page, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """(start, end) offsets of the chunks of one page."""
+    page_units = units(page, max_tokens)
+    spans = []
+    i, carried_start, carried_tokens = 0, None, 0
+    while i < len(page_units):
+        total, j = carried_tokens, i
+        while j < len(page_units) and (j == i or total + page_units[j][3] <= max_tokens):
+            total += page_units[j][3]
+            j += 1
+        if j < len(page_units):
+            # Cut before the strongest break that leaves the chunk at least MIN_FILL full
+            cut, filled = j, carried_tokens
+            for k in range(i + 1, j + 1):
+                filled += page_units[k - 1][3]
+                if filled >= max_tokens * MIN_FILL and page_units[k][2] >= page_units[cut][2]:
+                    cut = k
+            if page_units[cut][2] == GLUE and cut - 1 > i:  # do not leave a heading at the end of a chunk
+                cut -= 1
+            j = cut
+        start = carried_start if carried_start is not None else page_units[i][0]
+        spans.append((start, page_units[j - 1][1]))
+        carried_start, carried_tokens = None, 0
+        if j < len(page_units) and page_units[j][2] <= SENTENCE and overlap:
+            carried_start, carried_tokens = _overlap_start(page, page_units, i, j, overlap)
+        i = j
+    # Offsets of the text itself, without the whitespace around it
+    trimmed = []
+    for start, end in spans:
+        text = page[start:end]
+        start += len(text) - len(text.lstrip())
+        end -= len(text) - len(text.rstrip())
+        if end > start:
+            trimmed.append((start, end))
+    return trimmed
+
+
+def structured_spans(text, page_starts, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """(start, end) offsets of the chunks of a document; no chunk crosses a page boundary."""
+    spans = []
+    for start, end in zip(page_starts, page_starts[1:] + [len(text)]):
+        spans += [(start + s, start + e) for s, e in page_spans(text[start:end], max_tokens, overlap)]
+    return spans
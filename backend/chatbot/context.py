@@ -0,0 +1,109 @@
+"""
+Token-budget context assembly for the LLM prompt.
+
+Instead of cutting each retrieved chunk at 300 characters and joining them
+all, the assembler:
+
+- walks the candidates in MMR order (relevance vs. overlap with what is already
+  selected) and drops near-duplicates outright,
+- stops at a token budget, using the token count stored with each chunk,
+- shortens the last chunk at a sentence boundary instead of mid-word (the
+  best chunk, when even its first sentence is too long, between two words).
+
+Token counts are an estimate (Mistral's tokenizer is not available in the
+Django process): about one token per 4 characters of a word, plus one per
+punctuation mark, which stays within ~10% for French text.
+"""
+import re
+
+from .rag_config import CONTEXT_DUPLICATE_SIMILARITY, CONTEXT_MMR_LAMBDA, CONTEXT_TOKEN_BUDGET
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?;:])\s+|\n\s*\n")
+
+
+def count_tokens(text):
+    return sum((len(piece) + 3) // 4 for piece in _WORD_RE.findall(text or ""))
+
+
+def split_sentences(text):
+    return [s for s in _SENTENCE_END_RE.split(text) if s.strip()]
+
+
+def shingles(text, n=3):
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))}
+
+
+def similarity(a, b):
+    """Jaccard similarity of word 3-gram sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def fit_words(text, budget):
+    """The longest prefix of whole words of `text` that fits in `budget` tokens."""
+    kept, used = [], 0
+    for word in text.split():
+        cost = count_tokens(word)
+        if used + cost > budget:
+            break
+        kept.append(word)
+        used += cost
+    return " ".join(kept), used
+
+
+def fit_sentences(sentences, budget):
+    """The longest prefix of the whole `sentences` that fits in `budget` tokens."""
+    kept, used = [], 0
+    for sentence in sentences:
+        cost = count_tokens(sentence)
+        if used + cost > budget:
+            break
+        kept.append(sentence)
+        used += cost
+    return " ".join(kept), used
+
+
+def pack_context(chunks, token_budget=CONTEXT_TOKEN_BUDGET, token_counts=None,
+                 mmr_lambda=CONTEXT_MMR_LAMBDA, duplicate_similarity=CONTEXT_DUPLICATE_SIMILARITY):
+    """
+    Assemble the prompt context from `chunks` (most relevant first).
+
+    Returns (context, used_tokens, n_chunks).
+    """
+    # Sentences are split on the layout (paragraph breaks), then its whitespace is collapsed: it only costs tokens
+    sentences = [[" ".join(s.split()) for s in split_sentences(c)] for c in chunks]
+    chunks = [" ".join(s) for s in sentences]
+    if token_counts is None:
+        token_counts = [count_tokens(c) for c in chunks]
+    relevance = [1.0 / (rank + 1) for rank in range(len(chunks))]
+    chunk_shingles = [shingles(c) for c in chunks]
+
+    remaining = list(range(len(chunks)))
+    selected, parts, used = [], [], 0
+    while remaining and used < token_budget:
+        def mmr(i):
+            redundancy = max((similarity(chunk_shingles[i], chunk_shingles[j]) for j in selected), default=0.0)
+            return mmr_lambda * relevance[i] - (1 - mmr_lambda) * redundancy, redundancy
+
+        best = max(remaining, key=lambda i: mmr(i)[0])
+        remaining.remove(best)
+        if mmr(best)[1] >= duplicate_similarity:
+            continue  # says nothing the context does not already say
+        if not chunks[best]:
+            continue
+
+        if used + token_counts[best] <= token_budget:
+            text, cost = chunks[best], token_counts[best]
+        else:
+            text, cost = fit_sentences(sentences[best], token_budget - used)
+            if not text and not parts:  # the best chunk is not dropped for a long first sentence
+                text, cost = fit_words(sentences[best][0], token_budget - used)
+            if not text:
+                continue
+        selected.append(best)
+        parts.append(text)
+        used += cost
+    return "\n\n".join(parts), used, len(parts)
@@ -0,0 +1,82 @@
+"""
+Duplicate chunk detection for the index builder.
+
+Several PDFs are near-copies of each other (the ATBNET/ATBMOBILE subscription
+form and its -TRE variant, forms that exist in two places), so the same text
+would be indexed several times and fill every retrieval slot with copies.
+A chunk is a duplicate of an indexed one when
+
+- its normalized text hashes the same (exact duplicate), or
+- the cosine of the two embeddings is at least DEDUP_SIMILARITY (near duplicate).
+
+retriever_setup.py then stores it once: the chunk store records the extra
+source reference (see ChunkStoreWriter.add_reference) and no vector is added.
+"""
+import hashlib
+import unicodedata
+
+import faiss
+import numpy as np
+
+from .rag_config import DEDUP_SIMILARITY
+
+
+def chunk_hash(text):
+    """Hash of the text with case, unicode form and whitespace normalized."""
+    normalized = " ".join(unicodedata.normalize("NFKC", text).lower().split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+
+class ChunkDeduplicator:
+    """
+    Finds the indexed chunk a new chunk duplicates.
+
+    `index`/`meta` are the FAISS index being updated (incremental builds): its
+    vectors are searched as they are; chunks added during this build are kept
+    in a small exact index of their own.
+    """
+
+    def __init__(self, texts=(), index=None, meta=None, similarity=DEDUP_SIMILARITY, dim=None):
+        self.hashes = {chunk_hash(text): chunk_id for chunk_id, text in texts}
+        # Near-duplicate search needs cosine scores, i.e. an inner-product index of unit vectors
+        self.index = index if index is not None and meta and meta.get("metric") == "ip" and index.ntotal else None
+        self.similarity = similarity
+        self.new_index = None
+        self.new_ids = []
+        self.dim = dim
+        self.duplicates = 0
+
+    def find(self, text, vector):
+        """Id of the chunk that `text` (embedded as `vector`) duplicates, or None."""
+        chunk_id = self.hashes.get(chunk_hash(text))
+        if chunk_id is None and self.similarity <= 1.0:
+            chunk_id = self._nearest(vector)
+        if chunk_id is not None:
+            self.duplicates += 1
+        return chunk_id
+
+    def add(self, chunk_id, text, vector):
+        self.hashes.setdefault(chunk_hash(text), chunk_id)
+        if self.similarity > 1.0:
+            return
+        if self.new_index is None:
+            self.new_index = faiss.IndexFlatIP(self.dim or len(vector))
+        self.new_index.add(self._unit(vector))
+        self.new_ids.append(chunk_id)
+
+    def _nearest(self, vector):
+        query = self._unit(vector)
+        best_id, best_score = None, self.similarity
+        for index, to_id in ((self.index, int), (self.new_index, lambda i: self.new_ids[i])):
+            if index is None or not index.ntotal:
+                continue
+            D, I = index.search(query, 1)
+            if I[0][0] >= 0 and D[0][0] >= best_score:
+                best_id, best_score = to_id(I[0][0]), D[0][0]
+        return best_id
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.array(vector, dtype="float32").reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
@@ -0,0 +1,92 @@
+"""
+Document-level index for two-stage retrieval.
+
+retriever_setup.py stores one vector per source document in documents.npz:
+the embedding of its title and opening lines, blended with the centroid of
+its chunk embeddings. The retriever first picks the DOCUMENT_CANDIDATES
+documents nearest to the query (a matrix product over a few hundred rows at
+most) and then searches only the chunks of those documents, so the chunk
+search no longer grows with the documents that are obviously irrelevant.
+"""
+import os
+
+import numpy as np
+
+from .rag_config import EMBEDDING_DIM
+
+DOCUMENT_INDEX_FILE = "documents.npz"
+SUMMARY_CHARS = 600  # opening text embedded with the title
+
+
+def unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def document_title(source):
+    """"credit/Demande-de-credit-aux-particuliers.pdf" -> "Demande de credit aux particuliers"."""
+    name = os.path.splitext(os.path.basename(source))[0]
+    return " ".join(name.replace("_", " ").replace("-", " ").split())
+
+
+def document_summary(text, size=SUMMARY_CHARS):
+    """The opening of the document, whitespace collapsed, cut at a word boundary."""
+    text = " ".join(text.split())
+    return text if len(text) <= size else text[:size].rsplit(" ", 1)[0]
+
+
+def document_text(source, text):
+    """What is embedded for a document: its title and the start of its text."""
+    return f"{document_title(source)}. {document_summary(text)}"
+
+
+def document_vector(summary_embedding, chunk_embeddings):
+    """Unit vector of a document: its title + summary embedding plus the centroid of its chunks."""
+    centroid = unit_rows(chunk_embeddings).mean(axis=0)
+    return unit_rows(unit_rows(summary_embedding) + unit_rows(centroid))
+
+
+class DocumentIndex:
+    def __init__(self, sources=(), vectors=None, dim=EMBEDDING_DIM):
+        self.sources = list(sources)
+        self.vectors = np.zeros((0, dim), dtype=np.float32) if vectors is None else \
+            np.asarray(vectors, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.sources)
+
+    @classmethod
+    def load(cls, index_dir):
+        """The document index of index_dir, or None if it was built without one."""
+        path = os.path.join(index_dir, DOCUMENT_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data["sources"].tolist(), data["vectors"])
+
+    def save(self, index_dir):
+        np.savez(os.path.join(index_dir, DOCUMENT_INDEX_FILE),
+                 sources=np.array(self.sources, dtype=str), vectors=self.vectors)
+
+    def set_document(self, source, vector):
+        self.remove_document(source)
+        self.sources.append(source)
+        self.vectors = np.vstack([self.vectors, np.asarray(vector, dtype=np.float32).reshape(1, -1)])
+
+    def remove_document(self, source):
+        if source in self.sources:
+            i = self.sources.index(source)
+            del self.sources[i]
+            self.vectors = np.delete(self.vectors, i, axis=0)
+
+    def search(self, query_vecs, m, allowed=None):
+        """
+        The m documents nearest to each query (cosine), as lists of source names.
+        `allowed` optionally restricts the candidates to a set of sources.
+        """
+        scores = unit_rows(query_vecs) @ self.vectors.T
+        if allowed is not None:
+            scores[:, [i for i, source in enumerate(self.sources) if source not in allowed]] = -np.inf
+        m = min(m, len(self.sources))
+        top = np.argsort(-scores, axis=1)[:, :m]
+        return [[self.sources[j] for j in row if np.isfinite(scores[i, j])] for i, row in enumerate(top)]
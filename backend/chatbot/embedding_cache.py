@@ -0,0 +1,214 @@
+"""
+On-disk cache of chunk embeddings for the index builder.
+
+Every build used to encode every chunk again, even when one PDF changed or
+only the index type, the vector compression or the dedup threshold did. The
+builder now encodes through CachedEncoder: texts whose vectors are in the
+cache are not encoded, and the model is not even loaded when nothing is new.
+
+One directory per model revision and backend (onnx-int8 vectors differ from
+torch ones, see model_registry.model_version) under EMBEDDING_CACHE_DIR:
+
+    embedding_cache/paraphrase-MiniLM-L6-v2_3bf4b6c7e5a1--torch/
+        meta.json     {"model": ..., "dim": 384}
+        keys.bin      16-byte hash of each text (NFKC, whitespace collapsed), one per row
+        vectors.f32   float32 rows, memory-mapped for reads
+
+Both files are only appended to, vectors first, so a build killed mid-write
+leaves at worst a partial last row that is ignored on the next open. Lookups
+go through a sorted copy of the first 8 bytes of the keys (searchsorted); the
+full 16 bytes are compared on a hit. One builder writes to a cache at a time.
+
+    cd backend
+    python -m chatbot.embedding_cache stats
+    python -m chatbot.embedding_cache clear
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import unicodedata
+
+import numpy as np
+
+from .model_registry import model_version
+from .rag_config import EMBEDDING_BACKEND, EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME
+
+KEYS_FILE = "keys.bin"
+VECTORS_FILE = "vectors.f32"
+META_FILE = "meta.json"
+KEY_BYTES = 16
+
+
+def text_key(text):
+    """
+    Hash of the text as the model sees it: NFKC and whitespace collapsed. Case
+    is kept (unlike dedup.chunk_hash): a cased model embeds "Sakan" and "sakan" differently.
+    """
+    normalized = " ".join(unicodedata.normalize("NFKC", text).split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+
+def model_id(model=EMBEDDING_MODEL_NAME, backend=EMBEDDING_BACKEND):
+    return f"{model_version(model)}--{backend}"
+
+
+class EmbeddingCache:
+    def __init__(self, path, model=None):
+        model = model or model_id()
+        self.path = os.path.join(path, re.sub(r"[^\w.-]+", "_", model))
+        self.model = model
+        self.dim = None
+        self._keys = np.zeros((0, 2), dtype="<u8")
+        self._sorted = np.zeros(0, dtype="<u8")
+        self._order = np.zeros(0, dtype=np.int64)
+        self._new = {}  # key -> row, for the rows appended since the cache was opened
+        self._vectors = None
+        self._load()
+
+    def __len__(self):
+        return len(self._keys) + len(self._new)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        try:
+            with open(self._file(META_FILE), encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        except FileNotFoundError:
+            return
+        rows = min(os.path.getsize(self._file(KEYS_FILE)) // KEY_BYTES,
+                   os.path.getsize(self._file(VECTORS_FILE)) // (4 * self.dim))
+        self._keys = np.fromfile(self._file(KEYS_FILE), dtype="<u8", count=2 * rows).reshape(rows, 2)
+        for name, row_bytes in ((KEYS_FILE, KEY_BYTES), (VECTORS_FILE, 4 * self.dim)):
+            if os.path.getsize(self._file(name)) != rows * row_bytes:  # interrupted append
+                os.truncate(self._file(name), rows * row_bytes)
+        self._vectors = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode="r",
+                                  shape=(rows, self.dim)) if rows else None
+        self._reindex()
+
+    def _reindex(self):
+        self._order = np.argsort(self._keys[:, 0], kind="stable")
+        self._sorted = self._keys[self._order, 0]
+
+    def lookup(self, keys):
+        """Cache row of each 16-byte key, -1 when missing."""
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if keys and len(self._keys):
+            wanted = np.frombuffer(b"".join(keys), dtype="<u8").reshape(-1, 2)
+            positions = np.minimum(np.searchsorted(self._sorted, wanted[:, 0]), len(self._sorted) - 1)
+            found = self._order[positions]
+            rows = np.where((self._keys[found] == wanted).all(axis=1), found, -1)
+        if self._new:
+            for i, key in enumerate(keys):
+                if rows[i] < 0:
+                    rows[i] = self._new.get(key, -1)
+        return rows
+
+    def vectors(self, rows):
+        return np.array(self._vectors[rows], dtype=np.float32)
+
+    def add(self, keys, vectors):
+        """Append new (key, vector) rows; keys already cached must not be passed again."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+        if self.dim is None:
+            os.makedirs(self.path, exist_ok=True)
+            self.dim = vectors.shape[1]
+            for name in (KEYS_FILE, VECTORS_FILE):
+                open(self._file(name), "wb").close()
+            with open(self._file(META_FILE), "w", encoding="utf-8") as f:
+                json.dump({"model": self.model, "dim": self.dim}, f)
+        with open(self._file(VECTORS_FILE), "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self._file(KEYS_FILE), "ab") as f:
+            f.write(b"".join(keys))
+        for key in keys:
+            self._new[key] = len(self)
+        self._vectors = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode="r", shape=(len(self), self.dim))
+
+    def size_mb(self):
+        if self.dim is None:
+            return 0.0
+        return sum(os.path.getsize(self._file(name)) for name in (KEYS_FILE, VECTORS_FILE)) / 2**20
+
+
+class CachedEncoder:
+    """
+    encode() like the embedding model, through an EmbeddingCache. `load_model`
+    is called on the first text the cache does not have, so a build that
+    encodes nothing new does not load the model.
+    """
+
+    def __init__(self, load_model, cache):
+        self._load_model = load_model
+        self._model = None
+        self.cache = cache
+        self.hits = 0
+        self.encoded = 0
+
+    def encode(self, sentences, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        keys = [text_key(text) for text in texts]
+        rows = self.cache.lookup(keys)
+        missing = {}  # key -> first text with it, in order
+        for text, key, row in zip(texts, keys, rows):
+            if row < 0:
+                missing.setdefault(key, text)
+        if missing:
+            if self._model is None:
+                self._model = self._load_model()
+            vectors = np.asarray(self._model.encode(list(missing.values()), **kwargs), dtype=np.float32)
+            self.cache.add(list(missing), vectors.reshape(len(missing), -1))
+            rows = self.cache.lookup(keys)
+        self.hits += int(len(texts) - len(missing))
+        self.encoded += len(missing)
+        vectors = self.cache.vectors(rows)
+        return vectors[0] if single else vectors
+
+    def get_sentence_embedding_dimension(self):
+        if self.cache.dim is not None:
+            return self.cache.dim
+        if self._model is None:
+            self._model = self._load_model()
+        return self._model.get_sentence_embedding_dimension()
+
+
+def cached_encoder(load_model, backend=EMBEDDING_BACKEND, model=EMBEDDING_MODEL_NAME, path=EMBEDDING_CACHE_DIR):
+    """A CachedEncoder for the model, or the model itself when the cache is disabled (empty path)."""
+    if not path:
+        return load_model()
+    return CachedEncoder(load_model, EmbeddingCache(path, model_id(model, backend)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the embedding cache of the index builder")
+    parser.add_argument("command", choices=("stats", "clear"))
+    parser.add_argument("--path", default=EMBEDDING_CACHE_DIR)
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.path):
+        print(f"No embedding cache in {args.path}")
+        return
+    for name in sorted(os.listdir(args.path)):
+        path = os.path.join(args.path, name)
+        if args.command == "clear":
+            shutil.rmtree(path)
+            print(f"🗑️ {name} removed")
+            continue
+        try:
+            with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+                model = json.load(f)["model"]
+        except (FileNotFoundError, ValueError, KeyError):
+            continue
+        cache = EmbeddingCache(args.path, model)
+        print(f"💽 {model}: {len(cache)} vectors ({cache.dim} dims), {cache.size_mb():.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Standalone embedding server with dynamic micro-batching.
+
+Without it every Django worker holds its own copy of the model and encodes
+one sentence per request. The server holds a single copy; requests that
+arrive within EMBEDDING_BATCH_WINDOW_MS of each other are encoded together
+(up to EMBEDDING_MAX_BATCH texts), which is several times cheaper per text
+on CPU than one forward pass each.
+
+    cd backend
+    python -m chatbot.embedding_server --bind unix:/run/chatbot-embed.sock
+    CHATBOT_EMBEDDING_SERVER=unix:/run/chatbot-embed.sock gunicorn backend.wsgi -c gunicorn.conf.py
+
+Protocol (HTTP/1.0, over a Unix socket or localhost TCP):
+
+- POST /encode  {"texts": [...]} -> float32 matrix, row-major, dimension in X-Embedding-Dim
+- GET  /health  -> model, backend, dimension and batching statistics
+
+Errors are answered as {"error": "..."}: 400 when "texts" is not a list of
+strings, 500 when the model fails on them (only the request with the
+offending texts fails, not the others of its batch).
+
+EmbeddingClient is what the retriever uses as its embedding_model when
+CHATBOT_EMBEDDING_SERVER is set; if the server cannot be reached it loads the
+model in-process and retries the server after a cool-down. An error answer
+is raised to the caller as EmbeddingServerError: the server is up, and the
+model in-process would fail on the same texts.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import numpy as np
+
+from .embeddings import EMBEDDING_BACKENDS, load_embedding_model
+from .rag_config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_BATCH_WINDOW_MS,
+    EMBEDDING_MAX_BATCH,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_SERVER,
+    EMBEDDING_SERVER_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BIND = "http://127.0.0.1:8765"
+RETRY_AFTER = 30.0  # seconds of in-process encoding before trying the server again
+
+
+class EmbeddingServerError(Exception):
+    """The embedding server answered an error (see the module docstring); `status` is its HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(f"embedding server answered {status}: {message}")
+        self.status = status
+
+
+class MicroBatcher:
+    """Collects concurrent encode calls and runs them through the model as one batch."""
+
+    def __init__(self, model, window_ms=EMBEDDING_BATCH_WINDOW_MS, max_batch=EMBEDDING_MAX_BATCH):
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        threading.Thread(target=self._run, name="embedding-batcher", daemon=True).start()
+
+    def encode(self, texts):
+        if isinstance(texts, str) or not all(isinstance(text, str) for text in texts):
+            raise TypeError("texts must be a list of strings")
+        future = Future()
+        self.requests.put((list(texts), future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            pending = [self.requests.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.window
+            while size < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(self.requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+                size += len(pending[-1][0])
+            self._encode(pending)
+
+    def _encode(self, pending):
+        texts = [text for request_texts, _ in pending for text in request_texts]
+        try:
+            vectors = np.asarray(self.model.encode(texts, batch_size=self.max_batch), dtype=np.float32)
+            vectors = vectors.reshape(len(texts), -1)
+        except Exception as e:
+            if len(pending) == 1:
+                pending[0][1].set_exception(e)
+                return
+            # Encode the requests one by one, so only the one that fails gets the error
+            for request in pending:
+                self._encode([request])
+            return
+        self.batches += 1
+        self.texts += len(texts)
+        start = 0
+        for request_texts, future in pending:
+            future.set_result(vectors[start:start + len(request_texts)])
+            start += len(request_texts)
+
+    def stats(self):
+        return {"batches": self.batches, "texts": self.texts,
+                "mean_batch": self.texts / self.batches if self.batches else 0.0}
+
+
+class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+    server_version = "ChatbotEmbedding/1.0"
+
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_error(404)
+            return
+        info = dict(self.server.info, **self.server.batcher.stats())
+        self._reply(200, json.dumps(info).encode("utf-8"), "application/json")
+
+    def do_POST(self):
+        if self.path != "/encode":
+            self.send_error(404)
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            texts = json.loads(self.rfile.read(length))["texts"]
+        except (ValueError, KeyError, TypeError):
+            texts = None
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            self._error(400, 'expected {"texts": [...]} with a list of strings')
+            return
+        if not texts:
+            vectors = np.zeros((0, self.server.info["dimension"]), dtype=np.float32)
+        else:
+            try:
+                vectors = self.server.batcher.encode(texts)
+            except Exception as e:
+                logger.exception("Encoding %d texts failed", len(texts))
+                self._error(500, f"encoding failed: {e}")
+                return
+        self._reply(200, vectors.tobytes(), "application/octet-stream",
+                    {"X-Embedding-Dim": str(vectors.shape[1])})
+
+    def _error(self, status, message):
+        self._reply(status, json.dumps({"error": message}).encode("utf-8"), "application/json")
+
+    def _reply(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class TCPHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 128  # every gunicorn thread may connect at once
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)  # left behind by a previous run
+        super().server_bind()
+
+
+def make_server(bind, model, backend):
+    """HTTP server on "unix:/path" or "http://host:port" that encodes through a MicroBatcher."""
+    address = urlparse(bind)
+    if address.scheme == "unix":
+        server = UnixHTTPServer(address.path, EmbeddingRequestHandler)
+    else:
+        server = TCPHTTPServer((address.hostname or "127.0.0.1", address.port or 8765), EmbeddingRequestHandler)
+    server.batcher = MicroBatcher(model)
+    server.info = {"model": EMBEDDING_MODEL_NAME, "backend": backend,
+                   "dimension": model.get_sentence_embedding_dimension()}
+    return server
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class EmbeddingClient:
+    """
+    Drop-in replacement for SentenceTransformer.encode that asks the embedding server.
+
+    When the server is down or too slow the model is loaded in this process
+    (once) and used until RETRY_AFTER seconds have passed; error answers are
+    raised as EmbeddingServerError.
+    """
+
+    def __init__(self, address=EMBEDDING_SERVER, timeout=EMBEDDING_SERVER_TIMEOUT, backend=EMBEDDING_BACKEND):
+        self.address = urlparse(address)
+        self.timeout = timeout
+        self.backend = backend
+        self._local_model = None
+        self._local_lock = threading.Lock()
+        self._retry_at = 0.0
+
+    def _connection(self):
+        if self.address.scheme == "unix":
+            return UnixHTTPConnection(self.address.path, self.timeout)
+        return http.client.HTTPConnection(self.address.hostname, self.address.port, timeout=self.timeout)
+
+    def _request(self, method, path, body=None):
+        connection = self._connection()
+        try:
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+            if response.status != 200:
+                try:
+                    message = json.loads(data)["error"]
+                except (ValueError, KeyError, TypeError):
+                    message = data[:200].decode("utf-8", "replace")
+                raise EmbeddingServerError(response.status, message)
+            return response, data
+        finally:
+            connection.close()
+
+    def local_model(self):
+        if self._local_model is None:
+            with self._local_lock:
+                if self._local_model is None:
+                    self._local_model = load_embedding_model(backend=self.backend)
+        return self._local_model
+
+    def get_sentence_embedding_dimension(self):
+        try:
+            return json.loads(self._request("GET", "/health")[1])["dimension"]
+        except (OSError, http.client.HTTPException):
+            return self.local_model().get_sentence_embedding_dimension()
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if time.monotonic() >= self._retry_at:
+            try:
+                response, data = self._request("POST", "/encode", json.dumps({"texts": texts}).encode("utf-8"))
+                dim = int(response.getheader("X-Embedding-Dim"))
+                vectors = np.frombuffer(bytearray(data), dtype=np.float32).reshape(len(texts), dim)
+                return vectors[0] if single else vectors
+            except (OSError, http.client.HTTPException) as e:  # connection refused or lost, timeout
+                logger.warning("Embedding server unavailable (%s), encoding in-process", e)
+                self._retry_at = time.monotonic() + RETRY_AFTER
+        return self.local_model().encode(sentences, batch_size=batch_size, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bind", default=EMBEDDING_SERVER or DEFAULT_BIND,
+                        help='"unix:/path/to.sock" or "http://127.0.0.1:8765"')
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    model = load_embedding_model(backend=args.embedding_backend)
+    server = make_server(args.bind, model, args.embedding_backend)
+    print(f"🧠 Embedding server ({args.embedding_backend}) listening on {args.bind}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
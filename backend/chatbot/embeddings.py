@@ -0,0 +1,225 @@
+"""
+Embedding backends shared by retriever.py (queries) and retriever_setup.py (chunks).
+
+- torch:     SentenceTransformer on CPU (the reference)
+- onnx:      the same network exported to ONNX and run with ONNX Runtime
+- onnx-int8: the ONNX export with dynamically quantized int8 weights
+
+The ONNX backends do not import torch at all, which also removes torch from
+the memory of every serving process. Export them once with
+
+    python -m chatbot.embeddings export --quantize
+
+which checks that the cosine similarities stay within tolerance of torch.
+
+The torch backend loads the model pinned in the local model registry by path,
+without Hugging Face hub lookups (see model_registry.py).
+"""
+import argparse
+import inspect
+import json
+import os
+import sys
+
+import numpy as np
+
+from .model_registry import resolve_model
+from .rag_config import EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME, ONNX_DIR
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model-int8.onnx"
+ONNX_CONFIG_FILE = "onnx_config.json"
+
+# Max |cos_torch - cos_backend| over query/text similarity pairs
+EQUIVALENCE_TOLERANCE = {"onnx": 1e-3, "onnx-int8": 0.03}
+
+
+def onnx_model_dir(model_name=EMBEDDING_MODEL_NAME):
+    return os.path.join(ONNX_DIR, os.path.basename(model_name.rstrip("/\\")))
+
+
+class OnnxEmbeddingModel:
+    """Drop-in replacement for SentenceTransformer.encode backed by ONNX Runtime."""
+
+    def __init__(self, model_dir, quantized=False, threads=0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE), encoding="utf-8") as f:
+            config = json.load(f)
+        self.dimension = config["dimension"]
+        self.normalize = config["normalize"]
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(config["max_seq_length"])
+        self.tokenizer.no_padding()
+        self.pad_id = config["pad_token_id"]
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        path = os.path.join(model_dir, ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE)
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        single = isinstance(sentences, str)
+        encodings = self.tokenizer.encode_batch([sentences] if single else list(sentences))
+        out = np.zeros((len(encodings), self.dimension), dtype=np.float32)
+        # Batch texts of similar length together to minimise padding
+        order = sorted(range(len(encodings)), key=lambda i: len(encodings[i].ids))
+        for start in range(0, len(order), batch_size):
+            batch = [encodings[i] for i in order[start:start + batch_size]]
+            width = max(len(e.ids) for e in batch)
+            feeds = {
+                "input_ids": np.full((len(batch), width), self.pad_id, dtype=np.int64),
+                "attention_mask": np.zeros((len(batch), width), dtype=np.int64),
+                "token_type_ids": np.zeros((len(batch), width), dtype=np.int64),
+            }
+            for row, e in enumerate(batch):
+                feeds["input_ids"][row, :len(e.ids)] = e.ids
+                feeds["attention_mask"][row, :len(e.ids)] = 1
+            embeddings = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+            out[order[start:start + batch_size]] = embeddings
+        if self.normalize:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
+
+
+def load_embedding_model(name=EMBEDDING_MODEL_NAME, backend=EMBEDDING_BACKEND):
+    if backend == "torch":
+        path = resolve_model(name)  # before the import: huggingface_hub reads HF_HUB_OFFLINE when imported
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(path, device="cpu")
+        model.eval()
+        return model
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbeddingModel(onnx_model_dir(name), quantized=backend == "onnx-int8")
+    raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {EMBEDDING_BACKENDS}")
+
+
+def export_onnx(model_name=EMBEDDING_MODEL_NAME, quantize=False):
+    """Export the SentenceTransformer (transformer + mean pooling) to ONNX, optionally int8-quantized."""
+    path = resolve_model(model_name)
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st_model = SentenceTransformer(path, device="cpu")
+    transformer, pooling = st_model[0], st_model[1]
+    pooling_config = pooling.get_config_dict()
+    # "pooling_mode" in sentence-transformers >= 5, one boolean per mode before
+    mode = pooling_config.get("pooling_mode") or ("mean" if pooling_config.get("pooling_mode_mean_tokens") else None)
+    if mode != "mean":
+        raise ValueError(f"Only mean pooling is supported, {model_name} uses {pooling_config}")
+    normalize = any(type(module).__name__ == "Normalize" for module in st_model)
+
+    class MeanPooledEncoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            hidden = self.model(input_ids=input_ids, attention_mask=attention_mask,
+                                token_type_ids=token_type_ids).last_hidden_state
+            mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+            return (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+
+    out_dir = onnx_model_dir(model_name)
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = transformer.tokenizer
+    tokenizer.save_pretrained(out_dir)  # writes tokenizer.json (fast tokenizer)
+    sample = tokenizer(["Comment ouvrir un compte ?"], return_tensors="pt", return_token_type_ids=True)
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    # Recent torch defaults to the dynamo exporter (needs onnxscript); keep the TorchScript one
+    exporter = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(
+        MeanPooledEncoder(transformer.auto_model).eval(),
+        tuple(sample[n] for n in names),
+        os.path.join(out_dir, ONNX_MODEL_FILE),
+        input_names=names,
+        output_names=["sentence_embedding"],
+        dynamic_axes={**{n: {0: "batch", 1: "sequence"} for n in names}, "sentence_embedding": {0: "batch"}},
+        opset_version=17,
+        **exporter,
+    )
+    with open(os.path.join(out_dir, ONNX_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "model": model_name,
+            "dimension": st_model.get_sentence_embedding_dimension(),
+            "max_seq_length": transformer.max_seq_length,
+            "pad_token_id": tokenizer.pad_token_id,
+            "normalize": normalize,
+        }, f, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(os.path.join(out_dir, ONNX_MODEL_FILE), os.path.join(out_dir, ONNX_INT8_MODEL_FILE),
+                         weight_type=QuantType.QInt8)
+    return st_model, out_dir
+
+
+def unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def check_equivalence(reference, candidate, queries, texts, tolerance):
+    """
+    Compare a backend with the torch reference on query/text cosine similarities.
+
+    Returns {"max_error", "mean_error", "min_self_cosine", "ok"}; self cosine
+    is the similarity between the two backends' embeddings of the same text.
+    """
+    ref_q, ref_t = unit(reference.encode(queries)), unit(reference.encode(texts))
+    cand_q, cand_t = unit(candidate.encode(queries)), unit(candidate.encode(texts))
+    error = np.abs(ref_q @ ref_t.T - cand_q @ cand_t.T)
+    self_cosine = np.sum(ref_t * cand_t, axis=1)
+    return {
+        "max_error": float(error.max()),
+        "mean_error": float(error.mean()),
+        "min_self_cosine": float(self_cosine.min()),
+        "ok": bool(error.max() <= tolerance),
+    }
+
+
+def sample_texts():
+    """Questions from chatbot.csv and chunks of the current index, for equivalence checks."""
+    from .benchmarks.batch_throughput import load_questions
+    from .index_versions import current_index_dir
+    from .retrieval_runtime import load_document_chunks
+
+    chunks = load_document_chunks(current_index_dir())
+    return load_questions()[:64], [str(chunks[i]) for i in range(0, len(chunks), max(len(chunks) // 64, 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and check the ONNX embedding backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="export the embedding model to ONNX")
+    export.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    export.add_argument("--quantize", action="store_true", help="also write the int8 model")
+    args = parser.parse_args()
+
+    reference, out_dir = export_onnx(args.model, args.quantize)
+    print(f"💾 ONNX model written to {out_dir}")
+    queries, texts = sample_texts()
+    failed = False
+    for backend in ("onnx", "onnx-int8") if args.quantize else ("onnx",):
+        result = check_equivalence(reference, load_embedding_model(args.model, backend), queries, texts,
+                                   EQUIVALENCE_TOLERANCE[backend])
+        status = "✅" if result["ok"] else "❌"
+        print(f"{status} {backend}: max |Δcos| {result['max_error']:.4f} "
+              f"(tolerance {EQUIVALENCE_TOLERANCE[backend]}), min self-cosine {result['min_self_cosine']:.4f}")
+        failed = failed or not result["ok"]
+    if failed:
+        sys.exit(1)  # do not let a deployment script switch to a backend that is not equivalent
+
+
+if __name__ == "__main__":
+    main()
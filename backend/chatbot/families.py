@@ -0,0 +1,58 @@
+"""
+Document families: which kind of bank document a source belongs to.
+
+retriever_setup.py tags every source with a family (from its sub-directory
+in atb_documents/ if it has one, otherwise from keywords in its filename),
+and the retriever can restrict a search to one family, so a credit question
+is not polluted by ATBNET user-guide chunks and scans fewer vectors.
+"""
+import os
+
+from .lexical import strip_accents, tokenize
+
+FAMILIES = ("credit", "cartes", "ebanking", "comptes", "epargne", "securite", "international", "general")
+
+# First match wins, so the more specific families come first
+SOURCE_RULES = [
+    ("credit", ("credit", "pret", "sakan", "mounassib")),
+    ("cartes", ("carte",)),
+    ("international", ("allocation", "touristique", "devise", "change")),
+    ("ebanking", ("atbnet", "atbmobile", "mobilink", "messenger", "banking", "atbpay")),
+    ("comptes", ("ouverture", "compte")),
+    ("epargne", ("epargne", "portefeuille", "portefeille", "placement")),
+    ("securite", ("protection", "donnees", "securite", "assurance")),
+]
+
+# Query words that route a question to a single family
+QUERY_KEYWORDS = {
+    "credit": {"credit", "credits", "pret", "prets", "emprunt", "sakan", "mounassib", "tahawel", "sayara",
+               "renov", "immobilier", "mensualite", "mensualites"},
+    "cartes": {"carte", "cartes", "visa", "mastercard", "retrait", "retraits", "tpe", "plafond"},
+    "ebanking": {"atbnet", "mobilink", "messenger", "atbpay", "application", "internet", "ligne",
+                 "mobile", "banking", "identifiant", "code"},
+    "comptes": {"ouvrir", "ouverture", "joint", "rib", "cheque", "cheques", "cloturer"},
+    "epargne": {"epargne", "placement", "placements", "sicav", "portefeuille", "interets", "elkhir"},
+    "securite": {"fraude", "securite", "protection", "donnees", "assurance"},
+    "international": {"devise", "devises", "touristique", "allocation", "transfert", "etranger", "change"},
+}
+
+
+def infer_family(source):
+    """Family of a source path such as "credit/Sakan.pdf" or "Demande-de-credit-aux-particuliers.pdf"."""
+    directory = os.path.dirname(source)
+    if directory:
+        top = strip_accents(directory.replace("\\", "/").split("/")[0]).lower()
+        if top in FAMILIES:
+            return top
+    name = strip_accents(os.path.basename(source)).lower().replace("_", " ").replace("-", " ")
+    for family, keywords in SOURCE_RULES:
+        if any(keyword in name for keyword in keywords):
+            return family
+    return "general"
+
+
+def route_family(query):
+    """The single family a question is clearly about, or None to search everything."""
+    words = set(tokenize(query))
+    matches = [family for family, keywords in QUERY_KEYWORDS.items() if words & keywords]
+    return matches[0] if len(matches) == 1 else None
@@ -1,10 +1,12 @@
 import requests
 import logging
 
+from .rag_config import OLLAMA_MODEL, OLLAMA_URL
+
 logger = logging.getLogger(__name__)
 
-def generate_response(question, context):
-    prompt = f"""
+def build_prompt(question, context):
+    return f"""
 Tu es un assistant bancaire intelligent. 
 Réponds toujours de manière claire, concise et utile, en 2 à 3 phrases maximum.
 
@@ -21,11 +23,13 @@ Question du client : {question}
 Réponse :
 """
 
+def generate_response(question, context):
+    prompt = build_prompt(question, context)
     try:
         response = requests.post(
-            "http://localhost:11434/api/generate",
+            OLLAMA_URL,
             json={
-                "model": "mistral",
+                "model": OLLAMA_MODEL,
                 "prompt": prompt,
                 "max_tokens": 250,
                 "stream": False
@@ -0,0 +1,196 @@
+"""
+Versioned index directories, published atomically.
+
+Each build writes a complete index (FAISS index, chunk store, BM25 and
+document indexes, manifest) into a new directory and only then points
+INDEX_DIR/current at it:
+
+    INDEX_DIR/
+        current                       -> "20261018-093012-481516"
+        versions/20261018-093012-481516/faiss_index.bin, chunks.bin, ...
+        versions/20261017-170455-020304/...
+
+A crash during a build leaves a hidden staging directory behind, never a
+half-written index, and the pointer is replaced with os.replace, so a reader
+sees either the old version or the new one. Workers poll the pointer (see
+retrieval_runtime.get_runtime) and swap the new version in without restarting.
+
+Writers hold index_lock (a lock on INDEX_DIR/.lock) from reading the current
+version to publishing and pruning: a second build waits for the first and then
+starts from the version it published, instead of racing it on the pointer or
+having its staging directory pruned as a leftover.
+
+Index directories without a `current` file (built before versioning) are
+read as they are.
+
+    cd backend
+    python -m chatbot.index_versions list
+    python -m chatbot.index_versions publish 20261017-170455-020304   # roll back
+"""
+import argparse
+import contextlib
+import os
+import shutil
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from .rag_config import INDEX_DIR, INDEX_KEEP_VERSIONS
+
+CURRENT_FILE = "current"
+VERSIONS_DIR = "versions"
+LOCK_FILE = ".lock"
+
+
+def current_version(root=INDEX_DIR):
+    """Name of the published version, or None for an unversioned index directory."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_index_dir(root=INDEX_DIR):
+    """Directory holding the index files to serve (root itself when it is not versioned)."""
+    version = current_version(root)
+    return os.path.join(root, VERSIONS_DIR, version) if version else root
+
+
+def pointer_mtime(root=INDEX_DIR):
+    """mtime of the `current` pointer (None without one); changes whenever a version is published."""
+    try:
+        return os.stat(os.path.join(root, CURRENT_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def list_versions(root=INDEX_DIR):
+    """Published version names, oldest first."""
+    path = os.path.join(root, VERSIONS_DIR)
+    if not os.path.isdir(path):
+        return []
+    return sorted(name for name in os.listdir(path)
+                  if not name.startswith(".") and os.path.isdir(os.path.join(path, name)))
+
+
+def staging_dir(root=INDEX_DIR):
+    """Create the hidden directory a new version is written into; returns its path."""
+    name = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+    path = os.path.join(root, VERSIONS_DIR, f".{name}.tmp")
+    os.makedirs(path)
+    return path
+
+
+@contextlib.contextmanager
+def index_lock(root=INDEX_DIR):
+    """Exclusive lock of an index directory between processes; waits for the holder to release it."""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, LOCK_FILE), "a+b") as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                print(f"⏳ Waiting for another build of {root} to finish")
+                fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # gives up after 10 s
+                    break
+                except OSError:
+                    print(f"⏳ Waiting for another build of {root} to finish")
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _fsync(path, directory=False):
+    try:
+        fd = os.open(path, os.O_RDONLY | (getattr(os, "O_DIRECTORY", 0) if directory else 0))
+    except OSError:  # directories cannot be opened on Windows
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def publish(root, path):
+    """
+    Make `path` the current version: a staging directory from staging_dir(),
+    which is renamed to its final name first, or an existing version name.
+    Returns the version name. Call it under index_lock.
+    """
+    versions = os.path.join(root, VERSIONS_DIR)
+    name = os.path.basename(path.rstrip(os.sep))
+    if name.startswith(".") and name.endswith(".tmp"):
+        for filename in os.listdir(path):
+            _fsync(os.path.join(path, filename))
+        name = name[1:-len(".tmp")]
+        os.rename(path, os.path.join(versions, name))
+        _fsync(versions, directory=True)
+    elif not os.path.isdir(os.path.join(versions, name)):
+        raise ValueError(f"No index version {name!r} in {versions}")
+
+    pointer = os.path.join(root, CURRENT_FILE)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(name + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer + ".tmp", pointer)  # atomic: readers see the old or the new name
+    _fsync(root, directory=True)
+    return name
+
+
+def discard(path):
+    """Remove a staging directory that will not be published."""
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def prune_versions(root=INDEX_DIR, keep=INDEX_KEEP_VERSIONS):
+    """
+    Delete all but the `keep` newest versions (never the current one) and
+    leftover staging directories. Workers still reading a deleted version keep
+    their open files and mappings until they have swapped in the new one.
+    Call it under index_lock, so no other build is writing a staging directory.
+    """
+    current = current_version(root)
+    versions = os.path.join(root, VERSIONS_DIR)
+    old = [name for name in list_versions(root)[:-keep or None] if name != current]
+    old += [name for name in os.listdir(versions) if name.startswith(".") and name.endswith(".tmp")] \
+        if os.path.isdir(versions) else []
+    for name in old:
+        shutil.rmtree(os.path.join(versions, name), ignore_errors=True)
+    return old
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the index versions or publish (roll back to) one")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="list the versions, marking the current one")
+    publish_parser = sub.add_parser("publish", help="make an existing version current")
+    publish_parser.add_argument("version")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        current = current_version(args.index_dir)
+        for name in list_versions(args.index_dir):
+            print(f"{'*' if name == current else ' '} {name}")
+    else:
+        with index_lock(args.index_dir):
+            print(f"📌 Current index version: {publish(args.index_dir, args.version)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Parallel, streaming ingestion for the index builder.
+
+    cd backend
+    python manage.py build_index [--workers 8] [--full] [--restart]
+
+retriever_setup.py reads the documents one after another: extract, embed, add.
+IngestPipeline runs these steps as concurrent stages connected by bounded queues:
+
+    process pool   PyMuPDF extraction, normalization and chunking, one PDF per task
+      -> embed     chunks of consecutive documents encoded together, INGEST_EMBED_BATCH per call
+      -> add       dedup, chunk store, index add (retriever_setup.add_document, in the caller)
+
+Documents of the in-memory connectors (scraped web pages, see sources.py) are
+chunked in the reading thread: sending them to a process costs more than the work.
+
+At most 2 x workers PDFs are extracted ahead of the encoder and
+INGEST_QUEUE_SIZE embedded documents wait to be added, so memory does not grow
+with the corpus. A PDF is the unit of work, not a page: header detection
+compares the pages of a document (see pdf_text.py). Documents come out in
+order, so chunk ids do not depend on which worker finished first.
+
+Every embedded document is checkpointed (chunks and vectors, keyed by its
+source, sha256, the chunking settings and the model) under
+INDEX_DIR/ingest_checkpoint before it is added. When a build is interrupted, running it again reads those
+documents back instead of extracting and encoding them; the checkpoint is
+removed once the version is published.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+from .model_registry import model_version
+from .rag_config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_DIM,
+    INDEX_DIR,
+    INGEST_CHECKPOINT_DIR,
+    INGEST_EMBED_BATCH,
+    INGEST_QUEUE_SIZE,
+    INGEST_WORKERS,
+)
+from .retriever_setup import extract_chunks
+
+PROGRESS_INTERVAL = 2.0  # seconds between two progress lines
+
+_DONE = object()
+
+
+def _put(q, item, stop):
+    """Put `item` on a bounded queue unless the pipeline is stopped first; False if it was."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    """Next item of a queue, or _DONE once the pipeline is stopped."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _text_array(text):
+    # UTF-8 bytes: numpy string arrays drop trailing NUL characters
+    return np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+
+
+class Checkpoint:
+    """The embedded documents of an unfinished build, one .npz file per document."""
+
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def key(source, sha256, chunking, backend=EMBEDDING_BACKEND, model=None):
+        # The source too: the document vector embeds its title, and scraped pages are often saved twice
+        model = model or model_version()
+        settings = json.dumps({"source": source, "sha256": sha256, "chunking": chunking, "model": model,
+                               "backend": backend}, sort_keys=True)
+        return hashlib.sha256(settings.encode("utf-8")).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.npz")
+
+    def load(self, key):
+        """(extracted, chunk embeddings, summary embedding) saved under `key`, or None."""
+        try:
+            with np.load(self._file(key)) as data:
+                text = data["text"].tobytes().decode("utf-8")
+                bounds = np.concatenate([[0], np.cumsum(data["lengths"])]).tolist()
+                extracted = {
+                    "chunks": [text[start:end] for start, end in zip(bounds, bounds[1:])],
+                    "spans": [tuple(span) for span in data["spans"].tolist()],
+                    "pages": data["pages"].tolist(),
+                    "page_count": int(data["page_count"]),
+                    "document_text": data["document_text"].tobytes().decode("utf-8"),
+                    "normalized": tuple(data["normalized"].tolist()),
+                }
+                summary = data["summary"] if len(data["summary"]) else None
+                return extracted, data["embeddings"], summary
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):  # written by an incompatible build
+            os.remove(self._file(key))
+            return None
+
+    def save(self, key, extracted, embeddings, summary_embedding):
+        os.makedirs(self.path, exist_ok=True)
+        spans = extracted["spans"]
+        path = self._file(key)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(
+                f,
+                # The chunks end to end (they may overlap in the document text)
+                text=_text_array("".join(extracted["chunks"])),
+                lengths=np.array([len(chunk) for chunk in extracted["chunks"]], dtype=np.int64),
+                spans=np.array(spans, dtype=np.int64).reshape(len(spans), 2),
+                pages=np.array(extracted["pages"], dtype=np.int32),
+                page_count=np.array(extracted["page_count"]),
+                document_text=_text_array(extracted["document_text"]),
+                normalized=np.array(extracted["normalized"], dtype=np.int64),
+                embeddings=embeddings,
+                summary=summary_embedding if summary_embedding is not None
+                else np.zeros((0, EMBEDDING_DIM), dtype="float32"),
+            )
+        os.replace(path + ".tmp", path)  # a build killed mid-write leaves a .tmp, not a torn checkpoint
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class IngestPipeline:
+    """
+    Extraction, embedding and index add as concurrent stages (see the module
+    docstring). Pass one to retriever_setup.build(pipeline=...); `stats` then
+    holds the throughput of that build.
+    """
+
+    def __init__(self, workers=INGEST_WORKERS, embed_batch=INGEST_EMBED_BATCH, queue_size=INGEST_QUEUE_SIZE,
+                 checkpoint_dir=os.path.join(INDEX_DIR, INGEST_CHECKPOINT_DIR)):
+        self.workers = workers or os.cpu_count() or 1
+        self.embed_batch = embed_batch
+        self.queue_size = queue_size
+        self.checkpoint = Checkpoint(checkpoint_dir)
+        self.stats = {"documents": 0, "resumed": 0, "pages": 0, "chunks": 0, "seconds": 0.0}
+
+    def _read(self, items, chunking, backend, pool, out, stop):
+        """Stage 1: submit each document to the process pool (or load its checkpoint), in order."""
+        try:
+            for item in items:
+                connector, source, sha256 = item
+                key = self.checkpoint.key(source, sha256, chunking, backend)
+                saved = self.checkpoint.load(key)
+                future = None
+                if saved is None and connector.in_process:
+                    future = Future()
+                    future.set_result(extract_chunks(connector, source, chunking))
+                elif saved is None:
+                    future = pool().submit(extract_chunks, connector, source, chunking)
+                if not _put(out, (item, key, future, saved), stop):
+                    return
+            _put(out, _DONE, stop)
+        except BaseException as e:  # raised again in the thread reading the documents
+            _put(out, e, stop)
+
+    def _embed(self, embedding_model, pending, out, stop):
+        """Stage 2: encode the chunks of the extracted documents in batches, checkpoint each one."""
+        try:
+            batch, size, done = [], 0, False
+            while not done:
+                item = _get(pending, stop)
+                if stop.is_set():
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                if item is _DONE:
+                    done = True
+                else:
+                    item, key, future, saved = item
+                    extracted = saved[0] if saved is not None else future.result()
+                    batch.append((item, key, extracted, saved))
+                    if saved is None:
+                        size += len(extracted["chunks"]) + 1
+                # Encode a full batch, or whatever is ready rather than wait for the next document
+                if batch and (done or size >= self.embed_batch or pending.empty()):
+                    for document in self._embed_batch(embedding_model, batch):
+                        if not _put(out, document, stop):
+                            return
+                    batch, size = [], 0
+            _put(out, _DONE, stop)
+        except BaseException as e:
+            _put(out, e, stop)
+
+    def _embed_batch(self, embedding_model, batch):
+        texts = [text for _, _, extracted, saved in batch if saved is None and extracted["chunks"]
+                 for text in extracted["chunks"] + [extracted["document_text"]]]
+        vectors = np.array(embedding_model.encode(texts), dtype="float32").reshape(len(texts), EMBEDDING_DIM) \
+            if texts else None
+        row = 0
+        for item, key, extracted, saved in batch:
+            if saved is not None:
+                yield item, extracted, saved[1], saved[2], True
+                continue
+            n = len(extracted["chunks"])
+            if n:
+                embeddings, summary_embedding = vectors[row:row + n], vectors[row + n:row + n + 1]
+                row += n + 1
+            else:  # scanned PDF without a text layer
+                embeddings, summary_embedding = np.zeros((0, EMBEDDING_DIM), dtype="float32"), None
+            self.checkpoint.save(key, extracted, embeddings, summary_embedding)
+            yield item, extracted, embeddings, summary_embedding, False
+
+    def documents(self, items, embedding_model, chunking, embedding_backend=EMBEDDING_BACKEND):
+        """
+        Yield ((connector, source, sha256), extracted, chunk embeddings, summary
+        embedding) for each (connector, source, sha256) of `items`, in order,
+        while the next documents are extracted and embedded.
+        """
+        if not items:
+            return
+        started = last_report = time.perf_counter()
+        extracted_queue = queue.Queue(maxsize=2 * self.workers)
+        embedded_queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        pools = []
+
+        def pool():
+            # Started on the first PDF: an update of the web pages alone needs no worker processes.
+            # spawn: forking a process that already runs torch / OpenMP threads can deadlock the children
+            if not pools:
+                pools.append(ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn")))
+            return pools[0]
+
+        threads = [
+            threading.Thread(target=self._read, args=(items, chunking, embedding_backend, pool, extracted_queue, stop), daemon=True),
+            threading.Thread(target=self._embed, args=(embedding_model, extracted_queue, embedded_queue, stop),
+                             daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = _get(embedded_queue, stop)
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                document, extracted, embeddings, summary_embedding, resumed = item
+                self.stats["documents"] += 1
+                self.stats["resumed"] += resumed
+                self.stats["pages"] += extracted["page_count"]
+                self.stats["chunks"] += len(extracted["chunks"])
+                print(f"📄 {document[1]}: {extracted['page_count']} pages, {len(extracted['chunks'])} chunks"
+                      f"{' (checkpoint)' if resumed else ''}")
+                yield document, extracted, embeddings, summary_embedding
+                now = time.perf_counter()
+                self.stats["seconds"] = now - started
+                if now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    print(f"⏱️ {self.stats['documents']}/{len(items)} documents, {self.rate('pages'):.1f} pages/s, "
+                          f"{self.rate('chunks'):.1f} chunks/s")
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            for executor in pools:
+                executor.shutdown(wait=True, cancel_futures=True)
+            self.stats["seconds"] = time.perf_counter() - started
+
+    def rate(self, name):
+        """`name` ("pages", "chunks", "documents") per second so far."""
+        return self.stats[name] / self.stats["seconds"] if self.stats["seconds"] else 0.0
@@ -0,0 +1,143 @@
+"""
+BM25 inverted index over the chunk store.
+
+Product names ("Sakan", "Mounassib", "MOBILINK", "ATBPAY") are exact tokens
+that MiniLM embeds poorly; a lexical match finds them reliably and costs no
+transformer pass. retriever_setup.py writes lexical_index.npz next to the
+FAISS index and retriever.py fuses both rankings (reciprocal-rank fusion).
+
+The postings are stored CSR-style in plain numpy arrays (no pickle):
+term t has postings doc_ids[term_offsets[t]:term_offsets[t + 1]].
+"""
+import math
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+import numpy as np
+
+LEXICAL_INDEX_FILE = "lexical_index.npz"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60  # rank offset of reciprocal-rank fusion
+
+_TOKEN_RE = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+    a au aux avec ce ces dans de des du elle en est et il ils je la le les leur lui ma mais me mes
+    mon ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes ton tu un une
+    vos votre vous y l d j m n s t c est
+    the of and to in is for on with my me i
+""".split())
+
+
+def strip_accents(text):
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    """Lowercase, accent-free word tokens without stopwords: "Crédit Sakan" -> ["credit", "sakan"]."""
+    tokens = _TOKEN_RE.findall(strip_accents(text or "").lower())
+    return [t for t in tokens if len(t) > 1 and t not in STOPWORDS]
+
+
+class LexicalIndex:
+    def __init__(self, terms, term_offsets, doc_ids, term_freqs, doc_lengths):
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths  # indexed by chunk id, 0 for removed chunks
+        self.n_docs = int(np.count_nonzero(doc_lengths))
+        self.avg_doc_length = float(doc_lengths.sum()) / max(self.n_docs, 1)
+
+    @classmethod
+    def build(cls, chunks):
+        """Index an iterable of (chunk id, text)."""
+        postings = defaultdict(list)
+        lengths = {}
+        for chunk_id, text in chunks:
+            tokens = tokenize(text)
+            lengths[chunk_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings[term].append((chunk_id, tf))
+        terms = sorted(postings)
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        term_offsets[1:] = np.cumsum([len(postings[t]) for t in terms])
+        doc_ids = np.array([d for t in terms for d, _ in postings[t]], dtype=np.int32)
+        term_freqs = np.array([tf for t in terms for _, tf in postings[t]], dtype=np.float32)
+        doc_lengths = np.zeros(max(lengths, default=-1) + 1, dtype=np.float32)
+        for chunk_id, length in lengths.items():
+            doc_lengths[chunk_id] = length
+        return cls(terms, term_offsets, doc_ids, term_freqs, doc_lengths)
+
+    def save(self, index_dir):
+        terms = sorted(self.terms, key=self.terms.get)
+        np.savez(os.path.join(index_dir, LEXICAL_INDEX_FILE), terms=np.array(terms, dtype=str),
+                 term_offsets=self.term_offsets, doc_ids=self.doc_ids,
+                 term_freqs=self.term_freqs, doc_lengths=self.doc_lengths)
+
+    @classmethod
+    def load(cls, index_dir):
+        """The lexical index of index_dir, or None if it was built without one."""
+        path = os.path.join(index_dir, LEXICAL_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data["terms"].tolist(), data["term_offsets"], data["doc_ids"],
+                       data["term_freqs"], data["doc_lengths"])
+
+    def idf(self, term_id):
+        df = self.term_offsets[term_id + 1] - self.term_offsets[term_id]
+        return math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+
+    def max_idf(self):
+        return math.log(1 + (self.n_docs + 0.5) / 0.5)
+
+    def search(self, query, k):
+        """
+        BM25 top-k for a query.
+
+        Returns (hits, coverage, rarity): hits is [(chunk id, score)],
+        coverage the share of the query's idf mass found in the best chunk
+        (unknown words count with the maximum idf) and rarity the idf of the
+        rarest query word present in that chunk, divided by the maximum idf
+        (1.0: a word that occurs in a single chunk).
+        """
+        scores = defaultdict(float)
+        query_terms = set(tokenize(query))
+        term_idfs = {}
+        for term in query_terms:
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            idf = term_idfs[term] = self.idf(term_id)
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[docs] / self.avg_doc_length)
+            for doc, score in zip(docs.tolist(), (idf * tf * (BM25_K1 + 1) / (tf + norm)).tolist()):
+                scores[doc] += score
+        hits = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        if not hits:
+            return [], 0.0, 0.0
+
+        matched = [t for t in term_idfs if self._contains(t, hits[0][0])]
+        total = sum(term_idfs.values()) + self.max_idf() * (len(query_terms) - len(term_idfs))
+        coverage = sum(term_idfs[t] for t in matched) / total
+        return hits, coverage, max(term_idfs[t] for t in matched) / self.max_idf()
+
+    def _contains(self, term, doc):
+        term_id = self.terms[term]
+        postings = self.doc_ids[self.term_offsets[term_id]:self.term_offsets[term_id + 1]]
+        return doc in postings
+
+
+def reciprocal_rank_fusion(rankings, k):
+    """Fuse several ranked id lists: score(d) = sum over rankings of 1 / (RRF_K + rank of d)."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            scores[doc] += 1.0 / (RRF_K + rank + 1)
+    return [doc for doc, _ in sorted(scores.items(), key=lambda item: -item[1])[:k]]
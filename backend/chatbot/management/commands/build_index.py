@@ -0,0 +1,82 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from chatbot.chunk_store import COMPRESSIONS
+from chatbot.chunking import CHUNKERS
+from chatbot.embeddings import EMBEDDING_BACKENDS
+from chatbot.index_versions import index_lock
+from chatbot.ingest import IngestPipeline
+from chatbot.rag_config import (
+    CHUNK_COMPRESSION,
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    CHUNK_SUMMARIES,
+    CHUNK_TOKENS,
+    CHUNKER,
+    EMBEDDING_BACKEND,
+    INDEX_DIR,
+    INDEX_TYPE,
+    INGEST_CHECKPOINT_DIR,
+    INGEST_EMBED_BATCH,
+    INGEST_QUEUE_SIZE,
+    INGEST_SOURCES,
+    INGEST_WORKERS,
+    NORMALIZE_PDF_TEXT,
+    PCA_DIM,
+    PDF_FOLDER,
+    VECTOR_COMPRESSION,
+)
+from chatbot.retriever_setup import build
+from chatbot.sources import SOURCE_CONNECTORS, source_connectors
+from chatbot.summaries import SUMMARY_MODES
+from chatbot.vector_index import INDEX_TYPES, VECTOR_COMPRESSIONS
+
+
+class Command(BaseCommand):
+    help = ("Build and publish the FAISS index from the PDFs in atb_documents/ and the scraped web pages, "
+            "extracting the PDFs in a process pool and embedding them in batches (see chatbot/ingest.py). "
+            "Resumes an interrupted build.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                            help="PDF extraction processes (0: one per core)")
+        parser.add_argument("--embed-batch", type=int, default=INGEST_EMBED_BATCH, help="chunks per encode call")
+        parser.add_argument("--queue-size", type=int, default=INGEST_QUEUE_SIZE,
+                            help="embedded documents waiting to be added to the index")
+        parser.add_argument("--restart", action="store_true", help="discard the checkpoint of an interrupted build")
+        parser.add_argument("--sources", default=INGEST_SOURCES,
+                            help=f"comma-separated source connectors to update, among {', '.join(SOURCE_CONNECTORS)}")
+        parser.add_argument("--folder", default=PDF_FOLDER, help="PDF folder")
+        parser.add_argument("--index-dir", default=INDEX_DIR)
+        parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE)
+        parser.add_argument("--chunk-compression", choices=COMPRESSIONS, default=CHUNK_COMPRESSION)
+        parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND)
+        parser.add_argument("--chunker", choices=CHUNKERS, default=CHUNKER)
+        parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS, help="max tokens per chunk (structure)")
+        parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP, help="overlap in tokens (structure)")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="characters per chunk (fixed)")
+        parser.add_argument("--compression", choices=VECTOR_COMPRESSIONS, default=VECTOR_COMPRESSION)
+        parser.add_argument("--pca-dim", type=int, default=PCA_DIM)
+        parser.add_argument("--summaries", choices=SUMMARY_MODES, default=CHUNK_SUMMARIES)
+        parser.add_argument("--no-normalize", dest="normalize", action="store_false", default=NORMALIZE_PDF_TEXT)
+        parser.add_argument("--full", action="store_true", help="ignore the manifest and rebuild everything")
+
+    def handle(self, *args, **options):
+        pipeline = IngestPipeline(options["workers"], options["embed_batch"], options["queue_size"],
+                                  os.path.join(options["index_dir"], INGEST_CHECKPOINT_DIR))
+        if options["restart"]:
+            with index_lock(options["index_dir"]):  # not under a build that is using it
+                pipeline.checkpoint.clear()
+        build(options["folder"], options["index_dir"], options["index_type"], options["full"],
+              options["chunk_compression"], options["embedding_backend"], options["chunk_size"],
+              options["compression"], options["pca_dim"], options["summaries"], options["normalize"],
+              pipeline=pipeline, chunker=options["chunker"], chunk_tokens=options["chunk_tokens"],
+              chunk_overlap=options["chunk_overlap"],
+              connectors=source_connectors(options["sources"], options["folder"]))
+        stats = pipeline.stats
+        if stats["documents"]:
+            self.stdout.write(
+                f"⚡ {stats['documents']} documents ({stats['resumed']} from the checkpoint), {stats['pages']} pages, "
+                f"{stats['chunks']} chunks in {stats['seconds']:.1f}s with {pipeline.workers} workers: "
+                f"{pipeline.rate('pages'):.1f} pages/s, {pipeline.rate('chunks'):.1f} chunks/s")
@@ -0,0 +1,81 @@
+"""
+Document manifest of an index directory.
+
+Maps every indexed document to the hash of its content and to the ids of its
+vectors (which are also its chunk ids in the chunk store), so that
+retriever_setup.py can re-embed only the documents that were added or changed
+and delete the vectors of the ones that changed or disappeared.
+
+There is one manifest per source connector (see sources.py): manifest.json for
+the PDFs, as before connectors existed, and manifest-<name>.json for the others.
+"""
+import hashlib
+import json
+import os
+
+MANIFEST_FILE = "manifest.json"
+PDF_SOURCE = "pdf"
+
+
+def manifest_file(source=PDF_SOURCE):
+    return MANIFEST_FILE if source == PDF_SOURCE else f"manifest-{source}.json"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentManifest:
+    def __init__(self, model, documents=None, chunking=None, source=PDF_SOURCE, backend="torch"):
+        self.model = model
+        self.backend = backend  # embedding backend of the vectors (see embeddings.py)
+        self.source = source  # the connector whose documents these are
+        self.documents = documents or {}  # name -> {"sha256": str, "ids": [int, ...]}
+        self.chunking = chunking or {}  # chunker settings, e.g. {"size": 500}
+
+    @classmethod
+    def load(cls, index_dir, source=PDF_SOURCE):
+        """The manifest of a source in index_dir, or None if the index has none for it."""
+        path = os.path.join(index_dir, manifest_file(source))
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        # Manifests written before the backend was recorded: torch, the only backend then
+        return cls(data["model"], data["documents"], data.get("chunking"), source, data.get("backend", "torch"))
+
+    @classmethod
+    def load_all(cls, index_dir):
+        """{source: manifest} of every manifest in index_dir."""
+        manifests = {}
+        for filename in sorted(os.listdir(index_dir)) if os.path.isdir(index_dir) else []:
+            if filename == MANIFEST_FILE:
+                manifests[PDF_SOURCE] = cls.load(index_dir)
+            elif filename.startswith("manifest-") and filename.endswith(".json"):
+                source = filename[len("manifest-"):-len(".json")]
+                manifests[source] = cls.load(index_dir, source)
+        return manifests
+
+    def save(self, index_dir):
+        with open(os.path.join(index_dir, manifest_file(self.source)), "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "backend": self.backend, "chunking": self.chunking,
+                       "documents": self.documents}, f, ensure_ascii=False, indent=2)
+
+    def diff(self, hashes):
+        """Compare with {name: sha256} of the documents on disk; return (added, changed, removed) names."""
+        added = sorted(name for name in hashes if name not in self.documents)
+        changed = sorted(name for name in hashes
+                         if name in self.documents and self.documents[name]["sha256"] != hashes[name])
+        removed = sorted(name for name in self.documents if name not in hashes)
+        return added, changed, removed
+
+    def set_document(self, name, sha256, ids):
+        self.documents[name] = {"sha256": sha256, "ids": [int(i) for i in ids]}
+
+    def remove_document(self, name):
+        """Forget a document and return the ids of its vectors."""
+        return self.documents.pop(name)["ids"]
@@ -0,0 +1,214 @@
+"""
+Local registry of the embedding models, so that starting a process never
+resolves a model name on the Hugging Face hub.
+
+SentenceTransformer("paraphrase-MiniLM-L6-v2") looks the name up on the hub
+(or scans the hub cache) in every process that loads it: HTTP requests that
+slow startup down, and time out on the network-isolated production servers.
+Models are instead pinned once, on a machine with network access, into
+MODEL_REGISTRY_DIR, which is then copied to the servers:
+
+    models/
+        registry.json               {"models": {name: {"repo", "revision", "path", "files": {file: {"sha256", "size"}}}}}
+        paraphrase-MiniLM-L6-v2/    the snapshot of that revision
+
+load_embedding_model (embeddings.py) resolves the name through registry.json,
+checks the files (MODEL_VERIFY: sizes by default, checksums with "sha256") and
+loads the directory by path with HF_HUB_OFFLINE and TRANSFORMERS_OFFLINE set.
+A model that is not pinned is still loaded by name, with a warning, unless
+CHATBOT_MODEL_OFFLINE=1, where it is an error.
+
+Vectors are stored with model_version() (index manifests, embedding cache),
+which includes the pinned revision: pinning another revision of the same name
+re-embeds everything instead of mixing vectors of two models.
+
+    cd backend
+    python -m chatbot.model_registry pin [--model paraphrase-MiniLM-L6-v2] [--revision <commit>]
+    python -m chatbot.model_registry add <name> <directory>   # a model copied by hand
+    python -m chatbot.model_registry verify
+    python -m chatbot.model_registry list
+    python -m chatbot.benchmarks.model_startup
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+from .manifest import file_sha256
+from .rag_config import EMBEDDING_MODEL_NAME, MODEL_OFFLINE, MODEL_REGISTRY_DIR, MODEL_VERIFY
+
+REGISTRY_FILE = "registry.json"
+HUB_ORGANIZATION = "sentence-transformers"  # of the models named without one, as SentenceTransformer does
+VERIFY_MODES = ("size", "sha256", "none")
+# Weights in formats the torch backend does not read (the ONNX backend has its own export)
+IGNORED_FILES = ("onnx/*", "openvino/*", "*.h5", "*.msgpack", "*.ot")
+_DOWNLOAD_CACHE = ".cache"  # snapshot_download metadata in the model directory, not part of the model
+
+
+def model_files(directory):
+    """{relative path: {"sha256", "size"}} of the files of a model directory."""
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d != _DOWNLOAD_CACHE)
+        for filename in sorted(names):
+            path = os.path.join(root, filename)
+            files[os.path.relpath(path, directory).replace(os.sep, "/")] = {
+                "sha256": file_sha256(path), "size": os.path.getsize(path)}
+    return files
+
+
+def enforce_offline():
+    """Forbid Hugging Face hub requests in this process, including libraries already imported."""
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    if "huggingface_hub" in sys.modules:  # reads the variable when imported
+        import huggingface_hub.constants
+
+        huggingface_hub.constants.HF_HUB_OFFLINE = True
+
+
+class ModelRegistry:
+    def __init__(self, path=MODEL_REGISTRY_DIR):
+        self.path = path
+        self.models = {}  # name -> {"repo", "revision", "path", "files"}
+        try:
+            with open(os.path.join(path, REGISTRY_FILE), encoding="utf-8") as f:
+                self.models = json.load(f)["models"]
+        except FileNotFoundError:
+            pass
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        path = os.path.join(self.path, REGISTRY_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"models": self.models}, f, ensure_ascii=False, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def model_dir(self, name):
+        return os.path.join(self.path, self.models[name]["path"])
+
+    def add(self, name, directory, repo=None, revision=None):
+        """Record a model directory (copied into the registry if it is elsewhere) with its checksums."""
+        target = os.path.join(self.path, re.sub(r"[^\w.-]+", "_", name))
+        if os.path.abspath(directory) != os.path.abspath(target):
+            shutil.rmtree(target, ignore_errors=True)
+            shutil.copytree(directory, target, ignore=shutil.ignore_patterns(_DOWNLOAD_CACHE))
+        self.models[name] = {"repo": repo, "revision": revision, "path": os.path.basename(target),
+                             "files": model_files(target)}
+        self.save()
+        return self.models[name]
+
+    def pin(self, name, revision=None):
+        """Download a revision of a hub model (the latest by default) into the registry. Needs the network."""
+        from huggingface_hub import HfApi, snapshot_download
+
+        repo = name if "/" in name else f"{HUB_ORGANIZATION}/{name}"
+        revision = HfApi().model_info(repo, revision=revision).sha  # a branch or tag moves, the commit does not
+        directory = snapshot_download(repo, revision=revision, ignore_patterns=list(IGNORED_FILES),
+                                      local_dir=os.path.join(self.path, re.sub(r"[^\w.-]+", "_", name)))
+        return self.add(name, directory, repo, revision)
+
+    def verify(self, name, mode="sha256"):
+        """Problems with the files of a pinned model (missing, other size or checksum); empty when it is intact."""
+        if mode == "none":
+            return []
+        problems = []
+        directory = self.model_dir(name)
+        for filename, expected in self.models[name]["files"].items():
+            path = os.path.join(directory, filename)
+            if not os.path.isfile(path):
+                problems.append(f"{filename} missing")
+            elif os.path.getsize(path) != expected["size"]:
+                problems.append(f"{filename}: {os.path.getsize(path)} bytes, {expected['size']} pinned")
+            elif mode == "sha256" and file_sha256(path) != expected["sha256"]:
+                problems.append(f"{filename}: checksum differs from the pinned one")
+        return problems
+
+
+def resolve_model(name=EMBEDDING_MODEL_NAME, offline=MODEL_OFFLINE, verify=MODEL_VERIFY,
+                  registry_dir=MODEL_REGISTRY_DIR):
+    """
+    What to pass to SentenceTransformer for `name`: the directory of the pinned
+    model, checked and with offline mode enforced, or a directory given as the
+    name. An unpinned model is returned as its name, to be resolved on the hub,
+    unless `offline`.
+    """
+    if os.path.isdir(name):
+        enforce_offline()
+        return name
+    registry = ModelRegistry(registry_dir)
+    if name in registry.models:
+        problems = registry.verify(name, verify)
+        if problems:
+            raise RuntimeError(f"Pinned model {name} in {registry_dir} is damaged: {'; '.join(problems)}. "
+                               f"Copy it again or run `python -m chatbot.model_registry pin --model {name}`")
+        enforce_offline()
+        return registry.model_dir(name)
+    if offline:
+        raise FileNotFoundError(f"Model {name} is not in the registry {registry_dir} and CHATBOT_MODEL_OFFLINE=1; "
+                                f"pin it with `python -m chatbot.model_registry pin --model {name}`")
+    print(f"⚠️ Model {name} is not pinned in {registry_dir}, resolving it on the Hugging Face hub")
+    return name
+
+
+def model_version(name=EMBEDDING_MODEL_NAME, registry_dir=MODEL_REGISTRY_DIR):
+    """
+    The model resolve_model loads for `name`, as recorded with its vectors:
+    "name@<commit>" for a pinned hub revision, "name@sha256-<checksum of its
+    files>" for a model added by hand, and the name alone when it is not
+    pinned (or is a directory).
+    """
+    entry = ModelRegistry(registry_dir).models.get(name)
+    if entry is None or os.path.isdir(name):
+        return name
+    if entry["revision"]:
+        return f"{name}@{entry['revision'][:12]}"
+    checksums = json.dumps({filename: f["sha256"] for filename, f in entry["files"].items()}, sort_keys=True)
+    return f"{name}@sha256-{hashlib.sha256(checksums.encode('utf-8')).hexdigest()[:12]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pin, verify and list the models of the local model registry")
+    parser.add_argument("--path", default=MODEL_REGISTRY_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    pin = sub.add_parser("pin", help="download a model from the Hugging Face hub into the registry")
+    pin.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    pin.add_argument("--revision", help="commit, branch or tag (default: the latest commit)")
+    add = sub.add_parser("add", help="register a model directory that is already on disk")
+    add.add_argument("name")
+    add.add_argument("directory")
+    verify = sub.add_parser("verify", help="check the checksums of the pinned models")
+    verify.add_argument("--mode", choices=VERIFY_MODES, default="sha256")
+    sub.add_parser("list")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.path)
+    if args.command in ("pin", "add"):
+        name = args.model if args.command == "pin" else args.name
+        entry = registry.pin(name, args.revision) if args.command == "pin" else registry.add(name, args.directory)
+        size = sum(f["size"] for f in entry["files"].values()) / 2**20
+        print(f"📌 {name} pinned in {registry.model_dir(name)}: {len(entry['files'])} files, {size:.1f} MB"
+              f"{', revision ' + entry['revision'] if entry['revision'] else ''}")
+        return
+    if not registry.models:
+        print(f"No models pinned in {args.path}")
+        return
+    failed = False
+    for name, entry in registry.models.items():
+        if args.command == "list":
+            size = sum(f["size"] for f in entry["files"].values()) / 2**20
+            print(f"📌 {name}: {entry['path']}/, {len(entry['files'])} files, {size:.1f} MB, "
+                  f"{entry['repo'] or 'local'}@{entry['revision'] or '-'}")
+            continue
+        problems = registry.verify(name, args.mode)
+        failed = failed or bool(problems)
+        print(f"❌ {name}: {'; '.join(problems)}" if problems else f"✅ {name}: {len(entry['files'])} files intact")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
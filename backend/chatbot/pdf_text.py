@@ -0,0 +1,127 @@
+"""
+Normalization of the text PyMuPDF extracts, before it is chunked and embedded.
+
+page.get_text() returns the layout as it is printed: "Page 2/4" and
+"Signature de tous les co-titulaires" on every page of a form, words split
+with a hyphen at the end of a line, runs of spaces and empty lines left by
+form fields, ligatures (U+FB01) and private-use glyphs such as U+F099
+(Wingdings check boxes). All of that ends up in chunks and embeddings.
+
+normalize_pages cleans a document's pages in four passes:
+
+- glyphs:   NFKC (ligatures, non-breaking spaces), private-use, control and
+            zero-width characters removed, fill-in runs ("........", "____") cut to "…"
+- headers:  lines among the first/last HEADER_LINES of a page that repeat on
+            at least half of the pages (page numbers such as "Page 2/4" ignored,
+            other digits compared: "Frais : 10 DT" on one page only is kept)
+- hyphens:  a line break after a hyphen removed when the next line goes on in
+            lowercase: "deman-\\ndes" -> "demandes" when the document uses
+            "demandes" elsewhere, else the hyphen is kept: "co-\\ntitulaires"
+            -> "co-titulaires"
+- spaces:   runs of spaces collapsed, lines stripped, at most one empty line in a row
+"""
+import re
+import unicodedata
+
+import fitz  # PyMuPDF
+
+from .context import count_tokens
+
+HEADER_LINES = 3  # lines at the top and at the bottom of a page checked for repeats
+HEADER_MIN_PAGES = 3  # shorter documents have too few pages to tell a header from content
+
+# "Page 2", "Page 2 sur 4" or "2/4" at the start or the end of a line, or a line that is only a number ("- 2 -")
+_PAGE = r"(?:page\s*\d+(?:\s*(?:/|sur|of)\s*\d+)?|\d+\s*/\s*\d+)"
+_PAGE_NUMBER_RE = re.compile(rf"^[-–—\s]*{_PAGE}\b|\b{_PAGE}[-–—\s]*$|^[-–—\s]*\d+[-–—\s]*$", re.IGNORECASE)
+_WORD_RE = re.compile(r"\w+")
+_HYPHEN_BREAK_RE = re.compile(r"(\w+)-\n([a-zà-ÿ]\w*)")
+_SPACES_RE = re.compile(r"[ \t\f\v]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+_FILL_RE = re.compile(r"([._\-·*=])\1{2,}")
+_ZERO_WIDTH = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff\ufffd"))
+
+
+def clean_glyphs(text):
+    text = unicodedata.normalize("NFKC", text).translate(_ZERO_WIDTH)
+    text = "".join(c for c in text if c in "\n\t" or unicodedata.category(c) not in ("Co", "Cc", "Cs", "Cn"))
+    return _FILL_RE.sub("…", text)
+
+
+def _line_key(line):
+    return _PAGE_NUMBER_RE.sub("#", " ".join(line.split()).lower())
+
+
+def join_hyphenated(text, vocabulary):
+    """Words broken over two lines put back together, without the hyphen if `vocabulary` has the joined word."""
+    def join(match):
+        word = match.group(1) + match.group(2)
+        return word if word.lower() in vocabulary else f"{match.group(1)}-{match.group(2)}"
+
+    return _HYPHEN_BREAK_RE.sub(join, text)
+
+
+def _edges(lines):
+    """Indexes of the first and last HEADER_LINES non-empty lines of a page."""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:HEADER_LINES] + filled[-HEADER_LINES:])
+
+
+def repeated_edge_lines(pages):
+    """Keys of the lines that appear at the top or bottom of at least half of the pages."""
+    if len(pages) < HEADER_MIN_PAGES:
+        return set()
+    counts = {}
+    for lines in pages:
+        for key in {_line_key(lines[i]) for i in _edges(lines)}:
+            counts[key] = counts.get(key, 0) + 1
+    return {key for key, count in counts.items() if key and count * 2 >= len(pages)}
+
+
+def normalize_pages(pages):
+    """
+    Normalized text of each page (see the module docstring); a page keeps its
+    trailing newline so pages joined together stay separated.
+    """
+    pages = [clean_glyphs(page).splitlines() for page in pages]
+    repeated = repeated_edge_lines(pages)
+    texts = []
+    for lines in pages:
+        edges = _edges(lines)
+        kept = [line for i, line in enumerate(lines) if i not in edges or _line_key(line) not in repeated]
+        texts.append("\n".join(_SPACES_RE.sub(" ", line).strip() for line in kept))
+    vocabulary = {word.lower() for text in texts for word in _WORD_RE.findall(text)}
+    normalized = []
+    for text in texts:
+        text = join_hyphenated(text, vocabulary)
+        text = _BLANK_LINES_RE.sub("\n\n", text).strip("\n")
+        normalized.append(text + "\n" if text else "")
+    return normalized
+
+
+def normalization_savings(raw_pages, pages):
+    """
+    (tokens, characters) removed by normalization. Tokens use the context.py
+    estimate, which ignores whitespace, so collapsed spaces only show in characters.
+    """
+    tokens = sum(count_tokens(page) for page in raw_pages) - sum(count_tokens(page) for page in pages)
+    return tokens, sum(map(len, raw_pages)) - sum(map(len, pages))
+
+
+def extract_text_from_pdf(pdf_path, normalize=True):
+    """
+    Return the document text, the offset at which each page starts in it and
+    the (tokens, characters) that normalization removed.
+    """
+    with fitz.open(pdf_path) as doc:
+        raw_pages = [page.get_text() for page in doc]
+    pages = normalize_pages(raw_pages) if normalize else raw_pages
+    return join_pages(pages) + (normalization_savings(raw_pages, pages),)
+
+
+def join_pages(pages):
+    """(text, offset at which each page starts in it)."""
+    page_starts, offset = [], 0
+    for page in pages:
+        page_starts.append(offset)
+        offset += len(page)
+    return "".join(pages), page_starts
@@ -0,0 +1,150 @@
+"""
+Shared settings for the RAG pipeline (index builder + retriever).
+
+Every value can be overridden with an environment variable so the same code
+runs on a laptop and on the production box without edits.
+"""
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def env_str(name, default):
+    return os.environ.get(name, default)
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# === LLM (Ollama, see generator.py) ===
+OLLAMA_URL = env_str("CHATBOT_OLLAMA_URL", "http://localhost:11434/api/generate")
+OLLAMA_MODEL = env_str("CHATBOT_OLLAMA_MODEL", "mistral")
+
+# === Embeddings ===
+EMBEDDING_MODEL_NAME = env_str("CHATBOT_EMBEDDING_MODEL", "paraphrase-MiniLM-L6-v2")
+EMBEDDING_DIM = 384  # MiniLM output size
+EMBEDDING_BACKEND = env_str("CHATBOT_EMBEDDING_BACKEND", "torch")  # torch | onnx | onnx-int8
+ONNX_DIR = env_str("CHATBOT_ONNX_DIR", os.path.join(BASE_DIR, "onnx"))  # written by `python -m chatbot.embeddings export`
+# Pinned model directories and their registry.json, loaded by path (see model_registry.py)
+MODEL_REGISTRY_DIR = env_str("CHATBOT_MODEL_REGISTRY_DIR", os.path.join(BASE_DIR, "models"))
+# 1: a model missing from the registry is an error, never a Hugging Face hub lookup (production)
+MODEL_OFFLINE = env_bool("CHATBOT_MODEL_OFFLINE", False)
+MODEL_VERIFY = env_str("CHATBOT_MODEL_VERIFY", "size")  # checked on every load: size | sha256 | none
+
+# === Embedding server (see embedding_server.py) ===
+# "unix:/run/chatbot-embed.sock" or "http://127.0.0.1:8765"; empty: every worker encodes in-process
+EMBEDDING_SERVER = env_str("CHATBOT_EMBEDDING_SERVER", "")
+EMBEDDING_SERVER_TIMEOUT = env_float("CHATBOT_EMBEDDING_SERVER_TIMEOUT", 2.0)  # seconds, then in-process fallback
+EMBEDDING_BATCH_WINDOW_MS = env_float("CHATBOT_EMBEDDING_BATCH_WINDOW_MS", 5.0)  # wait for more requests
+EMBEDDING_MAX_BATCH = env_int("CHATBOT_EMBEDDING_MAX_BATCH", 32)  # texts per forward pass
+
+# === Index files ===
+# Directory holding the FAISS index and the chunk store produced by retriever_setup.py
+INDEX_DIR = env_str("CHATBOT_INDEX_DIR", BASE_DIR)
+FAISS_INDEX_FILE = "faiss_index.bin"
+DOC_STORE_FILE = "chunks_store.npy"  # legacy chunk array, superseded by chunk_store.py
+INDEX_META_FILE = "faiss_index.json"  # index type + search parameters, written by retriever_setup.py
+
+# Open the FAISS index through mmap instead of copying it into each worker's heap
+INDEX_MMAP = env_bool("CHATBOT_INDEX_MMAP", True)
+# Builds publish versions/<name>/ through INDEX_DIR/current (see index_versions.py)...
+INDEX_KEEP_VERSIONS = env_int("CHATBOT_INDEX_KEEP_VERSIONS", 3)  # older versions are deleted (rollback window)
+# ...and workers check the pointer this often (seconds) to swap a new version in; 0 = never
+INDEX_RELOAD_INTERVAL = env_float("CHATBOT_INDEX_RELOAD_INTERVAL", 5.0)
+
+# === Index type (see vector_index.py) ===
+INDEX_TYPE = env_str("CHATBOT_INDEX_TYPE", "flat")  # flat | ivf | hnsw
+IVF_NLIST = env_int("CHATBOT_IVF_NLIST", 0)  # 0 = derived from the number of chunks
+IVF_NPROBE = env_int("CHATBOT_IVF_NPROBE", 8)
+HNSW_M = env_int("CHATBOT_HNSW_M", 32)
+HNSW_EF_CONSTRUCTION = env_int("CHATBOT_HNSW_EF_CONSTRUCTION", 80)
+HNSW_EF_SEARCH = env_int("CHATBOT_HNSW_EF_SEARCH", 64)
+
+# === Vector compression (see vector_index.py) ===
+VECTOR_COMPRESSION = env_str("CHATBOT_VECTOR_COMPRESSION", "none")  # none | pca | sq8 | pca-sq8
+PCA_DIM = env_int("CHATBOT_PCA_DIM", 128)  # dimensions kept by the PCA projection
+# A compressed index is not written if its top-k neighbours recall those of the uncompressed index below this
+COMPRESSION_RECALL_FLOOR = env_float("CHATBOT_COMPRESSION_RECALL_FLOOR", 0.9)
+COMPRESSION_RECALL_K = env_int("CHATBOT_COMPRESSION_RECALL_K", 10)
+COMPRESSION_RECALL_QUERIES = env_int("CHATBOT_COMPRESSION_RECALL_QUERIES", 200)  # chunk vectors used as queries
+
+# === Hybrid lexical + dense retrieval (see lexical.py) ===
+HYBRID_SEARCH = env_bool("CHATBOT_HYBRID_SEARCH", True)  # used when the index has lexical_index.npz
+FUSION_CANDIDATES = env_int("CHATBOT_FUSION_CANDIDATES", 20)  # per ranking, before fusion
+# Answer from BM25 alone (no encode) when the best chunk holds >= this share of the query's idf mass...
+LEXICAL_FASTPATH_COVERAGE = env_float("CHATBOT_LEXICAL_FASTPATH_COVERAGE", 0.9)
+# ...and one of the matched words is rare (a product name, not "compte"): its idf / max idf
+LEXICAL_FASTPATH_MIN_RARITY = env_float("CHATBOT_LEXICAL_FASTPATH_MIN_RARITY", 0.7)
+
+# === Two-stage retrieval: documents first, then their chunks (see document_index.py) ===
+HIERARCHICAL_SEARCH = env_bool("CHATBOT_HIERARCHICAL_SEARCH", True)  # used when the index has documents.npz
+DOCUMENT_CANDIDATES = env_int("CHATBOT_DOCUMENT_CANDIDATES", 5)  # documents whose chunks are searched
+
+# === Relevance threshold (cosine, indexes built with INDEX_METRIC = "ip") ===
+INDEX_METRIC = env_str("CHATBOT_INDEX_METRIC", "ip")  # ip: unit vectors + inner product (= cosine) | l2
+# Below this best-chunk cosine the retrieved chunks are not sent to the LLM...
+RELEVANCE_MIN_SCORE = env_float("CHATBOT_RELEVANCE_MIN_SCORE", 0.35)
+# ...and below this one the message is answered directly, without calling Ollama
+DIRECT_ANSWER_MAX_SCORE = env_float("CHATBOT_DIRECT_ANSWER_MAX_SCORE", 0.2)
+
+# === Prompt context (see context.py) ===
+# Send the condensed chunk text to the LLM when the index has summaries (see summaries.py)
+CONTEXT_USE_SUMMARIES = env_bool("CHATBOT_CONTEXT_USE_SUMMARIES", True)
+CONTEXT_TOKEN_BUDGET = env_int("CHATBOT_CONTEXT_TOKEN_BUDGET", 350)
+CONTEXT_CANDIDATES = env_int("CHATBOT_CONTEXT_CANDIDATES", 10)  # chunks retrieved before packing
+CONTEXT_MMR_LAMBDA = env_float("CHATBOT_CONTEXT_MMR_LAMBDA", 0.7)  # 1.0 = relevance only
+CONTEXT_DUPLICATE_SIMILARITY = env_float("CHATBOT_CONTEXT_DUPLICATE_SIMILARITY", 0.6)
+
+# === Follow-up suggestions (see related_questions.py) ===
+RELATED_QUESTIONS_FILE = env_str("CHATBOT_RELATED_QUESTIONS_FILE", os.path.join(BASE_DIR, "related_questions.npz"))
+RELATED_QUESTIONS_K = env_int("CHATBOT_RELATED_QUESTIONS_K", 3)  # suggestions per answer
+RELATED_MIN_SCORE = env_float("CHATBOT_RELATED_MIN_SCORE", 0.6)  # cosine to the nearest known question
+
+# === Index builder inputs ===
+PDF_FOLDER = os.path.join(os.path.dirname(BASE_DIR), "atb_documents")
+# Source connectors the builder reads, each with its own manifest (see sources.py): pdf | scraped | scrapy
+INGEST_SOURCES = env_str("CHATBOT_INGEST_SOURCES", "pdf,scraped,scrapy")
+# "=== title ===" sections written by the scrapers; glob patterns separated by os.pathsep
+SCRAPED_TEXT_FILES = env_str("CHATBOT_SCRAPED_TEXT_FILES", os.pathsep.join(
+    os.path.join(os.path.dirname(BASE_DIR), pattern)
+    for pattern in ("scraped_content.txt", "scraped_content_selenium.txt", os.path.join("atb_scraper", "*.txt"),
+                    os.path.join("atb_scraper", "scraped_content", "*.txt"))
+)).split(os.pathsep)
+# Items exported by the atb_spider feed (title, url, content), one JSON object per line
+SCRAPY_ITEMS_FILE = env_str("CHATBOT_SCRAPY_ITEMS_FILE",
+                            os.path.join(os.path.dirname(BASE_DIR), "atb_scraper", "atb_items.jsonl"))
+# structure: paragraphs, headings, list items and sentences kept whole, per page (see chunking.py)
+# fixed: a cut every CHUNK_SIZE characters
+CHUNKER = env_str("CHATBOT_CHUNKER", "structure")  # structure | fixed
+CHUNK_TOKENS = env_int("CHATBOT_CHUNK_TOKENS", 128)  # max tokens per chunk (structure)
+CHUNK_OVERLAP = env_int("CHATBOT_CHUNK_OVERLAP", 24)  # tokens repeated when a chunk ends mid-paragraph (structure)
+CHUNK_SIZE = env_int("CHATBOT_CHUNK_SIZE", 500)  # Max size of each chunk (fixed)
+# Strip repeated headers/footers, hyphenation, whitespace runs and glyph noise before chunking (see pdf_text.py)
+NORMALIZE_PDF_TEXT = env_bool("CHATBOT_NORMALIZE_PDF_TEXT", True)
+CHUNK_COMPRESSION = env_str("CHATBOT_CHUNK_COMPRESSION", "none")  # none | zlib
+CHUNK_SUMMARIES = env_str("CHATBOT_CHUNK_SUMMARIES", "none")  # none | extractive | ollama
+SUMMARY_RATIO = env_float("CHATBOT_SUMMARY_RATIO", 0.5)  # extractive summaries keep this share of the tokens
+# Chunks whose embedding has at least this cosine with an indexed chunk are stored once (> 1: exact copies only)
+DEDUP_SIMILARITY = env_float("CHATBOT_DEDUP_SIMILARITY", 0.97)
+# Chunk vectors already encoded, reused by later builds (see embedding_cache.py); empty = off
+EMBEDDING_CACHE_DIR = env_str("CHATBOT_EMBEDDING_CACHE_DIR", os.path.join(BASE_DIR, "embedding_cache"))
+
+# === Parallel ingestion (see ingest.py, `python manage.py build_index`) ===
+INGEST_WORKERS = env_int("CHATBOT_INGEST_WORKERS", 0)  # PDF extraction processes; 0 = one per core
+INGEST_EMBED_BATCH = env_int("CHATBOT_INGEST_EMBED_BATCH", 256)  # chunks encoded per call (small PDFs grouped)
+INGEST_QUEUE_SIZE = env_int("CHATBOT_INGEST_QUEUE_SIZE", 8)  # embedded documents waiting to be added
+INGEST_CHECKPOINT_DIR = "ingest_checkpoint"  # in INDEX_DIR, removed once the build is published
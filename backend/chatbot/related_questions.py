@@ -0,0 +1,193 @@
+"""
+Precomputed "related questions" for follow-up suggestions.
+
+An offline job embeds the distinct questions of chatbot.csv plus the
+questions users ask often (ChatMessage history), links each one to its
+RELATED_QUESTIONS_K nearest questions and stores the result in
+related_questions.npz: the question texts, their float16 unit vectors and an
+int32 neighbour table.
+
+    cd backend
+    python -m chatbot.related_questions build [--min-users 3] [--no-history]
+
+At request time the user's message is matched to a stored question (same
+normalized text, or else the nearest one by the query embedding the retriever
+has just computed and cached) and its neighbours are a row lookup, so
+suggestions cost no model call.
+"""
+import argparse
+import csv
+import logging
+import os
+import threading
+
+import numpy as np
+
+from .embeddings import EMBEDDING_BACKENDS, load_embedding_model
+from .model_registry import model_version
+from .rag_config import (
+    BASE_DIR,
+    EMBEDDING_BACKEND,
+    RELATED_MIN_SCORE,
+    RELATED_QUESTIONS_FILE,
+    RELATED_QUESTIONS_K,
+)
+from .retrieval_cache import normalize_query, retrieval_cache
+
+logger = logging.getLogger(__name__)
+
+QUESTIONS_CSV = os.path.join(BASE_DIR, "chatbot.csv")
+DUPLICATE_SIMILARITY = 0.95  # neighbours this close are rephrasings of the question, not follow-ups
+MIN_WORDS = 3  # "bonjour", "merci" and one-word messages are not suggested
+
+
+def distinct_questions(path=QUESTIONS_CSV):
+    """The questions of chatbot.csv, first occurrence of each normalized text."""
+    questions, seen = [], set()
+    with open(path, encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            text = " ".join((row.get("Text") or "").split())
+            if text and normalize_query(text) not in seen:
+                seen.add(normalize_query(text))
+                questions.append(text)
+    return questions
+
+
+def frequent_user_questions(min_users):
+    """User messages sent by at least `min_users` different users (the most frequent first)."""
+    from django.db.models import Count
+
+    from .models import ChatMessage
+
+    rows = (ChatMessage.objects.filter(is_bot=False).values("text")
+            .annotate(users=Count("user", distinct=True)).filter(users__gte=min_users).order_by("-users"))
+    return [" ".join(row["text"].split()) for row in rows
+            if len(row["text"].split()) >= MIN_WORDS and "ticket" not in row["text"].lower()]
+
+
+def neighbour_table(vectors, k):
+    """For each unit vector, the ids of its k nearest others, skipping near-duplicates; -1 padded."""
+    scores = vectors @ vectors.T
+    table = np.full((len(vectors), k), -1, dtype=np.int32)
+    for i, row in enumerate(scores):
+        kept = []
+        for j in np.argsort(-row):
+            if j == i or row[j] >= DUPLICATE_SIMILARITY:
+                continue
+            if any(scores[j, other] >= DUPLICATE_SIMILARITY for other in kept):
+                continue  # two rephrasings of the same follow-up
+            kept.append(j)
+            if len(kept) == k:
+                break
+        table[i, :len(kept)] = kept
+    return table
+
+
+class RelatedQuestions:
+    def __init__(self, questions, vectors, neighbours, model=None):
+        self.questions = list(questions)
+        self.vectors = np.asarray(vectors, dtype=np.float32)  # stored as float16
+        self.neighbours = np.asarray(neighbours, dtype=np.int32)
+        self.model = model or model_version()
+        self._ids = {normalize_query(q): i for i, q in enumerate(self.questions)}
+
+    @classmethod
+    def build(cls, questions, embedding_model, k=RELATED_QUESTIONS_K):
+        vectors = np.asarray(embedding_model.encode(questions), dtype=np.float32).reshape(len(questions), -1)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return cls(questions, vectors, neighbour_table(vectors, k))
+
+    @classmethod
+    def load(cls, path=RELATED_QUESTIONS_FILE):
+        """The stored graph, or None if it was never built."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data["questions"].tolist(), data["vectors"], data["neighbours"], str(data["model"]))
+
+    def save(self, path=RELATED_QUESTIONS_FILE):
+        np.savez(path, questions=np.array(self.questions, dtype=str), vectors=self.vectors.astype(np.float16),
+                 neighbours=self.neighbours, model=np.array(self.model))
+
+    def match(self, text, vector=None):
+        """Id of the stored question `text` is (same normalized text, or nearest to `vector`), or None."""
+        question_id = self._ids.get(normalize_query(text))
+        if question_id is not None or vector is None or not len(self.questions):
+            return question_id
+        vector = np.asarray(vector, dtype=np.float32)
+        scores = self.vectors @ (vector / max(np.linalg.norm(vector), 1e-12))
+        best = int(np.argmax(scores))
+        return best if scores[best] >= RELATED_MIN_SCORE else None
+
+    def related(self, text, vector=None):
+        """Follow-up questions for `text`, nearest first; [] when it matches no stored question."""
+        question_id = self.match(text, vector)
+        if question_id is None:
+            return []
+        return [self.questions[j] for j in self.neighbours[question_id] if j >= 0]
+
+
+_related = None
+_related_lock = threading.Lock()
+
+
+def get_related_questions():
+    """The process-wide graph, loaded on first use; None when missing or built for another model."""
+    global _related
+    if _related is None:
+        with _related_lock:
+            if _related is None:
+                related = RelatedQuestions.load()
+                if related is not None and related.model != model_version():
+                    logger.warning("%s was built with %s, not %s: rebuild it",
+                                   RELATED_QUESTIONS_FILE, related.model, model_version())
+                    related = None
+                _related = related or False
+    return _related or None
+
+
+def related_suggestions(message_text):
+    """
+    Related questions for a chat message. Uses the query embedding the
+    retriever cached for this message, so nothing is encoded here; messages
+    answered from BM25 alone have none and only match by their exact text.
+    The embedding is peeked at, so this lookup does not count in the cache
+    hit rate that retriever/stats/ reports.
+    """
+    related = get_related_questions()
+    if related is None:
+        return []
+    return related.related(message_text, retrieval_cache.peek_embedding(message_text))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="embed the questions and write the neighbour graph")
+    build.add_argument("-k", type=int, default=RELATED_QUESTIONS_K)
+    build.add_argument("--min-users", type=int, default=3, help="users who must have asked a history question")
+    build.add_argument("--no-history", action="store_true", help="only use chatbot.csv (no database access)")
+    build.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND)
+    build.add_argument("--output", default=RELATED_QUESTIONS_FILE)
+    args = parser.parse_args()
+
+    questions = distinct_questions()
+    print(f"❓ {len(questions)} distinct questions in chatbot.csv")
+    if not args.no_history:
+        import django
+
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+        django.setup()
+        known = {normalize_query(q) for q in questions}
+        history = [q for q in frequent_user_questions(args.min_users) if normalize_query(q) not in known]
+        print(f"💬 {len(history)} frequent user questions")
+        questions += history
+
+    related = RelatedQuestions.build(questions, load_embedding_model(backend=args.embedding_backend), args.k)
+    related.save(args.output)
+    size_kb = os.path.getsize(args.output) / 1024
+    print(f"💾 {len(questions)} questions, {args.k} neighbours each, {size_kb:.0f} KB -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
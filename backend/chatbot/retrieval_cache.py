@@ -0,0 +1,142 @@
+"""
+In-process caches for the retriever.
+
+Level 1: normalized query text -> query embedding (skips the transformer pass).
+Level 2: (embedding digest, k, index version) -> chunk ids (skips the FAISS search).
+
+Both levels are bound to the index version they were filled against and are
+emptied as soon as the runtime reports a different version.
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from .rag_config import env_float, env_int
+
+EMBEDDING_CACHE_SIZE = env_int("CHATBOT_EMBEDDING_CACHE_SIZE", 1024)
+RESULT_CACHE_SIZE = env_int("CHATBOT_RESULT_CACHE_SIZE", 1024)
+CACHE_TTL_SECONDS = env_float("CHATBOT_CACHE_TTL", 3600.0)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(text):
+    """Case/whitespace/unicode-insensitive key, so "Ouvrir un compte " and "ouvrir un compte" share an entry."""
+    text = unicodedata.normalize("NFC", text or "")
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+def embedding_digest(vector):
+    return hashlib.blake2b(vector.tobytes(), digest_size=16).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a per-entry time-to-live and hit/miss counters."""
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def peek(self, key):
+        """Like get, without counting a hit or a miss nor refreshing the entry's LRU position."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                return entry[0]
+            return None
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class RetrievalCache:
+    """The two cache levels plus the index version they are valid for."""
+
+    def __init__(self, embedding_size=EMBEDDING_CACHE_SIZE, result_size=RESULT_CACHE_SIZE,
+                 ttl=CACHE_TTL_SECONDS):
+        self.embeddings = LRUCache(embedding_size, ttl)
+        self.results = LRUCache(result_size, ttl)
+        self.index_version = None
+        self._lock = threading.Lock()
+
+    def bind(self, index_version):
+        """Drop every entry if the index was rebuilt since the caches were filled."""
+        if index_version == self.index_version:
+            return
+        with self._lock:
+            if index_version != self.index_version:
+                self.embeddings.clear()
+                self.results.clear()
+                self.index_version = index_version
+
+    def get_embedding(self, query):
+        return self.embeddings.get(normalize_query(query))
+
+    def peek_embedding(self, query):
+        """The cached embedding of `query` for a reader other than the retriever; leaves the stats alone."""
+        return self.embeddings.peek(normalize_query(query))
+
+    def put_embedding(self, query, vector):
+        vector.setflags(write=False)  # cached arrays are shared between requests
+        self.embeddings.put(normalize_query(query), vector)
+
+    def result_key(self, vector, k, family=None, version=None):
+        # A query still running on the previous index after a hot reload passes its own version
+        return embedding_digest(vector), k, family, version or self.index_version
+
+    def get_result(self, vector, k, family=None, version=None):
+        return self.results.get(self.result_key(vector, k, family, version))
+
+    def put_result(self, vector, k, ids, family=None, version=None):
+        self.results.put(self.result_key(vector, k, family, version), tuple(ids))
+
+    def stats(self):
+        return {
+            "index_version": self.index_version,
+            "embeddings": self.embeddings.stats(),
+            "results": self.results.stats(),
+        }
+
+
+retrieval_cache = RetrievalCache()
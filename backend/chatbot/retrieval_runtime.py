@@ -0,0 +1,237 @@
+"""
+Process-wide retrieval runtime: embedding model, FAISS index and chunk store.
+
+The runtime is loaded once per process. Under gunicorn (see gunicorn.conf.py)
+it is loaded in the master before the workers fork, so the model weights and
+the memory-mapped index are shared copy-on-write between all workers instead
+of being duplicated N times.
+
+When the builder publishes a new index version (see index_versions.py), each
+process notices it within INDEX_RELOAD_INTERVAL seconds, loads and warms the
+new runtime in a background thread while the old one keeps answering, then
+swaps the reference. Requests already running keep the runtime they started
+with, so they finish on the old version.
+"""
+import gc
+import logging
+import os
+import threading
+import time
+
+import faiss
+import numpy as np
+
+from .chunk_store import ChunkStore, has_chunk_store
+from .document_index import DocumentIndex
+from .embedding_server import EmbeddingClient
+from .embeddings import load_embedding_model
+from .index_versions import current_index_dir, pointer_mtime
+from .lexical import LexicalIndex
+from .related_questions import get_related_questions
+from .rag_config import (
+    DOC_STORE_FILE,
+    EMBEDDING_SERVER,
+    FAISS_INDEX_FILE,
+    HIERARCHICAL_SEARCH,
+    HYBRID_SEARCH,
+    INDEX_DIR,
+    INDEX_MMAP,
+    INDEX_RELOAD_INTERVAL,
+)
+from .vector_index import apply_search_params, id_selector, read_index_meta
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalRuntime:
+    """Everything retrieve_chunks needs, loaded together so it can be swapped as a unit."""
+
+    def __init__(self, embedding_model, faiss_index, index_meta, document_chunks, lexical_index,
+                 index_dir, version, document_index=None):
+        self.embedding_model = embedding_model
+        self.faiss_index = faiss_index
+        self.index_meta = index_meta
+        self.document_chunks = document_chunks
+        self.lexical_index = lexical_index  # None: dense retrieval only
+        self.document_index = document_index  # None: search all chunks directly
+        self.index_dir = index_dir
+        self.version = version  # changes whenever the index is rebuilt; keys the retrieval caches
+        self._family_filters = {}
+
+    def family_filter(self, family):
+        """
+        (FAISS IDSelector, set of chunk ids) restricting a search to a document
+        family, or None when the chunk store carries no family tags. Built on
+        first use and kept for the lifetime of the runtime; the search
+        parameters are not (see vector_index.search_parameters).
+        """
+        if family not in self._family_filters:
+            family_ids = getattr(self.document_chunks, "family_ids", None)
+            ids = family_ids(family) if family_ids else None
+            self._family_filters[family] = None if ids is None else \
+                (id_selector(ids), frozenset(ids.tolist()))
+        return self._family_filters[family]
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+_reload = {"checked_at": 0.0, "pointer_mtime": None, "thread": None}
+
+
+def read_faiss_index(path, index_type="flat", mmap=INDEX_MMAP):
+    """Open the index read-only; with mmap the vectors stay in the page cache, shared by all processes."""
+    if not mmap:
+        return faiss.read_index(path)
+    # IO_FLAG_MMAP maps IVF inverted lists, IO_FLAG_MMAP_IFC maps flat code arrays (Flat, HNSW storage);
+    # FAISS rejects the combination for IVF indexes
+    if index_type == "ivf" or not hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        flags = faiss.IO_FLAG_MMAP
+    else:
+        flags = faiss.IO_FLAG_MMAP_IFC
+    return faiss.read_index(path, flags | faiss.IO_FLAG_READ_ONLY)
+
+
+def load_document_chunks(index_dir):
+    """
+    Open the chunk store of index_dir.
+
+    Indexes built before chunk_store.py existed only have chunks_store.npy:
+    map that array read-only, or unpickle it if it holds Python objects.
+    """
+    if has_chunk_store(index_dir):
+        return ChunkStore(index_dir)
+    path = os.path.join(index_dir, DOC_STORE_FILE)
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        return np.load(path, allow_pickle=True)
+
+
+def index_version(index_path):
+    """Identify an index build by the size and mtime of its file."""
+    stat = os.stat(index_path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def load_runtime(index_dir=INDEX_DIR, embedding_model=None):
+    """Build a RetrievalRuntime from the current version in index_dir (or its files, if unversioned)."""
+    index_dir = current_index_dir(index_dir)
+    if embedding_model is None:
+        # With an embedding server the model is not loaded here unless the server is down
+        embedding_model = EmbeddingClient(EMBEDDING_SERVER) if EMBEDDING_SERVER else load_embedding_model()
+    index_path = os.path.join(index_dir, FAISS_INDEX_FILE)
+    index_meta = read_index_meta(index_dir)
+    faiss_index = read_faiss_index(index_path, index_meta["index_type"])
+    apply_search_params(faiss_index, index_meta)  # nprobe / efSearch chosen at build time
+    document_chunks = load_document_chunks(index_dir)
+    lexical_index = LexicalIndex.load(index_dir) if HYBRID_SEARCH else None
+    document_index = DocumentIndex.load(index_dir) if HIERARCHICAL_SEARCH else None
+    logger.info("Retrieval runtime loaded from %s (%s, %d vectors)",
+                index_dir, index_meta["index_type"], faiss_index.ntotal)
+    return RetrievalRuntime(embedding_model, faiss_index, index_meta, document_chunks, lexical_index,
+                            index_dir, index_version(index_path), document_index)
+
+
+def warm_up(runtime):
+    """One search so the first real query does not pay for page faults and lazy initialisation."""
+    query = np.zeros((1, runtime.index_meta.get("dim", runtime.faiss_index.d)), dtype="float32")
+    query[0, 0] = 1.0
+    runtime.faiss_index.search(query, 1)
+
+
+def _swap_in(index_dir, mtime):
+    """
+    Load the runtime of a new index version next to the current one, then
+    replace it. The pointer's `mtime` is only recorded once that succeeded, so
+    a version that failed to load is tried again at the next check.
+    """
+    global _runtime
+    try:
+        # The embedding model does not depend on the index: reuse it instead of loading it again
+        runtime = load_runtime(index_dir, embedding_model=_runtime.embedding_model)
+        warm_up(runtime)
+    except Exception:
+        logger.exception("Could not load the new index version in %s, still serving %s",
+                         index_dir, _runtime.index_dir)
+        return
+    with _runtime_lock:
+        _runtime = runtime
+        _reload["pointer_mtime"] = mtime
+    logger.info("Index version %s swapped in", runtime.version)
+
+
+def check_for_new_version():
+    """
+    Start swapping in a newly published index version, at most once every
+    INDEX_RELOAD_INTERVAL seconds; the `current` pointer's mtime is all that
+    is read when nothing changed.
+    """
+    now = time.monotonic()
+    if INDEX_RELOAD_INTERVAL <= 0 or now - _reload["checked_at"] < INDEX_RELOAD_INTERVAL:
+        return
+    _reload["checked_at"] = now
+    mtime = pointer_mtime(INDEX_DIR)
+    if mtime == _reload["pointer_mtime"]:
+        return
+    with _runtime_lock:
+        thread = _reload["thread"]
+        if thread is not None and thread.is_alive():
+            return  # the next check looks again once this swap is done
+        index_dir = current_index_dir(INDEX_DIR)
+        if os.path.abspath(index_dir) == os.path.abspath(_runtime.index_dir):
+            _reload["pointer_mtime"] = mtime
+            return
+        _reload["thread"] = threading.Thread(target=_swap_in, args=(index_dir, mtime), name="index-reload",
+                                             daemon=True)
+        _reload["thread"].start()
+
+
+def get_runtime():
+    """Return the process runtime, loading it on first use and swapping in new index versions."""
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _reload["pointer_mtime"] = pointer_mtime(INDEX_DIR)
+                _runtime = load_runtime()
+    else:
+        check_for_new_version()
+    return _runtime
+
+
+def preload():
+    """
+    Load the runtime in the parent process before workers are forked.
+
+    gc.freeze() moves every object created so far to the permanent generation,
+    so the collector in the workers does not touch (and therefore copy) the
+    pages holding the model and index objects.
+    """
+    runtime = get_runtime()
+    get_related_questions()  # follow-up suggestion graph, shared the same way
+    gc.collect()
+    gc.freeze()
+    return runtime
+
+
+def memory_report():
+    """
+    Memory usage of the current process.
+
+    rss counts shared pages in every worker; pss splits them between the
+    processes sharing them and uss is what this worker holds privately, which
+    is the number to watch when sizing the worker count.
+    """
+    import psutil
+
+    process = psutil.Process()
+    report = {"pid": process.pid, "rss_mb": process.memory_info().rss / 2**20}
+    try:
+        full = process.memory_full_info()
+        report["uss_mb"] = full.uss / 2**20
+        if hasattr(full, "pss"):
+            report["pss_mb"] = full.pss / 2**20
+    except psutil.AccessDenied:
+        pass
+    report["runtime_loaded"] = _runtime is not None
+    return report
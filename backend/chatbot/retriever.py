@@ -1,19 +1,202 @@
+from collections import namedtuple
+
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
-FAISS_INDEX_PATH = "chatbot/faiss_index.bin"  # Path to the FAISS index
-DOC_STORE_PATH = "chatbot/chunks_store.npy"  # Path to the document chunks
-EMBEDDING_MODEL_NAME = "paraphrase-MiniLM-L6-v2"  # Model for embedding generation
+from .context import pack_context
+from .lexical import reciprocal_rank_fusion
+from .rag_config import (
+    CONTEXT_CANDIDATES,
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_USE_SUMMARIES,
+    DOCUMENT_CANDIDATES,
+    FUSION_CANDIDATES,
+    LEXICAL_FASTPATH_COVERAGE,
+    LEXICAL_FASTPATH_MIN_RARITY,
+    RELEVANCE_MIN_SCORE,
+)
+from .retrieval_cache import retrieval_cache
+from .retrieval_runtime import get_runtime
+from .vector_index import id_selector, search_parameters
+
+RetrievedContext = namedtuple("RetrievedContext", "text tokens n_chunks top_score")
+
+
+class Retrieval(namedtuple("Retrieval", "ids scores lexical_coverage")):
+    """Chunk ids for one query, {id: cosine} of those FAISS returned, and the BM25 coverage of the query."""
+
+    @property
+    def top_score(self):
+        """
+        Best dense cosine, or None when relevance cannot be judged from it: no
+        cosine available (BM25 fast path, L2 index) or BM25 found every word of
+        the query, which dense scores underrate for product names.
+        """
+        if self.lexical_coverage >= LEXICAL_FASTPATH_COVERAGE:
+            return None
+        return max(self.scores.values(), default=None)
+
+
+def embed_queries(runtime, queries, use_cache=True):
+    """Return one embedding per query; the cache misses are encoded together in a single forward pass."""
+    vectors = [retrieval_cache.get_embedding(q) if use_cache else None for q in queries]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        encoded = runtime.embedding_model.encode([queries[i] for i in missing])
+        encoded = np.asarray(encoded, dtype="float32").reshape(len(missing), -1)
+        for i, vec in zip(missing, encoded):
+            vec = np.ascontiguousarray(vec)
+            if use_cache:
+                retrieval_cache.put_embedding(queries[i], vec)
+            vectors[i] = vec
+    return np.vstack(vectors)
+
+
+def route_documents(runtime, query_vecs, family=None):
+    """
+    First stage of two-stage retrieval: the chunk ids of the DOCUMENT_CANDIDATES
+    documents nearest to each row (within the family, if any), as a list of
+    (rows, chunk ids) with the rows that routed to the same documents grouped.
+    None when every chunk should be searched: no document index, or no more
+    documents than candidates.
+    """
+    documents = runtime.document_index
+    if documents is None or len(documents) <= DOCUMENT_CANDIDATES:
+        return None
+    store = runtime.document_chunks
+    allowed = None
+    if family and store.source_families is not None:
+        allowed = {source for source, f in zip(store.sources, store.source_families) if f == family}
+    rows = {}
+    for row, sources in enumerate(documents.search(query_vecs, DOCUMENT_CANDIDATES, allowed)):
+        rows.setdefault(frozenset(sources), []).append(row)
+    return [(group, store.chunk_ids_of_sources(sources)) for sources, group in rows.items()]
+
+
+def search_hits(runtime, query_vecs, k, use_cache=True, family=None):
+    """
+    Return the k nearest chunks of each row as [(chunk id, cosine)]; uncached
+    rows go through one matrix search. The cosine is None for indexes built
+    on raw vectors with L2 distance (before normalized inner-product indexes).
+
+    With a family, only the chunks of that document family are searched
+    (ignored when the index was built without family tags). With a document
+    index, each row only searches the chunks of its nearest documents: one
+    matrix search per set of candidate documents, so rows that routed to the
+    same documents (the usual case for a batch on one topic) share a search.
+    """
+    family_filter = runtime.family_filter(family) if family else None
+    if family_filter is None:
+        family = None
+    results = [retrieval_cache.get_result(v, k, family, runtime.version) if use_cache else None
+               for v in query_vecs]
+    missing = [i for i, hits in enumerate(results) if hits is None]
+    if missing:
+        cosine = runtime.index_meta.get("metric") == "ip"
+        batch = query_vecs[missing]
+        if cosine:
+            batch = batch.copy()
+            faiss.normalize_L2(batch)  # the index holds unit vectors: inner product == cosine
+        # Compressed indexes (vector_index.py) apply their PCA projection to the queries inside search()
+        routed = route_documents(runtime, batch, family)
+        if routed is not None:
+            D = np.empty((len(batch), k), dtype="float32")
+            I = np.empty((len(batch), k), dtype="int64")
+            for rows, ids in routed:
+                D[rows], I[rows] = runtime.faiss_index.search(
+                    batch[rows], k, params=search_parameters(runtime.index_meta, id_selector(ids)))
+        elif family_filter is None:
+            D, I = runtime.faiss_index.search(batch, k)  # Perform the similarity search
+        else:
+            D, I = runtime.faiss_index.search(batch, k, params=search_parameters(runtime.index_meta, family_filter[0]))
+        for i, scores, row in zip(missing, D, I):
+            # FAISS pads with -1 when the index holds fewer than k vectors
+            hits = [(int(j), float(d) if cosine else None) for d, j in zip(scores, row) if j >= 0]
+            if use_cache:
+                retrieval_cache.put_result(query_vecs[i], k, hits, family, runtime.version)
+            results[i] = hits
+    return results
+
+
+def retrieve_ids(runtime, queries, k, use_cache=True, family=None):
+    """
+    Chunk ids for each query, with the dense cosine of those the FAISS search returned.
+
+    With a lexical index, a query whose BM25 match is confident (a rare word
+    such as a product name, almost all of the query covered) is answered from
+    BM25 alone without encoding it; the others fuse the dense and BM25
+    rankings with reciprocal-rank fusion. A family restricts both rankings to
+    the chunks of that document family.
+
+    Returns one Retrieval per query.
+    """
+    results = [None] * len(queries)
+    lexical = [None] * len(queries)
+    coverages = [0.0] * len(queries)
+    family_filter = runtime.family_filter(family) if family else None
+    if runtime.lexical_index is not None:
+        for i, query in enumerate(queries):
+            if family_filter is None:
+                hits, coverages[i], rarity = runtime.lexical_index.search(query, FUSION_CANDIDATES)
+                ranking = [chunk_id for chunk_id, _ in hits]
+            else:
+                # BM25 scoring is cheap: rank more candidates, keep the family's
+                hits, coverages[i], rarity = runtime.lexical_index.search(query, 4 * FUSION_CANDIDATES)
+                ranking = [chunk_id for chunk_id, _ in hits if chunk_id in family_filter[1]][:FUSION_CANDIDATES]
+            # coverage and rarity describe the best chunk overall, so only trust them if it was kept
+            confident = coverages[i] >= LEXICAL_FASTPATH_COVERAGE and rarity >= LEXICAL_FASTPATH_MIN_RARITY
+            if confident and ranking and ranking[0] == hits[0][0]:
+                results[i] = Retrieval(ranking[:k], {}, coverages[i])
+            else:
+                lexical[i] = ranking
+
+    pending = [i for i, result in enumerate(results) if result is None]
+    if pending:
+        n_dense = k if runtime.lexical_index is None else max(k, FUSION_CANDIDATES)
+        query_vecs = embed_queries(runtime, [queries[i] for i in pending], use_cache)
+        for i, hits in zip(pending, search_hits(runtime, query_vecs, n_dense, use_cache, family)):
+            dense = [chunk_id for chunk_id, _ in hits]
+            scores = {chunk_id: score for chunk_id, score in hits if score is not None}
+            ids = dense if lexical[i] is None else reciprocal_rank_fusion([dense, lexical[i]], k)
+            results[i] = Retrieval(ids, scores, coverages[i])
+    return results
+
+
+def chunk_texts(runtime, ids, max_chunk_length):
+    relevant_chunks = []
+    for i in ids:  # Loop through the retrieved indices
+        chunk = str(runtime.document_chunks[i])
+
+        # If the chunk is too long, truncate it to the max length
+        if len(chunk) > max_chunk_length:
+            chunk = chunk[:max_chunk_length]  # Truncate the chunk
+
+        relevant_chunks.append(chunk)
+    return relevant_chunks
+
 
-# Load the embedding model
-embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+def retrieve_chunks_batch(queries, k=5, max_chunk_length=300, use_cache=True, family=None):
+    """
+    Retrieve the most relevant chunks for several queries at once.
 
-# Load the FAISS index and document chunks
-faiss_index = faiss.read_index(FAISS_INDEX_PATH)
-document_chunks = np.load(DOC_STORE_PATH, allow_pickle=True)
+    The queries are encoded in a single `encode` call and searched with a
+    single FAISS call, which is much cheaper per query than calling
+    retrieve_chunks in a loop (see chatbot/benchmarks/batch_throughput.py).
+    `family` restricts every query to one document family (see families.py).
 
-def retrieve_chunks(query, k=5, max_chunk_length=300):
+    Returns:
+    - list: One list of chunks per query, as retrieve_chunks would return it.
+    """
+    queries = list(queries)
+    if not queries:
+        return []
+    runtime = get_runtime()  # Loaded once per process (or before fork, see gunicorn.conf.py)
+    retrieval_cache.bind(runtime.version)  # Empties both cache levels after an index rebuild
+    return [chunk_texts(runtime, ids, max_chunk_length)
+            for ids, _, _ in retrieve_ids(runtime, queries, k, use_cache, family)]
+
+
+def retrieve_chunks(query, k=5, max_chunk_length=300, family=None):
     """
     Retrieve the most relevant document chunks from the FAISS index based on a query.
     
@@ -21,21 +204,54 @@ def retrieve_chunks(query, k=5, max_chunk_length=300):
     - query (str): The user input query.
     - k (int): Number of relevant chunks to retrieve.
     - max_chunk_length (int): Maximum length of each chunk to avoid too long context.
+    - family (str): Only search the chunks of this document family, e.g. "credit" (None: all).
     
     Returns:
     - list: List of the most relevant chunks.
     """
-    query_vec = embedding_model.encode([query])  # Get the embedding for the query
-    _, I = faiss_index.search(np.array(query_vec), k)  # Perform the similarity search
+    return retrieve_chunks_batch([query], k, max_chunk_length, family=family)[0]
 
-    relevant_chunks = []
-    for i in I[0]:  # Loop through the retrieved indices
-        chunk = document_chunks[i]
-        
-        # If the chunk is too long, truncate it to the max length
-        if len(chunk) > max_chunk_length:
-            chunk = chunk[:max_chunk_length]  # Truncate the chunk
-        
-        relevant_chunks.append(chunk)
 
-    return relevant_chunks
+def retrieve_chunks_with_scores(query, k=5, max_chunk_length=300):
+    """
+    Like retrieve_chunks, but returns (chunk, cosine) pairs. The cosine is None
+    for chunks found by BM25 only, or when the index does not use cosine scores.
+    """
+    runtime = get_runtime()
+    retrieval_cache.bind(runtime.version)
+    ids, scores, _ = retrieve_ids(runtime, [query], k)[0]
+    return list(zip(chunk_texts(runtime, ids, max_chunk_length), [scores.get(i) for i in ids]))
+
+
+def retrieve_context(query, token_budget=CONTEXT_TOKEN_BUDGET, k=CONTEXT_CANDIDATES,
+                     min_score=RELEVANCE_MIN_SCORE, family=None, condensed=CONTEXT_USE_SUMMARIES):
+    """
+    Build the prompt context for a query within a token budget.
+
+    Retrieves k candidates and packs them with context.pack_context
+    (near-duplicates dropped, last chunk cut at a sentence boundary). When the
+    best cosine is below min_score nothing relevant matched and the context is
+    left empty rather than filled with unrelated chunks. With a family, a
+    search of that family that finds nothing relevant falls back to all documents.
+    With `condensed` the chunks' build-time summaries are packed instead of
+    their full text, when the index has them (see summaries.py).
+
+    Returns:
+    - RetrievedContext: text, estimated prompt tokens, number of chunks, best cosine (or None).
+    """
+    runtime = get_runtime()
+    retrieval_cache.bind(runtime.version)
+    retrieval = retrieve_ids(runtime, [query], k, family=family)[0]
+    if family and (not retrieval.ids or (retrieval.top_score is not None and retrieval.top_score < min_score)):
+        retrieval = retrieve_ids(runtime, [query], k)[0]  # the routing guessed wrong
+    score = retrieval.top_score
+    if score is not None and score < min_score:
+        return RetrievedContext("", 0, 0, score)
+    store = runtime.document_chunks
+    if condensed and getattr(store, "summary_mode", None):
+        chunks = [store.summary(i) for i in retrieval.ids]
+        token_counts = [store.summary_token_count(i) for i in retrieval.ids]
+    else:
+        chunks = [str(store[i]) for i in retrieval.ids]
+        token_counts = [store.token_count(i) for i in retrieval.ids] if hasattr(store, "token_count") else None
+    return RetrievedContext(*pack_context(chunks, token_budget, token_counts), score)
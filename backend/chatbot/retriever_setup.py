@@ -1,67 +1,475 @@
+import argparse
+import bisect
 import os
-import fitz  # PyMuPDF
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
-# === PARAMÈTRES ===
-PDF_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "atb_documents")  # Correct folder name for PDFs
-CHUNK_SIZE = 500  # Max size of each chunk
-EMBEDDING_MODEL_NAME = "paraphrase-MiniLM-L6-v2"
-FAISS_INDEX_PATH = os.path.join(os.path.dirname(__file__), "faiss_index.bin")  # Path to save the FAISS index
-DOC_STORE_PATH = os.path.join(os.path.dirname(__file__), "chunks_store.npy")  # Path to save document chunks
+from .chunk_store import COMPRESSIONS, ChunkStore, ChunkStoreWriter
+from .chunking import CHUNKERS, structured_spans
+from .dedup import ChunkDeduplicator
+from .document_index import DocumentIndex, document_text, document_vector
+from .embedding_cache import CachedEncoder, cached_encoder
+from .embeddings import EMBEDDING_BACKENDS, load_embedding_model
+from .families import infer_family
+from .index_versions import current_index_dir, discard, index_lock, prune_versions, publish, staging_dir
+from .lexical import LexicalIndex
+from .manifest import DocumentManifest
+from .model_registry import model_version
+from .sources import SOURCE_CONNECTORS, source_connectors
+from .summaries import SUMMARY_MODES, summarize_chunks
+from .rag_config import (
+    CHUNK_COMPRESSION,
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    CHUNK_SUMMARIES,
+    CHUNK_TOKENS,
+    CHUNKER,
+    COMPRESSION_RECALL_FLOOR,
+    COMPRESSION_RECALL_K,
+    COMPRESSION_RECALL_QUERIES,
+    EMBEDDING_BACKEND,
+    EMBEDDING_DIM,
+    FAISS_INDEX_FILE,
+    INDEX_DIR,
+    INDEX_METRIC,
+    INDEX_TYPE,
+    INGEST_SOURCES,
+    NORMALIZE_PDF_TEXT,
+    PCA_DIM,
+    PDF_FOLDER,
+    VECTOR_COMPRESSION,
+)
+from .vector_index import (
+    INDEX_TYPES,
+    VECTOR_COMPRESSIONS,
+    add_vectors,
+    build_index,
+    compression_settings,
+    neighbour_recall,
+    prepare_vectors,
+    read_index_meta,
+    remove_vectors,
+    stored_recall,
+    write_index,
+)
 
-# Initialize SentenceTransformer for embedding generation
-embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-index = faiss.IndexFlatL2(384)  # Initialize FAISS index, 384 dimensions for MiniLM embeddings
+RECALL_SAMPLE = 2000  # indexed vectors re-read for the recall check of an incremental build
 
-document_chunks = []
+# Usage (from backend/):
+#   python -m chatbot.retriever_setup [--index-type flat|ivf|hnsw] [--full]
+#
+# By default only the documents added, changed or removed since the last build
+# (according to the manifest of each source, see sources.py) are processed;
+# --sources pdf,scraped,scrapy limits the build to some sources and --full
+# rebuilds everything.
+# Each build is written to a new version directory and published when complete
+# (see index_versions.py), so running workers never see a half-written index.
 
-def extract_text_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    text = ""
-    for page in doc:
-        text += page.get_text()
-    return text
+def page_number(offset, page_starts):
+    """1-based number of the page containing text offset `offset`."""
+    return max(1, bisect.bisect_right(page_starts, offset))
+
+def chunk_spans(text, size=CHUNK_SIZE):
+    """(start, end) offsets of consecutive chunks of at most `size` characters."""
+    return [(i, min(i + size, len(text))) for i in range(0, len(text), size)]
 
 def split_into_chunks(text, size=CHUNK_SIZE):
     """Split the document text into smaller chunks."""
-    return [text[i:i+size] for i in range(0, len(text), size)]
-
-def process_pdfs(folder_path):
-    """Process all PDFs in the folder to extract chunks and update the FAISS index."""
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".pdf"):
-            path = os.path.join(folder_path, filename)
-            # Skip PDF if it has already been processed
-            if filename in [f.split("/")[-1] for f in document_chunks]:  
-                continue
-
-            print(f"📄 Loading: {filename}")
-            full_text = extract_text_from_pdf(path)
-            chunks = split_into_chunks(full_text)
-            
-            # Generate embeddings for chunks
-            embeddings = np.array(embedding_model.encode(chunks))  
-            
-            # Ensure embeddings are in the correct shape (2D array)
-            print(f"Embeddings shape before reshaping: {embeddings.shape}")
-            
-            if embeddings.ndim == 1:
-                embeddings = embeddings.reshape(-1, 384)  # Assuming embedding size is 384
-            
-            print(f"Embeddings shape after reshaping: {embeddings.shape}")
-
-            # Add embeddings to FAISS index
-            index.add(embeddings)
-            document_chunks.extend(chunks)  # Store chunks for later use
-            print(f"✅ {len(chunks)} chunks added")
-
-
-# === START PROCESSING ===
-process_pdfs(PDF_FOLDER)
-
-# Save the FAISS index and document chunks
-faiss.write_index(index, FAISS_INDEX_PATH)
-np.save(DOC_STORE_PATH, document_chunks)
-print("💾 Index and documents saved.")  # Output confirmation
+    return [text[start:end] for start, end in chunk_spans(text, size)]
+
+def document_spans(text, page_starts, chunking):
+    """(start, end) offsets of the chunks of a document, with the chunker of `chunking` (see chunking_settings)."""
+    if chunking.get("method") == "structure":
+        return structured_spans(text, page_starts, chunking["tokens"], chunking["overlap"])
+    return chunk_spans(text, chunking["size"])
+
+def extract_chunks(connector, source, chunking):
+    """
+    Read and chunk one document of a source connector. Returns plain data (it
+    is also run in the ingest.py worker processes): {"chunks", "spans", "pages"
+    (page of each chunk), "page_count", "document_text", "normalized" ((tokens, characters) removed)}.
+    """
+    full_text, page_starts, normalized = connector.read(source, chunking["normalize"])
+    spans = document_spans(full_text, page_starts, chunking)
+    return {
+        "chunks": [full_text[start:end] for start, end in spans],
+        "spans": spans,
+        "pages": [page_number(start, page_starts) for start, _ in spans],
+        "page_count": len(page_starts),
+        "document_text": document_text(source, full_text),
+        "normalized": normalized,
+    }
+
+def embed_chunks(embedding_model, extracted):
+    """(chunk embeddings, document summary embedding) of an extract_chunks() result."""
+    if not extracted["chunks"]:
+        return np.zeros((0, EMBEDDING_DIM), dtype="float32"), None
+    # Generate embeddings for chunks, plus the title + opening of the document for two-stage retrieval
+    embeddings = np.array(embedding_model.encode(extracted["chunks"] + [extracted["document_text"]]),
+                          dtype="float32").reshape(len(extracted["chunks"]) + 1, EMBEDDING_DIM)
+    return embeddings[:-1], embeddings[-1:]
+
+def add_document(source, extracted, embeddings, summary_embedding, document_chunks, documents, deduplicator):
+    """
+    Store the chunks of one embedded document and add it to the document index;
+    returns (chunk ids, new chunk ids, embeddings of the new chunks).
+
+    Chunks that duplicate an indexed chunk are not stored again: the document
+    gets a reference to the existing chunk, whose id is in its chunk ids.
+    """
+    tokens_removed, chars_removed = extracted["normalized"]
+    if tokens_removed or chars_removed:
+        print(f"🧹 normalized: {tokens_removed} tokens, {chars_removed} characters removed")
+    if not extracted["chunks"]:  # scanned PDF without a text layer
+        print("⚠️ no text found")
+        documents.remove_document(source)
+        return [], [], np.zeros((0, EMBEDDING_DIM), dtype="float32")
+
+    documents.set_document(source, document_vector(summary_embedding[0], embeddings))
+    family = infer_family(source)
+    ids, new_ids, new_rows = [], [], []
+    for row, (chunk, (start, end), page) in enumerate(zip(extracted["chunks"], extracted["spans"],
+                                                          extracted["pages"])):
+        chunk_id = deduplicator.find(chunk, embeddings[row])
+        if chunk_id is None:
+            chunk_id = document_chunks.add(chunk, source, page, start, end, family=family)
+            deduplicator.add(chunk_id, chunk, embeddings[row])
+            new_ids.append(chunk_id)
+            new_rows.append(row)
+        else:
+            document_chunks.add_reference(chunk_id, source, page, family=family)
+        ids.append(chunk_id)
+    print(f"✅ {len(new_ids)} chunks added, {len(ids) - len(new_ids)} duplicates ({family})")
+    return list(dict.fromkeys(ids)), new_ids, embeddings[new_rows]
+
+def index_document(connector, source, embedding_model, document_chunks, documents, deduplicator, chunking=None):
+    """Read, chunk, embed and store one document (see add_document for what is returned)."""
+    print(f"📄 Loading: {source}")
+    extracted = extract_chunks(connector, source, chunking or chunking_settings())
+    embeddings, summary_embedding = embed_chunks(embedding_model, extracted)
+    return add_document(source, extracted, embeddings, summary_embedding, document_chunks, documents, deduplicator)
+
+
+def index_documents(items, embedding_model, document_chunks, documents, deduplicator, chunking, pipeline=None,
+                    embedding_backend=EMBEDDING_BACKEND):
+    """
+    Yield ((connector, source, sha256), (chunk ids, new chunk ids, new
+    embeddings)) for each document of `items`, in order: read one after
+    another, or extracted and embedded ahead by an ingest.IngestPipeline
+    (whose checkpoints are kept per `embedding_backend`).
+    """
+    if pipeline is None:
+        for item in items:
+            connector, source, _ = item
+            yield item, index_document(connector, source, embedding_model, document_chunks, documents,
+                                       deduplicator, chunking)
+        return
+    for item, extracted, embeddings, summary_embedding in pipeline.documents(items, embedding_model, chunking,
+                                                                             embedding_backend):
+        yield item, add_document(item[1], extracted, embeddings, summary_embedding, document_chunks,
+                                 documents, deduplicator)
+
+
+def chunking_settings(chunk_size=CHUNK_SIZE, normalize=NORMALIZE_PDF_TEXT, chunker=CHUNKER,
+                      chunk_tokens=CHUNK_TOKENS, chunk_overlap=CHUNK_OVERLAP):
+    """Chunking settings as recorded in the manifest; changing any of them implies a full rebuild."""
+    if chunker == "structure":
+        return {"method": "structure", "tokens": chunk_tokens, "overlap": chunk_overlap, "normalize": normalize}
+    return {"size": chunk_size, "normalize": normalize}  # fixed: as recorded before the chunker was configurable
+
+
+def load_manifests(index_dir, index_type, chunking, compression=VECTOR_COMPRESSION, pca_dim=PCA_DIM,
+                   embedding_backend=EMBEDDING_BACKEND):
+    """{source connector: manifest} to update incrementally, or None when a full rebuild is required."""
+    manifests = DocumentManifest.load_all(index_dir)
+    if not manifests:
+        return None
+    if any(manifest.model != model_version() for manifest in manifests.values()):
+        print("🔁 Embedding model or its pinned revision changed, full rebuild")
+        return None
+    # onnx-int8 vectors are close to the torch ones, not equal: do not mix them in one index
+    if any(manifest.backend != embedding_backend for manifest in manifests.values()):
+        print("🔁 Embedding backend changed, full rebuild")
+        return None
+    # Manifests without chunking settings: raw text, default size
+    if any((manifest.chunking or {"size": CHUNK_SIZE}) != chunking for manifest in manifests.values()):
+        print("🔁 Chunking changed, full rebuild")
+        return None
+    meta = read_index_meta(index_dir)
+    if meta["index_type"] != index_type or meta["metric"] != INDEX_METRIC:
+        print("🔁 Index type or metric changed, full rebuild")
+        return None
+    settings = (compression, pca_dim if compression.startswith("pca") else meta["dim"])
+    if compression_settings(meta, requested=True) != settings:
+        print("🔁 Vector compression changed, full rebuild")
+        return None
+    if compression_settings(meta) != settings and meta["ntotal"] >= pca_dim:
+        print(f"🔁 {meta['ntotal']} vectors, enough for the PCA now, full rebuild")
+        return None
+    if DocumentIndex.load(index_dir) is None:
+        print("🔁 No document index yet, full rebuild")
+        return None
+    return manifests
+
+
+def check_compression(index, meta, vectors, ids):
+    """
+    Recall of the compressed index against the same index built from the raw
+    vectors, queried with a sample of the chunk vectors; recorded in meta.
+    """
+    reference, _ = build_index(vectors, meta["index_type"], meta["dim"], ids=ids, metric=meta["metric"],
+                               compression="none", **meta["params"])
+    rows = np.random.default_rng(0).permutation(len(vectors))[:COMPRESSION_RECALL_QUERIES]
+    queries = prepare_vectors(vectors[rows], meta)
+    recall = neighbour_recall(index, reference, queries, min(COMPRESSION_RECALL_K, len(vectors)))
+    meta["compression"]["recall"] = recall
+    print(f"🗜️ {meta['compression']['type']} vectors ({meta['compression']['dim']} dims): "
+          f"recall@{COMPRESSION_RECALL_K} {recall:.3f} against the uncompressed index")
+    return recall
+
+
+def check_sampled_compression(index, meta, document_chunks, embedding_model, new_ids, new_vectors):
+    """
+    Recall check of an incremental build into a compressed index, recorded in
+    meta like check_compression: the PCA and the 8-bit ranges were fitted on
+    the vectors of the last full build, and new documents may not fit them.
+    The new vectors are compared with a sample of the indexed ones, whose raw
+    vectors are encoded again (embedding cache hits, usually); the new ones
+    come first among the queries.
+    """
+    rng = np.random.default_rng(0)
+    new_rows = rng.permutation(len(new_ids))[:RECALL_SAMPLE // 2]
+    old = np.setdiff1d(faiss.vector_to_array(index.id_map), new_ids)
+    old = old[rng.permutation(len(old))[:RECALL_SAMPLE - len(new_rows)]]
+    old_vectors = np.asarray(embedding_model.encode([document_chunks.text(int(i)) for i in old]),
+                             dtype="float32") if len(old) else np.zeros((0, meta["dim"]), dtype="float32")
+    vectors = np.vstack([new_vectors[new_rows], old_vectors.reshape(len(old), meta["dim"])])
+    queries = np.arange(min(COMPRESSION_RECALL_QUERIES, len(vectors)))
+    recall = stored_recall(index, meta, vectors, queries, min(COMPRESSION_RECALL_K, len(vectors)))
+    meta["compression"]["recall"] = recall
+    print(f"🗜️ {meta['compression']['type']} vectors ({meta['compression']['dim']} dims): "
+          f"recall@{COMPRESSION_RECALL_K} {recall:.3f} against the uncompressed vectors "
+          f"({len(new_rows)} new and {len(old)} indexed)")
+    return recall
+
+
+def load_encoder(embedding_backend):
+    """The embedding model behind the on-disk embedding cache (loaded only if a text is not cached)."""
+    return cached_encoder(lambda: load_embedding_model(backend=embedding_backend), embedding_backend)
+
+
+def print_cache_use(embedding_model):
+    if isinstance(embedding_model, CachedEncoder):
+        print(f"💽 {embedding_model.encoded} texts encoded, {embedding_model.hits} from the embedding cache")
+
+
+def full_build(connectors, hashes, index_type, chunk_compression, embedding_backend, chunking,
+               compression=VECTOR_COMPRESSION, pca_dim=PCA_DIM, pipeline=None):
+    """Index every document of `connectors` into a new index; None when none of them has any text."""
+    embedding_model = load_encoder(embedding_backend)
+    manifests = {connector.name: DocumentManifest(model_version(), chunking=chunking, source=connector.name,
+                                                   backend=embedding_backend)
+                 for connector in connectors}
+    document_chunks = ChunkStoreWriter(chunk_compression)
+    documents = DocumentIndex()
+    deduplicator = ChunkDeduplicator()
+    all_ids, all_embeddings = [], []
+    items = [(connector, source, sha256) for connector in connectors
+             for source, sha256 in hashes[connector.name].items()]
+    for (connector, source, sha256), (ids, new_ids, embeddings) in index_documents(
+            items, embedding_model, document_chunks, documents, deduplicator, chunking, pipeline,
+            embedding_backend):
+        manifests[connector.name].set_document(source, sha256, ids)
+        all_ids.extend(new_ids)
+        # Keep embeddings until every document is read: IVF indexes are trained on the whole set
+        all_embeddings.append(embeddings)
+    print_cache_use(embedding_model)
+    if not all_ids:
+        # No vectors to add (or to train an IVF index on): keep serving the current version
+        print(f"❌ No text found in the documents of {', '.join(connector.name for connector in connectors)}, "
+              f"index not written")
+        return None
+    vectors = np.vstack(all_embeddings)
+    index, meta = build_index(vectors, index_type, ids=all_ids, compression=compression, pca_dim=pca_dim)
+    print(f"🧬 {deduplicator.duplicates} duplicate chunks stored once")
+    if "requested" in meta["compression"]:
+        print(f"⚠️ {len(vectors)} vectors are too few for a PCA to {pca_dim} dimensions, "
+              f"{meta['compression']['type']} vectors stored instead")
+    if meta["compression"]["type"] != "none":
+        check_compression(index, meta, vectors, all_ids)
+    return index, meta, document_chunks, documents, manifests
+
+
+def incremental_build(connectors, hashes, index_dir, manifests, embedding_backend, chunking,
+                      summaries=CHUNK_SUMMARIES, pipeline=None):
+    """
+    Apply the documents added/changed/removed in `connectors` since the last
+    build; the documents of the other sources in `manifests` are kept as they
+    are. None when nothing changed.
+    """
+    added, changed, removed = [], [], []  # (connector, source)
+    for connector in connectors:
+        manifest = manifests.setdefault(connector.name, DocumentManifest(model_version(), chunking=chunking,
+                                                                         source=connector.name,
+                                                                         backend=embedding_backend))
+        diff = manifest.diff(hashes[connector.name])
+        for found, names in zip((added, changed, removed), diff):
+            found.extend((connector, source) for source in names)
+        if any(diff):
+            print(f"🔎 {connector.name}: {len(diff[0])} added, {len(diff[1])} changed, {len(diff[2])} removed")
+    summaries_changed = ChunkStore(index_dir).summary_mode != (None if summaries == "none" else summaries)
+    if not (added or changed or removed or summaries_changed):
+        return None
+
+    index = faiss.read_index(os.path.join(index_dir, FAISS_INDEX_FILE))
+    meta = read_index_meta(index_dir)
+    document_chunks = ChunkStoreWriter.from_store(ChunkStore(index_dir))
+    documents = DocumentIndex.load(index_dir)
+    # Stores built before families existed: tag the sources that are kept
+    document_chunks.source_families = [family or infer_family(source) for source, family
+                                       in zip(document_chunks.sources, document_chunks.source_families)]
+
+    # Chunks shared with a document that is kept stay in the index
+    stale = [i for connector, source in changed + removed
+             for i in document_chunks.release(source, manifests[connector.name].remove_document(source))]
+    index = remove_vectors(index, meta, stale)
+    for _, source in removed:
+        documents.remove_document(source)
+    print(f"🗑️ {len(stale)} stale vectors removed")
+
+    if added or changed:
+        embedding_model = load_encoder(embedding_backend)
+        deduplicator = ChunkDeduplicator(document_chunks.live_chunks(), index, meta)
+        items = [(connector, source, hashes[connector.name][source]) for connector, source in added + changed]
+        all_ids, all_embeddings = [], []
+        for (connector, source, sha256), (ids, new_ids, embeddings) in index_documents(
+                items, embedding_model, document_chunks, documents, deduplicator, chunking, pipeline,
+                embedding_backend):
+            add_vectors(index, meta, embeddings, new_ids)
+            manifests[connector.name].set_document(source, sha256, ids)
+            all_ids.extend(new_ids)
+            all_embeddings.append(embeddings)
+        if compression_settings(meta)[0] != "none" and all_ids:
+            check_sampled_compression(index, meta, document_chunks, embedding_model, all_ids,
+                                      np.vstack(all_embeddings))
+        print_cache_use(embedding_model)
+    return index, meta, document_chunks, documents, manifests
+
+
+def every_source(connectors, folder_path=PDF_FOLDER):
+    """
+    `connectors` completed with the other INGEST_SOURCES: a full build replaces
+    the whole index, so it must not drop the documents of the sources left out.
+    """
+    given = {connector.name for connector in connectors}
+    missing = [connector for connector in source_connectors(INGEST_SOURCES, folder_path)
+               if connector.name not in given]
+    if missing:
+        print(f"🔁 Full build: also reading {', '.join(connector.name for connector in missing)}")
+    return list(connectors) + missing
+
+
+def build_lexical_index(index_dir):
+    """BM25 index over the live chunks of the store just written (cheap: no model involved)."""
+    store = ChunkStore(index_dir)
+    live = ((i, store[i]) for i in range(len(store)) if store.metadata[i]["source"] >= 0)
+    LexicalIndex.build(live).save(index_dir)
+
+
+def build(folder_path=PDF_FOLDER, index_dir=INDEX_DIR, index_type=INDEX_TYPE, full=False,
+          chunk_compression=CHUNK_COMPRESSION, embedding_backend=EMBEDDING_BACKEND, chunk_size=CHUNK_SIZE,
+          compression=VECTOR_COMPRESSION, pca_dim=PCA_DIM, summaries=CHUNK_SUMMARIES, normalize=NORMALIZE_PDF_TEXT,
+          pipeline=None, chunker=CHUNKER, chunk_tokens=CHUNK_TOKENS, chunk_overlap=CHUNK_OVERLAP, connectors=None):
+    """
+    Build the index from the documents of `connectors` (default: the
+    INGEST_SOURCES, with the PDFs of folder_path; see sources.py),
+    incrementally unless `full`, and publish it; returns the version name,
+    None when nothing was written. An incremental build keeps the documents of
+    the sources not in `connectors`. A full build, asked for or required by a
+    change of settings, reads every source of INGEST_SOURCES.
+    `pipeline` (an ingest.IngestPipeline) extracts and embeds the documents in parallel.
+    """
+    connectors = source_connectors(pdf_folder=folder_path) if connectors is None else connectors
+    chunking = chunking_settings(chunk_size, normalize, chunker, chunk_tokens, chunk_overlap)
+
+    with index_lock(index_dir):  # one build at a time, each starting from the last one's version
+        source_dir = current_index_dir(index_dir)
+        manifests = None if full else load_manifests(source_dir, index_type, chunking, compression, pca_dim,
+                                                     embedding_backend)
+        if manifests is None:
+            connectors = every_source(connectors, folder_path)
+        hashes = {connector.name: connector.list() for connector in connectors}
+        if manifests is None:
+            result = full_build(connectors, hashes, index_type, chunk_compression, embedding_backend, chunking,
+                                compression, pca_dim, pipeline)
+            if result is None:
+                return None
+        else:
+            result = incremental_build(connectors, hashes, source_dir, manifests, embedding_backend, chunking,
+                                       summaries, pipeline)
+            if result is None:
+                print("👌 Index already up to date.")
+                return None
+        index, meta, document_chunks, documents, manifests = result
+        print(f"🧭 {meta['index_type']} index, {meta['ntotal']} vectors, params {meta['params']}")
+        recall = meta.get("compression", {}).get("recall")
+        if recall is not None and recall < COMPRESSION_RECALL_FLOOR:
+            # Keep serving the previous index rather than a compressed one that misses neighbours
+            print(f"❌ Recall {recall:.3f} below CHATBOT_COMPRESSION_RECALL_FLOOR={COMPRESSION_RECALL_FLOOR}, "
+                  f"index not written (try a larger --pca-dim or --compression sq8)")
+            return None
+
+        count, before, after = summarize_chunks(document_chunks, summaries)
+        if count:
+            print(f"📝 {count} chunks condensed ({summaries}): {before} -> {after} tokens ({after / before:.0%})")
+
+        # Save the FAISS index (+ its metadata), document chunks, document index, BM25 index and manifests
+        output_dir = staging_dir(index_dir)
+        try:
+            write_index(index, meta, os.path.join(output_dir, FAISS_INDEX_FILE))
+            document_chunks.save(output_dir)
+            documents.save(output_dir)
+            build_lexical_index(output_dir)
+            for manifest in manifests.values():
+                manifest.save(output_dir)
+        except BaseException:
+            discard(output_dir)
+            raise
+        version = publish(index_dir, output_dir)
+        prune_versions(index_dir)
+        if pipeline is not None:
+            pipeline.checkpoint.clear()  # its documents are in the published version
+        print(f"💾 Index and documents saved, version {version} published.")  # Output confirmation
+        return version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the FAISS index from the PDFs in atb_documents/ "
+                                                 "and the scraped web pages")
+    parser.add_argument("--sources", default=INGEST_SOURCES,
+                        help=f"comma-separated source connectors to update, among {', '.join(SOURCE_CONNECTORS)}")
+    parser.add_argument("--folder", default=PDF_FOLDER, help="PDF folder")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE)
+    parser.add_argument("--chunk-compression", choices=COMPRESSIONS, default=CHUNK_COMPRESSION)
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND)
+    parser.add_argument("--chunker", choices=CHUNKERS, default=CHUNKER,
+                        help="structure: paragraphs, headings and sentences kept whole; "
+                             "fixed: every --chunk-size characters")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS, help="max tokens per chunk (structure)")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP,
+                        help="tokens repeated when a chunk ends mid-paragraph (structure)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="characters per chunk (fixed)")
+    parser.add_argument("--compression", choices=VECTOR_COMPRESSIONS, default=VECTOR_COMPRESSION,
+                        help="PCA projection and/or 8-bit quantization of the vectors")
+    parser.add_argument("--pca-dim", type=int, default=PCA_DIM, help="dimensions kept by --compression pca")
+    parser.add_argument("--summaries", choices=SUMMARY_MODES, default=CHUNK_SUMMARIES,
+                        help="store a condensed copy of each chunk for the prompt")
+    parser.add_argument("--no-normalize", dest="normalize", action="store_false", default=NORMALIZE_PDF_TEXT,
+                        help="chunk the PDF text as extracted (no header/hyphen/whitespace clean-up)")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and rebuild everything")
+    args = parser.parse_args()
+    build(args.folder, index_type=args.index_type, full=args.full, chunk_compression=args.chunk_compression,
+          embedding_backend=args.embedding_backend, chunk_size=args.chunk_size,
+          compression=args.compression, pca_dim=args.pca_dim, summaries=args.summaries,
+          normalize=args.normalize, chunker=args.chunker, chunk_tokens=args.chunk_tokens,
+          chunk_overlap=args.chunk_overlap, connectors=source_connectors(args.sources, args.folder))
@@ -0,0 +1,184 @@
+"""
+Source connectors of the index builder.
+
+A connector lists the documents of one kind of source with a hash of their
+content, and reads one of them as text. retriever_setup.py chunks, embeds and
+indexes every document the same way whatever its connector, and keeps one
+manifest per connector (manifest.json for the PDFs, manifest-<name>.json for
+the others, see manifest.py). A build updates the connectors it is given
+(--sources, default CHATBOT_INGEST_SOURCES) incrementally and leaves the
+documents of the others in place, so new or changed web pages are indexed
+without reading a PDF:
+
+    python manage.py build_index --sources scraped,scrapy
+
+- pdf:      the PDFs under atb_documents/, sources "credit/Sakan.pdf", read
+            with PyMuPDF (in the ingest process pool)
+- scraped:  the "=== title ===" sections written by the scrapers
+            (SCRAPED_TEXT_FILES): scraped_content.txt,
+            scraped_content_selenium.txt (scrape_atb_documents.py),
+            atb_scraper/*.txt and atb_scraper/scraped_content/*.txt (the
+            scrapy spider); sources "scraped/<title>"
+- scrapy:   the items of the atb_spider feed (SCRAPY_ITEMS_FILE, fields
+            title, url, content); sources "scrapy/<URL path>", e.g.
+            "scrapy/produits/credit-sakan" (with "?<query>" if the URL has one)
+
+Source names are prefixed with their connector, so a page saved by both
+scrapers is two documents, each released only by its own manifest.
+
+Scrapers often save the same page several times; a source keeps its longest
+text. Sections without a title are named after their file.
+"""
+import abc
+import glob
+import hashlib
+import json
+import os
+import re
+from urllib.parse import urlparse
+
+from .manifest import file_sha256
+from .pdf_text import extract_text_from_pdf, join_pages, normalization_savings, normalize_pages
+from .rag_config import INGEST_SOURCES, PDF_FOLDER, SCRAPED_TEXT_FILES, SCRAPY_ITEMS_FILE
+
+UNTITLED = {"", "title not found"}
+
+_SECTION_RE = re.compile(r"^=== ?(.*?) ?===[ \t]*$", re.MULTILINE)
+
+
+def list_pdfs(folder_path):
+    """{source: path} of the PDFs under folder_path; sources in sub-directories are "family/name.pdf"."""
+    pdfs = {}
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.endswith(".pdf"):
+                path = os.path.join(root, filename)
+                pdfs[os.path.relpath(path, folder_path).replace(os.sep, "/")] = path
+    return pdfs
+
+
+def read_text(text, normalize):
+    """A one-page text document as (text, page starts, normalization savings), like extract_text_from_pdf."""
+    pages = normalize_pages([text]) if normalize else [text]
+    return join_pages(pages) + (normalization_savings([text], pages),)
+
+
+def _title(title):
+    """Scraper titles, including the spider's file-name-safe ones ("Cr_dit_Sakan"), as words."""
+    return " ".join(title.replace("_", " ").replace("/", " ").split())
+
+
+def _url_name(url):
+    """A page's name from its whole URL path, so two pages that end alike are two sources."""
+    url = urlparse(url)
+    name = os.path.splitext(url.path.strip("/"))[0]
+    return f"{name}?{url.query}" if url.query else name
+
+
+class PdfDirectory:
+    """The PDFs under a folder; their sources are their paths relative to it."""
+
+    name = "pdf"
+    in_process = False  # PyMuPDF extraction goes to the ingest process pool
+
+    def __init__(self, folder=PDF_FOLDER):
+        self.folder = folder
+        self.paths = {}
+
+    def list(self):
+        """{source: sha256 of its content} of the documents available now."""
+        self.paths = list_pdfs(self.folder)
+        return {source: file_sha256(path) for source, path in self.paths.items()}
+
+    def read(self, source, normalize):
+        """(text, page starts, (tokens, characters) removed by normalization) of a listed document."""
+        return extract_text_from_pdf(self.paths[source], normalize)
+
+
+class WebPages(abc.ABC):
+    """Pages collected in memory by list(): the text connectors."""
+
+    in_process = True
+
+    def __init__(self):
+        self.pages = {}
+
+    def _add(self, name, title, text):
+        source = f"{self.name}/{name}"
+        text = "\n".join(line.strip() for line in text.strip().splitlines())
+        if not text:
+            return
+        text = f"{title}\n{text}" if title else text  # the title is often the only mention of the product
+        if len(text) > len(self.pages.get(source, "")):
+            self.pages[source] = text
+
+    @abc.abstractmethod
+    def _collect(self):
+        """Add every page of the source with _add()."""
+
+    def list(self):
+        self.pages = {}
+        self._collect()
+        return {source: hashlib.sha256(text.encode("utf-8")).hexdigest() for source, text in self.pages.items()}
+
+    def read(self, source, normalize):
+        return read_text(self.pages[source] + "\n", normalize)
+
+
+class ScrapedText(WebPages):
+    name = "scraped"
+
+    def __init__(self, patterns=SCRAPED_TEXT_FILES):
+        super().__init__()
+        self.patterns = patterns
+
+    def _collect(self):
+        for path in sorted({path for pattern in self.patterns for path in glob.glob(pattern)}):
+            with open(path, encoding="utf-8", errors="replace") as f:
+                parts = _SECTION_RE.split(f.read())
+            stem = _title(os.path.splitext(os.path.basename(path))[0])
+            # parts: text before the first section, then title, text, title, text...
+            for n, (title, text) in enumerate(zip(parts[1::2], parts[2::2]), 1):
+                title = _title(title)
+                if title.lower() in UNTITLED:
+                    self._add(f"{stem} {n}", "", text)
+                else:
+                    self._add(title, title, text)
+
+
+class ScrapyItems(WebPages):
+    name = "scrapy"
+
+    def __init__(self, path=SCRAPY_ITEMS_FILE):
+        super().__init__()
+        self.path = path
+
+    def _collect(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                content = item.get("content") or ""
+                content = "\n".join(content) if isinstance(content, list) else content
+                title = _title(item.get("title") or "")
+                page = _url_name(item.get("url") or "")
+                if title.lower() in UNTITLED:
+                    title = ""
+                if page or title:
+                    self._add(page or title, title, content)
+
+
+SOURCE_CONNECTORS = {"pdf": PdfDirectory, "scraped": ScrapedText, "scrapy": ScrapyItems}
+
+
+def source_connectors(names=INGEST_SOURCES, pdf_folder=PDF_FOLDER):
+    """Connectors for a "pdf,scraped" list of names."""
+    names = [name.strip() for name in names.split(",") if name.strip()] if isinstance(names, str) else names
+    unknown = set(names) - set(SOURCE_CONNECTORS)
+    if unknown:
+        raise ValueError(f"Unknown sources {sorted(unknown)}, expected some of {list(SOURCE_CONNECTORS)}")
+    return [PdfDirectory(pdf_folder) if name == "pdf" else SOURCE_CONNECTORS[name]() for name in names]
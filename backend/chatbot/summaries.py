@@ -0,0 +1,152 @@
+"""
+Condensed chunk text for the LLM prompt, made once at build time.
+
+Raw PDF chunks carry form boilerplate ("Signature du client", dotted fill-in
+lines), repeated headers and legal text; every token of it is prefilled by
+Ollama on every turn. retriever_setup.py --summaries stores a condensed copy
+of each chunk next to the original (see chunk_store.py); retrieval, BM25 and
+embeddings keep using the original, only the prompt context uses the copy.
+
+- extractive: drops lines that repeat across many chunks and lines with
+  hardly any letters or digits, then keeps the sentences with the most
+  informative words (rare in the corpus, amounts and rates) up to
+  SUMMARY_RATIO of the chunk's tokens, in their original order. Fast, no model.
+- ollama:     asks the local Ollama model for a condensed version (slow, one
+  call per chunk); falls back to extractive when Ollama does not answer or
+  its version lost a number of the chunk (an amount, rate or duration).
+"""
+import logging
+import math
+import re
+from collections import Counter
+
+import requests
+
+from .context import count_tokens
+from .rag_config import OLLAMA_MODEL, OLLAMA_URL, SUMMARY_RATIO
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MODES = ("none", "extractive", "ollama")
+BOILERPLATE_MIN_CHUNKS = 5  # a line found in this many chunks is a header, footer or form label
+MIN_LETTER_SHARE = 0.5  # of letters and digits: "........", "|__|__|", "N° : ______" are fill-in fields
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_NUMBER_RE = re.compile(r"\d")
+# "1 500 DT", "1500", "7,5 %", "7.5%": thousands separated by spaces, decimals by "," or "."
+_AMOUNT_RE = re.compile(r"\d+(?:[ \u00a0\u202f]\d{3})*(?:[.,]\d+)?")
+# Unlike context.split_sentences, not at ":" and ";", which introduce the amount or number a label is about
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+OLLAMA_PROMPT = """Condense l'extrait de document bancaire ci-dessous en gardant tous les faits utiles
+(montants, taux, durées, conditions, pièces à fournir, noms de produits). Supprime les
+en-têtes, champs de formulaire vides et mentions légales. Réponds uniquement par le texte condensé.
+
+Extrait :
+{text}
+"""
+
+
+def _line_key(line):
+    return " ".join(_WORD_RE.findall(line.lower()))
+
+
+def _is_field(line):
+    # Digits are content: "1 500 DT" or "7,5 %" is the amount a label is about
+    chars = [c for c in line if not c.isspace()]
+    return not chars or sum(c.isalnum() for c in chars) / len(chars) < MIN_LETTER_SHARE
+
+
+def _numbers(text):
+    """The numbers of a text, written one way ("1 500,5" -> "1500.5")."""
+    return {re.sub(r"\s", "", number).replace(",", ".") for number in _AMOUNT_RE.findall(text)}
+
+
+class ExtractiveSummarizer:
+    """Corpus statistics (line frequencies, word idf) plus the per-chunk sentence selection."""
+
+    def __init__(self, texts, ratio=SUMMARY_RATIO):
+        self.ratio = ratio
+        line_counts, word_counts, n = Counter(), Counter(), 0
+        for text in texts:
+            n += 1
+            line_counts.update({_line_key(line) for line in text.splitlines() if line.strip()})
+            word_counts.update(set(_WORD_RE.findall(text.lower())))
+        self.boilerplate = {key for key, count in line_counts.items() if count >= BOILERPLATE_MIN_CHUNKS and key}
+        self.idf = {word: math.log(1 + n / count) for word, count in word_counts.items()}
+
+    def content(self, text):
+        """The chunk without boilerplate lines and fill-in fields, whitespace collapsed."""
+        lines = [line for line in text.splitlines()
+                 if not _is_field(line) and _line_key(line) not in self.boilerplate]
+        return " ".join(" ".join(lines).split())
+
+    def _score(self, sentence):
+        words = set(_WORD_RE.findall(sentence.lower()))
+        if not words:
+            return 0.0
+        informative = sum(self.idf.get(word, 0.0) for word in words)
+        return informative / math.sqrt(len(words)) * (1.5 if _NUMBER_RE.search(sentence) else 1.0)
+
+    def __call__(self, text):
+        content = self.content(text) or " ".join(text.split())
+        budget = max(1, int(count_tokens(text) * self.ratio))
+        sentences = [s for s in _SENTENCE_RE.split(content) if s.strip()]
+        if count_tokens(content) <= budget or len(sentences) < 2:
+            return content
+        ranked = sorted(range(len(sentences)), key=lambda i: -self._score(sentences[i]))
+        kept, used = set(), 0
+        for i in ranked:
+            cost = count_tokens(sentences[i])
+            if used + cost > budget and kept:
+                continue
+            kept.add(i)
+            used += cost
+        return " ".join(sentences[i] for i in sorted(kept))
+
+
+def ollama_summary(text, extractive, timeout=120):
+    """Ollama's condensed version of a chunk, or the `extractive` summary when it is unusable."""
+    try:
+        response = requests.post(OLLAMA_URL, json={"model": OLLAMA_MODEL, "stream": False,
+                                                   "prompt": OLLAMA_PROMPT.format(text=text)}, timeout=timeout)
+        response.raise_for_status()
+        summary = " ".join(response.json()["response"].split())
+    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+        logger.warning("Ollama summary failed (%s), using the extractive one", e)
+        return extractive(text)
+    # A "summary" longer than the chunk saves nothing
+    if not summary or count_tokens(summary) >= count_tokens(text):
+        return extractive(text)
+    # The model rounds or drops amounts and rates: the answer would quote a wrong one
+    lost = _numbers(extractive.content(text)) - _numbers(summary)
+    if lost:
+        logger.info("Ollama summary lost %s, using the extractive one", ", ".join(sorted(lost)))
+        return extractive(text)
+    return summary
+
+
+def summarize_chunks(document_chunks, mode):
+    """
+    Give every live chunk of a ChunkStoreWriter that has none a summary made
+    with `mode`; switching modes summarizes everything again. Returns
+    (chunks summarized, their tokens, their summaries' tokens).
+    """
+    if mode == "none":
+        document_chunks.clear_summaries()
+        return 0, 0, 0
+    if document_chunks.summary_mode != mode:
+        document_chunks.clear_summaries(mode)
+    live = list(document_chunks.live_chunks())
+    extractive = ExtractiveSummarizer(text for _, text in live)
+    summarize = extractive if mode == "extractive" else lambda text: ollama_summary(text, extractive)
+    count = before = after = 0
+    for i, text in live:
+        if document_chunks.has_summary(i):
+            continue
+        summary = summarize(text)
+        document_chunks.set_summary(i, summary)
+        count += 1
+        before += count_tokens(text)
+        after += count_tokens(summary)
+    return count, before, after
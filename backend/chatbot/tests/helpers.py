@@ -0,0 +1,38 @@
+"""Fixtures shared by the chatbot tests: a deterministic encoder and small source documents."""
+import hashlib
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from ..rag_config import EMBEDDING_DIM
+
+
+class FakeEncoder:
+    """encode() like SentenceTransformer: a unit vector seeded by the text, so equal texts get equal vectors."""
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.encoded = 0
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, sentences, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        self.encoded += len(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vectors[row] = np.random.default_rng(seed).normal(size=self.dim)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors[0] if single else vectors
+
+
+def write_pdf(path, pages):
+    """A PDF with one text page per string of `pages`."""
+    with fitz.open() as doc:
+        for text in pages:
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 550, 800), text, fontsize=10)
+        doc.save(path)
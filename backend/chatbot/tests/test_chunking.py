@@ -0,0 +1,42 @@
+import unittest
+
+from ..chunking import page_spans, structured_spans
+
+PAGE = """CRÉDIT SAKAN
+Le crédit Sakan finance l'achat d'un logement neuf ou ancien. Le montant maximum est de 300 000 DT.
+La durée de remboursement va jusqu'à 25 ans.
+
+Pièces à fournir :
+- une copie de la carte d'identité
+- les trois derniers bulletins de salaire
+- une promesse de vente
+
+2. Conditions
+Le client doit avoir un compte ouvert à l'ATB et domicilier son salaire. Le taux est de 7,5 % hors assurance.
+"""
+
+
+class ChunkingTest(unittest.TestCase):
+    def test_page_that_fits_is_one_chunk(self):
+        self.assertEqual(page_spans(PAGE, max_tokens=1000), [(0, len(PAGE.rstrip()))])
+
+    def test_chunks_end_at_sections_and_keep_headings(self):
+        spans = page_spans(PAGE, max_tokens=60, overlap=0)
+        chunks = [PAGE[start:end] for start, end in spans]
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(chunks[0].startswith("CRÉDIT SAKAN\nLe crédit Sakan"))
+        self.assertTrue(any(chunk.startswith("2. Conditions\nLe client") for chunk in chunks))
+        self.assertFalse(any(chunk.endswith("2. Conditions") for chunk in chunks))
+
+    def test_long_paragraph_split_with_overlap(self):
+        page = " ".join(f"Phrase numéro {n} du paragraphe." for n in range(40))
+        spans = page_spans(page, max_tokens=40, overlap=8)
+        self.assertGreater(len(spans), 1)
+        for (_, end), (start, _) in zip(spans, spans[1:]):
+            self.assertLess(start, end)  # the next chunk repeats the end of the previous one
+        self.assertEqual((spans[0][0], spans[-1][1]), (0, len(page)))
+
+    def test_no_chunk_crosses_a_page(self):
+        text = "Première page.\n" + "Deuxième page.\n"
+        spans = structured_spans(text, [0, 15])
+        self.assertEqual([text[start:end] for start, end in spans], ["Première page.", "Deuxième page."])
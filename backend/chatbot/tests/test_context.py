@@ -0,0 +1,28 @@
+import unittest
+
+from ..context import count_tokens, pack_context
+
+
+class PackContextTest(unittest.TestCase):
+    def test_paragraph_breaks_split_sentences(self):
+        chunk = "Crédit Sakan\n\nMontant maximum 300 000 DT\n\nDurée jusqu'à 25 ans"
+        budget = count_tokens("Crédit Sakan Montant maximum 300 000 DT")
+        context, used, n = pack_context([chunk, "Autre chose."], token_budget=budget)
+        self.assertEqual((context, used, n), ("Crédit Sakan Montant maximum 300 000 DT", budget, 1))
+
+    def test_layout_whitespace_collapsed(self):
+        context, _, _ = pack_context(["Taux :   7,5 %\nhors   assurance."], token_budget=100)
+        self.assertEqual(context, "Taux : 7,5 % hors assurance.")
+
+    def test_best_chunk_with_a_long_first_sentence_is_cut_between_words(self):
+        long_sentence = " ".join(f"mot{n}" for n in range(50)) + "."
+        context, used, n = pack_context([long_sentence, "Une phrase courte."], token_budget=10)
+        self.assertEqual(n, 1)
+        self.assertTrue(long_sentence.startswith(context + " "))
+        self.assertLessEqual(used, 10)
+        self.assertEqual(used, count_tokens(context))
+
+    def test_other_chunks_still_cut_at_sentences(self):
+        context, _, n = pack_context(["Première phrase.", "Une deuxième phrase bien plus longue que le reste."],
+                                     token_budget=count_tokens("Première phrase.") + 3)
+        self.assertEqual((context, n), ("Première phrase.", 1))
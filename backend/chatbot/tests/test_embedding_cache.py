@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from ..embedding_cache import KEYS_FILE, VECTORS_FILE, CachedEncoder, EmbeddingCache, text_key
+from .helpers import FakeEncoder
+
+
+class EmbeddingCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="chatbot-test-")
+        self.addCleanup(shutil.rmtree, self.root)
+        self.model = FakeEncoder(dim=8)
+
+    def encoder(self):
+        return CachedEncoder(lambda: self.model, EmbeddingCache(self.root, "test-model--torch"))
+
+    def test_text_key_ignores_spacing_not_case(self):
+        self.assertEqual(text_key("Crédit  Sakan\n"), text_key("Crédit Sakan"))
+        self.assertNotEqual(text_key("Crédit Sakan"), text_key("crédit sakan"))
+
+    def test_cached_texts_are_not_encoded_again(self):
+        texts = ["Crédit Sakan", "Taux : 7,5 %", "Crédit Sakan"]
+        vectors = self.encoder().encode(texts)
+        self.assertEqual(self.model.encoded, 2)
+        np.testing.assert_allclose(vectors, FakeEncoder(dim=8).encode(texts))
+
+        encoder = self.encoder()  # reopened from disk
+        np.testing.assert_allclose(encoder.encode(texts + ["Durée : 25 ans"]),
+                                   FakeEncoder(dim=8).encode(texts + ["Durée : 25 ans"]))
+        self.assertEqual((encoder.hits, encoder.encoded, self.model.encoded), (3, 1, 3))
+
+    def test_model_not_loaded_when_everything_is_cached(self):
+        self.encoder().encode(["Crédit Sakan"])
+        encoder = CachedEncoder(self.fail, EmbeddingCache(self.root, "test-model--torch"))
+        self.assertEqual(encoder.encode("Crédit Sakan").shape, (8,))
+        self.assertEqual(encoder.get_sentence_embedding_dimension(), 8)
+
+    def test_partial_last_row_is_dropped(self):
+        self.encoder().encode(["Crédit Sakan", "Taux : 7,5 %"])
+        cache = EmbeddingCache(self.root, "test-model--torch")
+        with open(os.path.join(cache.path, VECTORS_FILE), "ab") as f:
+            f.write(b"\0" * 12)  # a build killed while appending a row
+        with open(os.path.join(cache.path, KEYS_FILE), "ab") as f:
+            f.write(text_key("Durée : 25 ans"))
+        cache = EmbeddingCache(self.root, "test-model--torch")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.lookup([text_key("Durée : 25 ans")]).tolist(), [-1])
+        self.assertEqual(os.path.getsize(os.path.join(cache.path, VECTORS_FILE)), 2 * 8 * 4)
@@ -0,0 +1,90 @@
+import http.client
+import json
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+
+from ..embedding_server import EmbeddingClient, EmbeddingServerError, make_server
+from .helpers import FakeEncoder
+
+
+class FailingEncoder(FakeEncoder):
+    """Fails on any batch that holds the text "boom"."""
+
+    def encode(self, sentences, **kwargs):
+        if "boom" in sentences:
+            raise RuntimeError("boom")
+        return super().encode(sentences, **kwargs)
+
+
+class EmbeddingServerTest(unittest.TestCase):
+    def setUp(self):
+        self.model = FailingEncoder(dim=8)
+        self.server = make_server("http://127.0.0.1:0", self.model, "torch")
+        self.server.batcher.window = 0.2  # concurrent requests end up in one batch
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def post(self, body):
+        connection = http.client.HTTPConnection(*self.server.server_address, timeout=10)
+        try:
+            connection.request("POST", "/encode", body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            return response.status, response.getheader("Content-Type"), response.read()
+        finally:
+            connection.close()
+
+    def test_encode(self):
+        status, _, body = self.post(json.dumps({"texts": ["un", "deux"]}))
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body), 2 * 8 * 4)
+
+    def test_invalid_texts(self):
+        for body in ('{"texts": "un texte"}', '{"texts": [1, 2]}', '["un"]', '{}', "{"):
+            status, content_type, data = self.post(body)
+            self.assertEqual(status, 400, body)
+            self.assertEqual(content_type, "application/json")
+            self.assertIn("error", json.loads(data))
+        self.assertEqual(self.model.encoded, 0)
+
+    def test_failure_only_fails_its_request(self):
+        bodies = [json.dumps({"texts": texts}) for texts in (["un"], ["boom"], ["deux", "trois"])]
+        with self.assertLogs("chatbot.embedding_server", "ERROR"), ThreadPoolExecutor(3) as pool:
+            (ok, _, first), (failed, content_type, error), (ok_too, _, last) = pool.map(self.post, bodies)
+        self.assertEqual((ok, failed, ok_too), (200, 500, 200))
+        self.assertEqual(content_type, "application/json")
+        self.assertIn("boom", json.loads(error)["error"])
+        self.assertEqual((len(first), len(last)), (8 * 4, 2 * 8 * 4))
+
+    def client(self, address):
+        local = FakeEncoder(dim=8)
+        patcher = mock.patch("chatbot.embedding_server.load_embedding_model", return_value=local)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return EmbeddingClient(address, timeout=5), local
+
+    def test_client_error_answer_is_raised(self):
+        host, port = self.server.server_address
+        client, local = self.client(f"http://{host}:{port}")
+        np.testing.assert_allclose(client.encode(["un", "deux"]), FakeEncoder(dim=8).encode(["un", "deux"]))
+        with self.assertLogs("chatbot.embedding_server", "ERROR"), \
+                self.assertRaises(EmbeddingServerError) as raised:
+            client.encode(["boom"])
+        self.assertEqual(raised.exception.status, 500)
+        self.assertEqual((client._local_model, client._retry_at), (None, 0.0))  # the server is still used
+        self.assertEqual(client.encode("un").shape, (8,))
+        self.assertEqual(local.encoded, 0)
+
+    def test_client_falls_back_when_the_server_is_down(self):
+        host, port = self.server.server_address
+        self.server.shutdown()
+        self.server.server_close()
+        client, local = self.client(f"http://{host}:{port}")
+        with self.assertLogs("chatbot.embedding_server", "WARNING"):
+            self.assertEqual(client.encode(["un"]).shape, (1, 8))
+        self.assertEqual(local.encoded, 1)
+        self.assertGreater(client._retry_at, 0.0)
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from .. import retrieval_runtime
+from ..index_versions import current_version, index_lock, pointer_mtime, publish, staging_dir
+
+
+class IndexVersionsTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="chatbot-test-")
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_lock_serializes_writers(self):
+        events = []
+
+        def second_build():
+            with index_lock(self.root):
+                events.append("second")
+
+        with mock.patch("builtins.print"):
+            with index_lock(self.root):
+                thread = threading.Thread(target=second_build)
+                thread.start()
+                time.sleep(0.2)
+                events.append("first")
+            thread.join(5)
+        self.assertEqual(events, ["first", "second"])
+
+    def test_failed_swap_is_retried(self):
+        first = publish(self.root, staging_dir(self.root))
+        time.sleep(0.01)
+        second = publish(self.root, staging_dir(self.root))
+        self.assertEqual(current_version(self.root), second)
+        old = SimpleNamespace(index_dir=os.path.join(self.root, "versions", first), embedding_model=None)
+        state = {"checked_at": 0.0, "pointer_mtime": None, "thread": None}
+        with mock.patch.multiple(retrieval_runtime, INDEX_DIR=self.root, INDEX_RELOAD_INTERVAL=1e-9,
+                                 _runtime=old, _reload=state), \
+                mock.patch.object(retrieval_runtime, "load_runtime", side_effect=OSError("truncated")) as load, \
+                self.assertLogs("chatbot.retrieval_runtime", "ERROR"):
+            for _ in range(2):
+                retrieval_runtime.check_for_new_version()
+                state["thread"].join(5)
+            self.assertEqual(load.call_count, 2)  # the pointer did not change, the failed version is tried again
+            self.assertIsNone(state["pointer_mtime"])
+            load.side_effect = None
+            load.return_value = SimpleNamespace(index_dir=os.path.join(self.root, "versions", second), version=second)
+            with mock.patch.object(retrieval_runtime, "warm_up"):
+                retrieval_runtime.check_for_new_version()
+                state["thread"].join(5)
+            self.assertEqual(state["pointer_mtime"], pointer_mtime(self.root))
+            self.assertIs(retrieval_runtime._runtime, load.return_value)
@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from ..embedding_cache import model_id
+from ..model_registry import ModelRegistry, model_version, resolve_model
+
+
+class ModelRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="chatbot-test-")
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.registry_dir = os.path.join(self.tmp, "models")
+        self.model_dir = os.path.join(self.tmp, "download")
+        os.makedirs(self.model_dir)
+        self.write("config.json", '{"hidden_size": 384}')
+        patcher = mock.patch("chatbot.model_registry.enforce_offline")  # leave the test process online
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, filename, text):
+        with open(os.path.join(self.model_dir, filename), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def test_pinned_model_is_loaded_by_path(self):
+        ModelRegistry(self.registry_dir).add("mini", self.model_dir)
+        path = resolve_model("mini", offline=True, verify="sha256", registry_dir=self.registry_dir)
+        self.assertEqual(path, os.path.join(self.registry_dir, "mini"))
+        with open(os.path.join(path, "config.json"), "w", encoding="utf-8") as f:
+            f.write('{"hidden_size": 768}')
+        with self.assertRaises(RuntimeError):
+            resolve_model("mini", offline=True, verify="sha256", registry_dir=self.registry_dir)
+
+    def test_unpinned_model_offline(self):
+        with self.assertRaises(FileNotFoundError):
+            resolve_model("mini", offline=True, registry_dir=self.registry_dir)
+
+    def test_version_follows_the_pinned_files(self):
+        registry = ModelRegistry(self.registry_dir)
+        self.assertEqual(model_version("mini", self.registry_dir), "mini")
+        registry.add("mini", self.model_dir)
+        first = model_version("mini", self.registry_dir)
+        self.assertTrue(first.startswith("mini@sha256-"))
+        self.write("config.json", '{"hidden_size": 768}')
+        registry.add("mini", self.model_dir)
+        self.assertNotEqual(model_version("mini", self.registry_dir), first)
+        registry.add("mini", self.model_dir, "sentence-transformers/mini", "0123456789abcdef0123")
+        self.assertEqual(model_version("mini", self.registry_dir), "mini@0123456789ab")
+
+    def test_cache_key_has_the_backend(self):
+        self.assertNotEqual(model_id("mini", "torch"), model_id("mini", "onnx-int8"))
@@ -0,0 +1,33 @@
+import unittest
+
+from ..pdf_text import clean_glyphs, join_pages, normalize_pages
+
+
+def page(number, body):
+    return f"ATB - Demande de crédit\n{body}\nPage {number}/4\n"
+
+
+class NormalizePagesTest(unittest.TestCase):
+    def test_repeated_headers_and_page_numbers_removed(self):
+        pages = normalize_pages([page(n, f"Contenu de la page {n}.") for n in range(1, 5)])
+        self.assertEqual(pages, [f"Contenu de la page {n}.\n" for n in range(1, 5)])
+
+    def test_lines_that_differ_by_an_amount_are_kept(self):
+        amounts = ["Frais de dossier : 10 DT", "Frais de dossier : 20 DT", "Frais de dossier : 30 DT",
+                   "Frais de dossier : 40 DT"]
+        pages = normalize_pages([page(n, amount) for n, amount in enumerate(amounts, 1)])
+        self.assertEqual(pages, [amount + "\n" for amount in amounts])
+
+    def test_hyphen_breaks(self):
+        text = "Les deman-\ndes des co-\ntitulaires.\nToutes les demandes sont signées par les Co-\nEmprunteurs."
+        self.assertEqual(normalize_pages([text]),
+                         ["Les demandes des co-titulaires.\nToutes les demandes sont signées par les Co-\n"
+                          "Emprunteurs.\n"])
+
+    def test_glyphs_and_spaces(self):
+        self.assertEqual(clean_glyphs("ﬁnancement Nom : ..........​"), "financement Nom : …")
+        self.assertEqual(normalize_pages(["  Montant   :  300 000 DT \n\n\n\nDurée : 25 ans"]),
+                         ["Montant : 300 000 DT\n\nDurée : 25 ans\n"])
+
+    def test_join_pages(self):
+        self.assertEqual(join_pages(["un\n", "", "deux\n"]), ("un\ndeux\n", [0, 3, 3]))
@@ -0,0 +1,32 @@
+import unittest
+from unittest import mock
+
+from .. import related_questions
+from ..related_questions import RelatedQuestions, related_suggestions
+from ..retrieval_cache import RetrievalCache
+from .helpers import FakeEncoder
+
+QUESTIONS = ["Comment ouvrir un compte ?", "Quels sont les frais du compte ?", "Comment obtenir une carte Visa ?"]
+
+
+class RelatedSuggestionsTest(unittest.TestCase):
+    def setUp(self):
+        self.encoder = FakeEncoder(dim=8)
+        self.cache = RetrievalCache()
+        related = RelatedQuestions.build(QUESTIONS, self.encoder, k=2)
+        for target, value in (("_related", related), ("retrieval_cache", self.cache)):
+            patcher = mock.patch.object(related_questions, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_no_cached_vector_matches_the_text_only(self):
+        self.assertEqual(related_suggestions("comment ouvrir un compte ?"), QUESTIONS[1:])
+        self.assertEqual(related_suggestions("Ouvrir un compte"), [])
+        stats = self.cache.stats()["embeddings"]
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 0))
+
+    def test_cached_vector_is_read_without_counting(self):
+        self.cache.put_embedding("Ouvrir un compte", self.encoder.encode(QUESTIONS[0]))
+        self.assertEqual(related_suggestions("Ouvrir un compte"), QUESTIONS[1:])
+        stats = self.cache.stats()["embeddings"]
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 0))
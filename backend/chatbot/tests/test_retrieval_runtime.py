@@ -0,0 +1,54 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from .. import retrieval_runtime
+from ..index_versions import current_index_dir
+from ..rag_config import FAISS_INDEX_FILE
+from ..retrieval_runtime import get_runtime, load_runtime, memory_report, read_faiss_index
+from ..retriever_setup import build
+from ..sources import PdfDirectory
+from .helpers import FakeEncoder, write_pdf
+
+
+class RetrievalRuntimeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="chatbot-test-")
+        self.addCleanup(shutil.rmtree, self.tmp)
+        pdf_dir = os.path.join(self.tmp, "pdfs")
+        self.index_dir = os.path.join(self.tmp, "index")
+        os.makedirs(pdf_dir)
+        for n in range(3):
+            write_pdf(os.path.join(pdf_dir, f"doc{n}.pdf"), [f"DOCUMENT {n}\nLe produit {n} de l'ATB est décrit ici."])
+        self.encoder = FakeEncoder()
+        with mock.patch("chatbot.retriever_setup.load_encoder", lambda backend: self.encoder), \
+                contextlib.redirect_stdout(io.StringIO()):
+            build(pdf_dir, self.index_dir, connectors=[PdfDirectory(pdf_dir)], summaries="none", index_type="flat")
+
+    def test_mmap_index_answers_like_a_loaded_one(self):
+        path = os.path.join(current_index_dir(self.index_dir), FAISS_INDEX_FILE)
+        queries = self.encoder.encode(["Le produit 1 de l'ATB", "document 2"])
+        mapped = read_faiss_index(path, "flat", mmap=True).search(queries, 3)
+        loaded = read_faiss_index(path, "flat", mmap=False).search(queries, 3)
+        np.testing.assert_allclose(mapped[0], loaded[0], rtol=1e-6)
+        np.testing.assert_array_equal(mapped[1], loaded[1])
+
+    def test_runtime_is_loaded_once_per_process(self):
+        runtime = load_runtime(self.index_dir, embedding_model=self.encoder)
+        self.assertEqual(runtime.faiss_index.ntotal, runtime.index_meta["ntotal"])
+        with mock.patch.multiple(retrieval_runtime, _runtime=None, INDEX_DIR=self.index_dir,
+                                 INDEX_RELOAD_INTERVAL=0), \
+                mock.patch.object(retrieval_runtime, "load_runtime", return_value=runtime) as load:
+            self.assertIs(get_runtime(), runtime)
+            self.assertIs(get_runtime(), runtime)
+            self.assertEqual(load.call_count, 1)
+            report = memory_report()
+        self.assertEqual(report["pid"], os.getpid())
+        self.assertGreater(report["rss_mb"], 0)
+        self.assertTrue(report["runtime_loaded"])
@@ -0,0 +1,53 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from ..retriever import search_hits
+from ..vector_index import build_index
+
+
+class Documents:
+    """Stands for DocumentIndex: routes each query to the documents given for its row."""
+
+    def __init__(self, routes, n_documents):
+        self.routes = routes
+        self.n_documents = n_documents
+
+    def __len__(self):
+        return self.n_documents
+
+    def search(self, query_vecs, m, allowed=None):
+        return self.routes[:len(query_vecs)]
+
+
+class Chunks:
+    """Stands for ChunkStore: document d holds the chunks 10*d .. 10*d + 9."""
+
+    source_families = None
+
+    def chunk_ids_of_sources(self, sources):
+        return np.concatenate([np.arange(10 * d, 10 * d + 10) for d in sorted(sources)]).astype("int64")
+
+
+class RoutedSearchTest(unittest.TestCase):
+    def test_rows_sharing_documents_share_a_search(self):
+        rng = np.random.default_rng(0)
+        index, meta = build_index(rng.normal(size=(100, 16)), "flat", dim=16, metric="ip", compression="none")
+        searches = []
+        search = index.search
+        index.search = lambda *args, **kwargs: searches.append(len(args[0])) or search(*args, **kwargs)
+        routes = [[1, 2], [3], [2, 1], [1, 2]]
+        runtime = SimpleNamespace(faiss_index=index, index_meta=meta, document_index=Documents(routes, 10),
+                                  document_chunks=Chunks(), version=None, family_filter=lambda family: None)
+        queries = rng.normal(size=(len(routes), 16)).astype("float32")
+
+        hits = search_hits(runtime, queries, 3, use_cache=False)
+
+        self.assertEqual(sorted(searches), [1, 3])
+        for query, route, row in zip(queries, routes, hits):
+            candidates = Chunks().chunk_ids_of_sources(route)
+            vectors = np.vstack([index.reconstruct(int(i)) for i in candidates])
+            query = query / np.linalg.norm(query)
+            best = candidates[np.argsort(-(vectors @ query))[:3]]
+            self.assertEqual([chunk_id for chunk_id, _ in row], best.tolist())
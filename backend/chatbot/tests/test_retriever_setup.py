@@ -0,0 +1,145 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from ..document_index import DocumentIndex
+from ..index_versions import current_index_dir
+from ..manifest import DocumentManifest, manifest_file
+from .. import retriever_setup
+from ..retriever_setup import build
+from ..sources import PdfDirectory, ScrapedText
+from ..vector_index import read_index_meta
+from .helpers import FakeEncoder, write_pdf
+
+PDF_TEXT = {
+    "Sakan.pdf": ["CRÉDIT SAKAN\nLe crédit Sakan finance l'achat d'un logement jusqu'à 300 000 DT sur 25 ans."],
+    "Carte-Visa.pdf": ["CARTE VISA\nLa carte Visa permet les paiements à l'étranger.",
+                       "Plafond de retrait : 2 000 DT par semaine."],
+}
+WEB_TEXT = """=== Crédit Tahawel ===
+Transférez votre crédit immobilier vers l'ATB à un taux préférentiel.
+=== Épargne Plus ===
+Un compte épargne rémunéré, disponible à tout moment.
+"""
+
+
+class IndexBuildTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="chatbot-test-")
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.pdf_dir = os.path.join(self.tmp, "pdfs")
+        self.index_dir = os.path.join(self.tmp, "index")
+        os.makedirs(self.pdf_dir)
+        for name, pages in PDF_TEXT.items():
+            write_pdf(os.path.join(self.pdf_dir, name), pages)
+        self.web_file = os.path.join(self.tmp, "scraped_content.txt")
+        with open(self.web_file, "w", encoding="utf-8") as f:
+            f.write(WEB_TEXT)
+        self.encoder = FakeEncoder()
+        for target, value in (("load_encoder", lambda backend: self.encoder), ("INGEST_SOURCES", "pdf,scraped")):
+            patcher = mock.patch(f"chatbot.retriever_setup.{target}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def connectors(self, *names):
+        connectors = {"pdf": PdfDirectory(self.pdf_dir), "scraped": ScrapedText([self.web_file])}
+        return [connectors[name] for name in names]
+
+    def build(self, names, **kwargs):
+        kwargs.setdefault("summaries", "none")
+        kwargs.setdefault("index_type", "flat")
+        with contextlib.redirect_stdout(io.StringIO()):
+            return build(self.pdf_dir, self.index_dir, connectors=self.connectors(*names), **kwargs)
+
+    def indexed(self):
+        """{source connector: sorted sources} of the manifests, and the sources of the document index."""
+        index_dir = current_index_dir(self.index_dir)
+        manifests = {name: sorted(m.documents) for name, m in DocumentManifest.load_all(index_dir).items()}
+        return manifests, sorted(DocumentIndex.load(index_dir).sources)
+
+    def test_full_build_indexes_every_source(self):
+        self.assertIsNotNone(self.build(["pdf", "scraped"]))
+        manifests, documents = self.indexed()
+        self.assertEqual(manifests["pdf"], sorted(PDF_TEXT))
+        self.assertEqual(len(manifests["scraped"]), 2)
+        self.assertEqual(documents, sorted(manifests["pdf"] + manifests["scraped"]))
+
+    def test_incremental_build_of_one_source_keeps_the_others(self):
+        self.build(["pdf", "scraped"])
+        with open(self.web_file, "a", encoding="utf-8") as f:
+            f.write("=== Carte Epargne ===\nUne carte liée au compte épargne.\n")
+        self.encoder.encoded = 0
+        self.assertIsNotNone(self.build(["scraped"]))
+        manifests, documents = self.indexed()
+        self.assertEqual(manifests["pdf"], sorted(PDF_TEXT))
+        self.assertEqual(len(manifests["scraped"]), 3)
+        self.assertEqual(len(documents), 5)
+        self.assertLess(self.encoder.encoded, 5)  # only the new page was encoded
+        self.assertIsNone(self.build(["pdf", "scraped"]))  # nothing left to do
+
+    def test_required_full_rebuild_of_one_source_reads_every_source(self):
+        self.build(["pdf", "scraped"])
+        # Another index type cannot be updated incrementally
+        self.assertIsNotNone(self.build(["scraped"], index_type="hnsw"))
+        manifests, documents = self.indexed()
+        self.assertEqual(manifests["pdf"], sorted(PDF_TEXT))
+        self.assertTrue(any(source.endswith(".pdf") for source in documents))
+        self.assertEqual(len(documents), 4)
+
+    def test_removed_document_is_dropped(self):
+        self.build(["pdf", "scraped"])
+        os.remove(os.path.join(self.pdf_dir, "Sakan.pdf"))
+        self.build(["pdf"])
+        manifests, documents = self.indexed()
+        self.assertEqual(manifests["pdf"], ["Carte-Visa.pdf"])
+        self.assertNotIn("Sakan.pdf", documents)
+
+    def test_backend_change_requires_a_full_rebuild(self):
+        self.build(["pdf", "scraped"])
+        # Manifests written before the backend was recorded are torch ones
+        index_dir = current_index_dir(self.index_dir)
+        for manifest in DocumentManifest.load_all(index_dir).values():
+            with open(os.path.join(index_dir, manifest_file(manifest.source)), encoding="utf-8") as f:
+                data = json.load(f)
+            del data["backend"]
+            with open(os.path.join(index_dir, manifest_file(manifest.source)), "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        self.assertIsNone(self.build(["pdf", "scraped"], embedding_backend="torch"))
+        self.assertIsNotNone(self.build(["scraped"], embedding_backend="onnx-int8"))
+        manifests = DocumentManifest.load_all(current_index_dir(self.index_dir))
+        self.assertEqual({manifest.backend for manifest in manifests.values()}, {"onnx-int8"})
+        self.assertEqual(len(manifests["pdf"].documents), len(PDF_TEXT))
+
+    def test_build_without_documents_publishes_nothing(self):
+        for name in PDF_TEXT:
+            os.remove(os.path.join(self.pdf_dir, name))
+        os.remove(self.web_file)
+        for index_type in ("flat", "ivf"):
+            self.assertIsNone(self.build(["pdf", "scraped"], index_type=index_type))
+        self.assertFalse(os.path.exists(os.path.join(self.index_dir, "current")))
+
+    def test_incremental_build_checks_compression_recall(self):
+        self.build(["pdf", "scraped"], compression="sq8")
+        with open(self.web_file, "a", encoding="utf-8") as f:
+            f.write("=== Carte Epargne ===\nUne carte liée au compte épargne.\n")
+        with mock.patch("chatbot.retriever_setup.check_sampled_compression",
+                        wraps=retriever_setup.check_sampled_compression) as check:
+            self.assertIsNotNone(self.build(["scraped"], compression="sq8"))
+        check.assert_called_once()
+        recall = read_index_meta(current_index_dir(self.index_dir))["compression"]["recall"]
+        self.assertGreater(recall, 0.9)
+
+    def test_too_few_vectors_for_the_pca(self):
+        self.assertIsNotNone(self.build(["pdf", "scraped"], compression="pca-sq8", pca_dim=256))
+        compression = read_index_meta(current_index_dir(self.index_dir))["compression"]
+        self.assertEqual((compression["type"], compression["requested"]), ("sq8", {"type": "pca-sq8", "dim": 256}))
+        with open(self.web_file, "a", encoding="utf-8") as f:
+            f.write("=== Carte Epargne ===\nUne carte liée au compte épargne.\n")
+        with mock.patch("chatbot.retriever_setup.full_build") as full_build:
+            self.assertIsNotNone(self.build(["scraped"], compression="pca-sq8", pca_dim=256))
+        full_build.assert_not_called()  # the same settings: still incremental
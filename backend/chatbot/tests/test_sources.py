@@ -0,0 +1,55 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..sources import ScrapedText, ScrapyItems, source_connectors
+
+
+class WebSourcesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="chatbot-test-")
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_scraped_sections(self):
+        path = self.write("scraped_content.txt", "=== Crédit Sakan ===\nCourt.\n===  ===\nSans titre.\n"
+                                                 "=== Crédit Sakan ===\nUn texte plus long sur Sakan.\n")
+        connector = ScrapedText([path])
+        hashes = connector.list()
+        self.assertEqual(sorted(hashes), ["scraped/Crédit Sakan", "scraped/scraped content 2"])
+        text, page_starts, _ = connector.read("scraped/Crédit Sakan", normalize=False)
+        self.assertEqual(text, "Crédit Sakan\nUn texte plus long sur Sakan.\n")  # the longest copy, titled
+        self.assertEqual(page_starts, [0])
+
+    def test_scrapy_items(self):
+        path = self.write("atb_items.jsonl", json.dumps({
+            "title": "Crédit Sakan", "url": "https://www.atb.tn/produits/credit-sakan-presentation.php",
+            "content": "Le crédit Sakan."}) + "\n")
+        self.assertEqual(list(ScrapyItems(path).list()), ["scrapy/produits/credit-sakan-presentation"])
+        self.assertEqual(ScrapyItems(os.path.join(self.tmp, "missing.jsonl")).list(), {})
+
+    def test_pages_with_the_same_last_url_part(self):
+        items = [{"title": "Conditions", "url": f"https://www.atb.tn/{product}/conditions.php",
+                  "content": f"Conditions du {product}."} for product in ("credit-sakan", "compte-epargne")]
+        items.append({"title": "Actualités", "url": "https://www.atb.tn/actualites.php?page=2", "content": "Page 2."})
+        path = self.write("atb_items.jsonl", "".join(json.dumps(item) + "\n" for item in items))
+        self.assertEqual(sorted(ScrapyItems(path).list()), ["scrapy/actualites?page=2",
+                                                             "scrapy/compte-epargne/conditions",
+                                                             "scrapy/credit-sakan/conditions"])
+
+    def test_same_page_from_both_scrapers_is_two_sources(self):
+        scraped = ScrapedText([self.write("page.txt", "=== Crédit Sakan ===\nLe crédit Sakan.\n")])
+        scrapy = ScrapyItems(self.write("items.jsonl", json.dumps({"title": "Crédit Sakan", "url": "",
+                                                                   "content": "Le crédit Sakan."}) + "\n"))
+        self.assertFalse(set(scraped.list()) & set(scrapy.list()))
+
+    def test_unknown_source(self):
+        with self.assertRaises(ValueError):
+            source_connectors("pdf,rss")
@@ -0,0 +1,48 @@
+import unittest
+from unittest import mock
+
+from ..summaries import ExtractiveSummarizer, ollama_summary
+
+CHUNK = """Crédit Sakan
+Montant maximum :
+300 000 DT
+Taux : 7,5 %
+Signature du client : ..................
+|__|__|__|__|
+"""
+
+
+class OllamaAnswer:
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"response": self.text}
+
+
+class SummariesTest(unittest.TestCase):
+    def setUp(self):
+        self.extractive = ExtractiveSummarizer([CHUNK])
+
+    def test_amounts_are_content(self):
+        content = self.extractive.content(CHUNK)
+        self.assertIn("300 000 DT", content)
+        self.assertIn("7,5 %", content)
+        self.assertNotIn("|__|", content)
+        self.assertNotIn("....", content)
+
+    def summarize(self, answer):
+        with mock.patch("chatbot.summaries.requests.post", return_value=OllamaAnswer(answer)):
+            return ollama_summary(CHUNK, self.extractive)
+
+    def test_ollama_summary_keeps_the_numbers(self):
+        self.assertEqual(self.summarize("Sakan : jusqu'à 300000 DT à 7.5 %."), "Sakan : jusqu'à 300000 DT à 7.5 %.")
+
+    def test_ollama_summary_that_loses_a_number_is_replaced(self):
+        with self.assertLogs("chatbot.summaries", "INFO"):
+            summary = self.summarize("Sakan : jusqu'à 300 000 DT à 8 %.")
+        self.assertEqual(summary, self.extractive(CHUNK))
+        self.assertIn("7,5 %", summary)
@@ -0,0 +1,33 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ..vector_index import build_index, id_selector, search_parameters
+
+
+class FilteredSearchTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.vectors = rng.normal(size=(400, 32)).astype("float32")
+        self.queries = rng.normal(size=(20, 32)).astype("float32")
+        self.ids = np.arange(0, 400, 3)
+
+    def test_only_selected_ids(self):
+        for index_type in ("flat", "ivf", "hnsw"):
+            index, meta = build_index(self.vectors, index_type, dim=32, metric="ip", compression="none",
+                                      nlist=8, nprobe=8)
+            _, found = index.search(self.queries, 5, params=search_parameters(meta, id_selector(self.ids)))
+            self.assertTrue(set(found.ravel()) <= set(self.ids.tolist()), index_type)
+
+    def test_concurrent_searches_share_the_selector(self):
+        index, meta = build_index(self.vectors, "flat", dim=32, metric="ip", compression="none")
+        selector = id_selector(self.ids)  # cached per family by the runtime, the parameters are not
+        expected = index.search(self.queries, 5, params=search_parameters(meta, selector))[1]
+
+        def search(_):
+            return index.search(self.queries, 5, params=search_parameters(meta, selector))[1]
+
+        with ThreadPoolExecutor(8) as pool:
+            for found in pool.map(search, range(200)):
+                np.testing.assert_array_equal(found, expected)
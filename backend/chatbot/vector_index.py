@@ -0,0 +1,285 @@
+"""
+FAISS index construction for the document store.
+
+The index type is picked at build time (CHATBOT_INDEX_TYPE) and recorded in a
+small JSON file next to the index, together with the search parameters the
+retriever must apply when it loads it:
+
+- flat: exhaustive scan, exact results (the default, fine up to a few 10k chunks)
+- ivf:  IVF-Flat, scans `nprobe` of `nlist` clusters
+- hnsw: HNSW graph, explores `efSearch` candidates per query
+
+Independently of the type, the vectors can be compressed (CHATBOT_VECTOR_COMPRESSION):
+
+- pca:     projected on their top PCA_DIM principal directions (384 -> 128)
+- sq8:     stored as 8-bit scalars instead of float32
+- pca-sq8: both, ~12x smaller than float32 at 384 dimensions
+
+The projection is an IndexPreTransform in front of the index, so queries go
+through exactly the same projection inside `index.search`.
+"""
+import json
+import math
+import os
+
+import faiss
+import numpy as np
+
+from .rag_config import (
+    EMBEDDING_DIM,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    HNSW_M,
+    INDEX_META_FILE,
+    INDEX_METRIC,
+    INDEX_TYPE,
+    IVF_NLIST,
+    IVF_NPROBE,
+    PCA_DIM,
+    VECTOR_COMPRESSION,
+)
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+VECTOR_COMPRESSIONS = ("none", "pca", "sq8", "pca-sq8")
+METRICS = {"ip": faiss.METRIC_INNER_PRODUCT, "l2": faiss.METRIC_L2}
+
+
+def default_nlist(n_vectors):
+    """~4*sqrt(n) clusters, but keep ~40 training points per cluster so k-means stays meaningful."""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def index_params(index_type=INDEX_TYPE, n_vectors=0, **overrides):
+    """Build and search parameters for an index type, from rag_config unless overridden."""
+    if index_type == "flat":
+        params = {}
+    elif index_type == "ivf":
+        params = {"nlist": IVF_NLIST or default_nlist(n_vectors), "nprobe": IVF_NPROBE}
+    elif index_type == "hnsw":
+        params = {"m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION, "ef_search": HNSW_EF_SEARCH}
+    else:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    return params
+
+
+def factory_string(index_type, params, compression="none"):
+    codec = "SQ8" if compression in ("sq8", "pca-sq8") else "Flat"
+    if index_type == "flat":
+        return codec
+    if index_type == "ivf":
+        return f"IVF{params['nlist']},{codec}"
+    return f"HNSW{params['m']}" + (",SQ8" if codec == "SQ8" else "")
+
+
+def pca_projection(vectors, out_dim):
+    """
+    Projection on the top `out_dim` principal directions of `vectors`.
+
+    The PCA is not centered: the embeddings share a large common component and
+    removing the mean would change inner products. Training on the vectors and
+    their opposites gives a zero mean, so faiss' PCAMatrix fits exactly that.
+    The projected vectors are normalized again, so inner-product scores stay
+    (approximate) cosines and the relevance thresholds keep their meaning.
+    """
+    projection = faiss.PCAMatrix(vectors.shape[1], out_dim)
+    projection.train(np.vstack([vectors, -vectors]))
+    return projection
+
+
+def prepare_vectors(vectors, meta):
+    """float32 copy of the vectors, L2-normalized for inner-product (cosine) indexes."""
+    vectors = np.array(vectors, dtype="float32")
+    if meta["metric"] == "ip":
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def build_index(vectors, index_type=INDEX_TYPE, dim=EMBEDDING_DIM, ids=None, metric=INDEX_METRIC,
+                compression=VECTOR_COMPRESSION, pca_dim=PCA_DIM, **overrides):
+    """
+    Train (if needed) and fill an index with `vectors`.
+
+    The index is wrapped in an IndexIDMap2 so each vector carries its chunk id
+    (`ids`, default 0..n-1) and can later be removed by id. With the "ip"
+    metric the vectors are normalized first, so search scores are cosines.
+    `compression` adds a PCA projection and/or 8-bit codes (see the module docstring).
+    With fewer vectors than `pca_dim` there are too few to fit the projection:
+    the index is built without it and meta["compression"]["requested"] keeps
+    the compression that was asked for.
+
+    Returns (index, meta) where meta is what write_index stores next to the index.
+    """
+    if compression not in VECTOR_COMPRESSIONS:
+        raise ValueError(f"Unknown vector compression {compression!r}, expected one of {VECTOR_COMPRESSIONS}")
+    if compression.startswith("pca") and not 0 < pca_dim < dim:
+        raise ValueError(f"PCA dimension must be between 1 and {dim - 1}, got {pca_dim}")
+    requested = None
+    if compression.startswith("pca") and len(vectors) < pca_dim:
+        requested = {"type": compression, "dim": pca_dim}
+        compression = "sq8" if compression == "pca-sq8" else "none"
+    params = index_params(index_type, len(vectors), **overrides)
+    vectors = prepare_vectors(vectors, {"metric": metric})
+    stored_dim = pca_dim if compression.startswith("pca") else dim
+    base = faiss.index_factory(stored_dim, factory_string(index_type, params, compression), METRICS[metric])
+    if index_type == "hnsw":
+        base.hnsw.efConstruction = params["ef_construction"]
+    if compression.startswith("pca"):
+        projected = faiss.IndexPreTransform(base)
+        if metric == "ip":
+            projected.prepend_transform(faiss.NormalizationTransform(pca_dim, 2.0))
+        projected.prepend_transform(pca_projection(vectors, pca_dim))
+        base = projected
+    if not base.is_trained:
+        base.train(vectors)
+    index = faiss.IndexIDMap2(base)
+    if ids is None:
+        ids = np.arange(len(vectors))
+    index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    meta = {
+        "index_type": index_type,
+        "metric": metric,
+        "dim": dim,
+        "id_map": True,
+        "ntotal": int(index.ntotal),
+        "params": params,
+        "compression": {"type": compression, "dim": stored_dim},
+    }
+    if requested:
+        meta["compression"]["requested"] = requested
+    apply_search_params(index, meta)
+    return index, meta
+
+
+def compression_settings(meta, requested=False):
+    """
+    (type, stored dimension) of an index's vector compression; older indexes
+    are uncompressed. With `requested`, the compression asked for when the
+    index was built without its PCA (see build_index).
+    """
+    compression = meta.get("compression") or {"type": "none", "dim": meta.get("dim", EMBEDDING_DIM)}
+    if requested and "requested" in compression:
+        compression = compression["requested"]
+    return compression["type"], compression["dim"]
+
+
+def neighbour_recall(index, reference, queries, k=10):
+    """Mean share of the `reference` index's top-k ids that `index` also returns for `queries`."""
+    _, found = index.search(queries, k)
+    _, expected = reference.search(queries, k)
+    return float(np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, expected)]))
+
+
+def stored_recall(index, meta, vectors, query_rows, k=10):
+    """
+    Recall@k of exact search over `vectors` as `index` stores them (projected,
+    8-bit encoded and decoded again) against exact search over `vectors`
+    themselves, with the rows `query_rows` as queries. Unlike neighbour_recall
+    it needs no second index of the whole collection, so it also works on a
+    sample of the vectors of an index that is updated incrementally.
+    """
+    vectors = prepare_vectors(vectors, meta)
+    projected = vectors
+    base = faiss.downcast_index(index.index)  # under the IndexIDMap2
+    if isinstance(base, faiss.IndexPreTransform):  # PCA: the queries are projected too
+        for i in range(base.chain.size()):
+            projected = faiss.downcast_VectorTransform(base.chain.at(i)).apply(projected)
+        base = faiss.downcast_index(base.index)
+    if isinstance(base, faiss.IndexHNSW):  # the graph keeps its vectors in a flat storage index
+        base = faiss.downcast_index(base.storage)
+    stored = base.sa_decode(base.sa_encode(projected))
+    compressed = faiss.IndexFlat(stored.shape[1], METRICS[meta["metric"]])
+    compressed.add(stored)
+    reference = faiss.IndexFlat(vectors.shape[1], METRICS[meta["metric"]])
+    reference.add(vectors)
+    _, found = compressed.search(projected[query_rows], k)
+    _, expected = reference.search(vectors[query_rows], k)
+    return float(np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, expected)]))
+
+
+def add_vectors(index, meta, vectors, ids):
+    index.add_with_ids(prepare_vectors(vectors, meta), np.asarray(ids, dtype="int64"))
+    meta["ntotal"] = int(index.ntotal)
+
+
+def remove_vectors(index, meta, ids):
+    """
+    Delete the vectors with the given ids and return the (possibly new) index.
+
+    HNSW graphs cannot delete nodes, so for them the kept vectors are read
+    back from the index and a new graph is built; nothing is re-encoded.
+    (Compressed vectors are read back decompressed, so they lose a little at each rebuild.)
+    """
+    ids = np.asarray(sorted(ids), dtype="int64")
+    if not len(ids):
+        return index
+    if meta["index_type"] != "hnsw":
+        index.remove_ids(ids)
+        meta["ntotal"] = int(index.ntotal)
+        return index
+    all_ids = faiss.vector_to_array(index.id_map)
+    kept = all_ids[~np.isin(all_ids, ids)]
+    vectors = np.vstack([index.reconstruct(int(i)) for i in kept]) if len(kept) else \
+        np.zeros((0, meta["dim"]), dtype="float32")
+    compression, stored_dim = compression_settings(meta)
+    index, new_meta = build_index(vectors, meta["index_type"], meta["dim"], ids=kept, metric=meta["metric"],
+                                  compression=compression, pca_dim=stored_dim, **meta["params"])
+    # Keeps the recall check and the compression asked for; the PCA is dropped if too few vectors are left
+    carried = {key: value for key, value in meta.get("compression", {}).items() if key in ("recall", "requested")}
+    meta.update(new_meta, compression={**carried, **new_meta["compression"]})
+    return index
+
+
+def apply_search_params(index, meta):
+    """Set nprobe / efSearch on a loaded index from its build metadata."""
+    params = meta.get("params", {})
+    space = faiss.ParameterSpace()
+    if meta.get("index_type") == "ivf":
+        space.set_index_parameter(index, "nprobe", params["nprobe"])
+    elif meta.get("index_type") == "hnsw":
+        space.set_index_parameter(index, "efSearch", params["ef_search"])
+
+
+def id_selector(ids):
+    """IDSelector of a set of ids (e.g. one document family); read-only, so it can be shared between threads."""
+    return faiss.IDSelectorBatch(np.asarray(ids, dtype="int64"))
+
+
+def search_parameters(meta, selector):
+    """
+    Search parameters restricting one search to the ids of `selector` (see id_selector).
+
+    The selector is tested inside the scan: every id of a flat index or of the
+    probed IVF lists is still visited (HNSW walks through excluded nodes too),
+    but only selected ids can take one of the k result slots, so there is no
+    over-fetching and filtering afterwards. nprobe / efSearch are repeated
+    because per-query parameters replace the index-level ones.
+
+    Build new parameters for every search: IndexIDMap.search temporarily
+    replaces their selector with one of its own, so sharing them between
+    concurrent searches is not safe.
+    """
+    params = meta.get("params", {})
+    if meta.get("index_type") == "ivf":
+        search_params = faiss.SearchParametersIVF(sel=selector, nprobe=params["nprobe"])
+    elif meta.get("index_type") == "hnsw":
+        search_params = faiss.SearchParametersHNSW(sel=selector, efSearch=params["ef_search"])
+    else:
+        search_params = faiss.SearchParameters(sel=selector)
+    search_params.selector_ref = selector  # the SWIG object does not own the selector
+    return search_params
+
+
+def write_index(index, meta, index_path):
+    faiss.write_index(index, index_path)
+    with open(os.path.join(os.path.dirname(index_path), INDEX_META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+def read_index_meta(index_dir):
+    """Metadata of the index in index_dir; indexes built before it existed are flat L2."""
+    path = os.path.join(index_dir, INDEX_META_FILE)
+    if not os.path.exists(path):
+        return {"index_type": "flat", "metric": "l2", "dim": EMBEDDING_DIM, "params": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
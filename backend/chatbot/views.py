@@ -12,7 +12,12 @@ from rest_framework.response import Response
 
 from .models import ChatSuggestion, ChatMessage
 from .serializers import UserSerializer, ChatSuggestionSerializer, MessageSerializer
-from .retriever import retrieve_chunks
+from .retriever import retrieve_context
+from .families import route_family
+from .related_questions import related_suggestions
+from .rag_config import DIRECT_ANSWER_MAX_SCORE
+from .retrieval_runtime import memory_report
+from .retrieval_cache import retrieval_cache
 from .generator import generate_response
 from .utils import generate_ticket_number, generate_qr_code, generate_ticket_pdf
 import fitz, os
@@ -22,6 +27,11 @@ from .pdf_parser import build_fields_for_doc
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+DIRECT_ANSWER = (
+    "Bonjour 👋 Je suis l'assistant ATB. Posez-moi une question sur nos comptes, cartes, "
+    "crédits ou services en ligne, ou demandez-moi un ticket."
+)
+
 
 @api_view(['POST'])
 def register_user(request):
@@ -132,15 +142,23 @@ def message_list_create(request):
             }, status=status.HTTP_201_CREATED)
 
         # === Otherwise: normal RAG ===
-        relevant_chunks = retrieve_chunks(message_text)
-        context = "\n".join(relevant_chunks)
-        bot_response = generate_response(message_text, context)
+        context = retrieve_context(message_text, family=route_family(message_text))
+        logger.debug(f"RAG context: {context.n_chunks} chunks, ~{context.tokens} tokens, "
+                     f"top score {context.top_score}")
+        if context.top_score is not None and context.top_score < DIRECT_ANSWER_MAX_SCORE:
+            # Greeting / off-topic: nothing in the documents matches, no need for an LLM round trip
+            bot_response = DIRECT_ANSWER
+        else:
+            bot_response = generate_response(message_text, context.text)
 
         ChatMessage.objects.create(user_id=user_id, text=bot_response, is_bot=True)
 
+        # Follow-up questions precomputed by related_questions.py (the frontend sends an unknown action as text)
+        suggestions = [{"id": 801 + i, "text": question, "action": question}
+                       for i, question in enumerate(related_suggestions(message_text))]
         return Response({
             'bot_response': bot_response,
-            'suggestions': [
+            'suggestions': suggestions + [
                 {"id": 901, "text": "Ouvrir un compte", "action": "start_form"},
                 {"id": 902, "text": "Donne-moi un ticket", "action": "ticket"},
             ]
@@ -151,6 +169,12 @@ def message_list_create(request):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+def retriever_stats(request):
+    """Per-worker memory and cache counters of the retrieval runtime (call it a few times to hit different workers)."""
+    return Response({"memory": memory_report(), "cache": retrieval_cache.stats()})
+
+
 # Optional: if you still want a standalone create-ticket endpoint
 @api_view(['POST'])
 def create_ticket(request):
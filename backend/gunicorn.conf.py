@@ -0,0 +1,30 @@
+"""
+Gunicorn settings for the Django backend.
+
+    gunicorn backend.wsgi -c gunicorn.conf.py
+
+The retrieval runtime (MiniLM weights, FAISS index, chunk store) is loaded in
+the master process before the workers are forked, so all workers share the
+same physical pages instead of loading 8 private copies.
+"""
+import logging
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "4"))
+preload_app = True
+timeout = 120
+
+logger = logging.getLogger("gunicorn.error")
+
+
+def on_starting(server):
+    from chatbot.retrieval_runtime import preload
+
+    preload()
+
+
+def post_worker_init(worker):
+    from chatbot.retrieval_runtime import memory_report
+
+    logger.info("worker memory: %s", memory_report())